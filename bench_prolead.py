@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+from pathlib import Path
+from typing import Optional
+
+from quantiphy import Quantity
+from rich.console import Console
+from rich.table import Table
+
+from run_prolead import Job, get_cell_counts, get_top_module_and_ports
+from synth_flow import ADDER_TOPS, find_sources
+
+# Benchmark Yosys synthesis, config generation and PROLEAD throughput of the adder architectures.
+# Results are appended to a JSON-lines history file and compared against previous runs.
+
+console = Console()
+
+# metric name -> True if higher is better
+METRICS = {
+    "synth_time": False,
+    "num_cells": False,
+    "json_parse_time": False,
+    "config_time": False,
+    "prolead_time": False,
+    "sims_per_sec": True,
+    "peak_ram_gb": False,
+}
+
+argparser = argparse.ArgumentParser(description="Benchmark synthesis and PROLEAD runs")
+argparser.add_argument(
+    "-a", "--archs", nargs="+", default=list(ADDER_TOPS), choices=list(ADDER_TOPS), help="Adders"
+)
+argparser.add_argument("-w", "--widths", nargs="+", type=int, default=[8, 12], help="Adder widths")
+argparser.add_argument(
+    "--rtl-dir", type=Path, default=Path("gen_rtl"), help="Chisel generated RTL directory"
+)
+argparser.add_argument("--run-dir", type=Path, default=Path("bench_run"), help="Run directory")
+argparser.add_argument(
+    "--history",
+    type=Path,
+    default=Path("bench_results") / "history.jsonl",
+    help="Time series of benchmark results (JSON lines)",
+)
+argparser.add_argument("--yosys-bin", help="Path to yosys binary", default="yosys")
+argparser.add_argument("--yosys-lib", help="Path to .lib cell library", default=None, type=Path)
+argparser.add_argument(
+    "--prolead-root-dir", help="Path to PROLEAD source directory", type=Path, default=None
+)
+argparser.add_argument("--prolead-bin", help="Path to PROLEAD binary", default=None)
+argparser.add_argument("--library-json", help="Path to library JSON file", type=Path, default=None)
+argparser.add_argument("--library-name", help="Library name", type=str, default="custom")
+argparser.add_argument("--ports-json", type=Path, default=None, help="Port information json")
+argparser.add_argument("--random-seed", default=1, type=int, help="Random seed")
+argparser.add_argument("-d", "--order", default=1, type=int, help="SCA order")
+argparser.add_argument(
+    "-N", "--num-simulations", default=Quantity("1 M"), type=Quantity, help="Number of simulations"
+)
+argparser.add_argument("-c", "--sim-cycles", type=int, default=10, help="Simulation cycles")
+argparser.add_argument(
+    "--opt", default="none", choices=["full", "flatten", "none"], help="Synthesis optimizations"
+)
+argparser.add_argument(
+    "--skip-synth", action="store_true", help="Reuse existing netlists in the run directory"
+)
+argparser.add_argument(
+    "--skip-prolead", action="store_true", help="Only benchmark synthesis and config generation"
+)
+argparser.add_argument(
+    "--tolerance", type=float, default=0.1, help="Relative tolerance before flagging a regression"
+)
+argparser.add_argument(
+    "--window", type=int, default=5, help="Number of previous results used as the baseline"
+)
+argparser.add_argument(
+    "--fail-on-regression", action="store_true", help="Exit with an error if a regression is found"
+)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(history_file: Path) -> list[dict]:
+    if not history_file.exists():
+        return []
+    with open(history_file, "r") as f:
+        return [json.loads(l) for l in f if l.strip()]
+
+
+def append_history(history_file: Path, records: list[dict]):
+    history_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(history_file, "a") as f:
+        for r in records:
+            f.write(json.dumps(r) + "\n")
+
+
+def find_regressions(
+    record: dict, history: list[dict], tolerance: float, window: int
+) -> dict[str, tuple[float, float]]:
+    """Compare the metrics of `record` with the median of the last `window` matching results.
+    Returns {metric: (baseline, value)} of the regressed metrics."""
+    previous = [
+        r
+        for r in history
+        if r["name"] == record["name"]
+        and r["host"] == record["host"]
+        and r["num_simulations"] == record["num_simulations"]
+    ][-window:]
+    regressions = {}
+    for metric, higher_is_better in METRICS.items():
+        value = record["metrics"].get(metric)
+        baseline_values = [r["metrics"][metric] for r in previous if r["metrics"].get(metric)]
+        if value is None or not baseline_values:
+            continue
+        baseline = statistics.median(baseline_values)
+        if higher_is_better:
+            regressed = value < baseline * (1 - tolerance)
+        else:
+            regressed = value > baseline * (1 + tolerance)
+        if regressed:
+            regressions[metric] = (baseline, value)
+    return regressions
+
+
+def bench_design(
+    args,
+    top: str,
+    liberty_lib: Optional[Path],
+    verilog_lib: Optional[Path],
+    library_json: Optional[Path],
+) -> Optional[dict]:
+    run_dir: Path = (args.run_dir / top).absolute()
+    run_dir.mkdir(parents=True, exist_ok=True)
+
+    job = Job(
+        top_module=top,
+        run_dir=run_dir,
+        yosys_bin=args.yosys_bin,
+        yosys_lib=liberty_lib,
+        yosys_verilog_lib=verilog_lib,
+        opt=args.opt,
+        prolead_bin=args.prolead_bin,
+        library_json=library_json,
+        library_name=args.library_name,
+        order=args.order,
+        num_simulations=int(args.num_simulations),
+        sim_cycles=args.sim_cycles,
+        ports_json=args.ports_json,
+        num_cores="half",
+        pretty=False,
+        plot=False,
+    )
+
+    metrics: dict[str, float] = {}
+
+    sources = find_sources(args.rtl_dir, top)
+    if not sources:
+        print(f"** [WARNING] No sources found for {top} in {args.rtl_dir}, skipping")
+        return None
+    job.source_files = [s.absolute() for s in sources]
+    # the netlist directory is keyed by the sources
+    json_netlist = job.netlist_file.with_suffix(".json")
+
+    if not (args.skip_synth and json_netlist.exists()):
+        assert liberty_lib, "Liberty library not specified"
+        job.force_synth = True
+        t0 = time.perf_counter()
+        job.synthesize()
+        metrics["synth_time"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with open(json_netlist, "r") as f:
+        netlist = json.load(f)
+    top_name, ports = get_top_module_and_ports(netlist)
+    metrics["json_parse_time"] = time.perf_counter() - t0
+
+    cell_counts = get_cell_counts(netlist, top_name)
+    metrics["num_cells"] = sum(cell_counts.values())
+
+    job.top_module = top_name or top
+    sca_config = job.sca_config()
+
+    t0 = time.perf_counter()
+    config_file = job.generate_config(
+        job.classify_ports(ports), sca_config, random.Random(args.random_seed)
+    )
+    metrics["config_time"] = time.perf_counter() - t0
+
+    if args.prolead_bin and not args.skip_prolead:
+        assert library_json and library_json.exists(), f"Library JSON {library_json} not found"
+        t0 = time.perf_counter()
+        stats = job.run_prolead(config_file, sca_config)
+        metrics["prolead_time"] = time.perf_counter() - t0
+        metrics["sims_per_sec"] = stats.sims_per_sec
+        metrics["peak_ram_gb"] = stats.peak_ram_gb
+
+    return {
+        "name": top,
+        "timestamp": time.time(),
+        "revision": git_revision(),
+        "host": platform.node(),
+        "seed": args.random_seed,
+        "num_simulations": int(args.num_simulations),
+        "cells": cell_counts,
+        "metrics": metrics,
+    }
+
+
+if __name__ == "__main__":
+    args = argparser.parse_args()
+
+    prolead_root_dir = args.prolead_root_dir or os.environ.get("PROLEAD_ROOT_DIR")
+    if prolead_root_dir is None and args.prolead_bin:
+        prolead_root_dir = Path(args.prolead_bin).parent.parent
+    if prolead_root_dir:
+        prolead_root_dir = Path(prolead_root_dir).resolve()
+        if args.prolead_bin is None:
+            args.prolead_bin = prolead_root_dir / "release" / "PROLEAD"
+
+    liberty_lib = args.yosys_lib
+    verilog_lib = None
+    if liberty_lib is None and prolead_root_dir:
+        liberty_lib = prolead_root_dir / "yosys" / "lib" / "custom_cells.lib"
+        verilog_lib = prolead_root_dir / "yosys" / "lib" / "custom_cells.v"
+
+    library_json = args.library_json
+    if library_json is None and prolead_root_dir:
+        library_json = prolead_root_dir / "library.json"
+
+    history = load_history(args.history)
+    records = []
+    all_regressions = {}
+
+    for arch in args.archs:
+        for width in args.widths:
+            top = ADDER_TOPS[arch].format(width=width)
+            record = bench_design(args, top, liberty_lib, verilog_lib, library_json)
+            if record is None:
+                continue
+            record["arch"] = arch
+            record["width"] = width
+            regressions = find_regressions(record, history, args.tolerance, args.window)
+            if regressions:
+                all_regressions[top] = regressions
+            records.append(record)
+
+    append_history(args.history, records)
+
+    table = Table(title="Benchmark Results")
+    table.add_column("Design", no_wrap=True)
+    for metric in METRICS:
+        table.add_column(metric, justify="right")
+    for r in records:
+        regressed = all_regressions.get(r["name"], {})
+        row = []
+        for metric in METRICS:
+            value = r["metrics"].get(metric)
+            cell = "-" if value is None else f"{value:.4g}"
+            row.append(f"[red]{cell}[/red]" if metric in regressed else cell)
+        table.add_row(r["name"], *row)
+    console.print(table)
+
+    print(f"** Results appended to {args.history}")
+
+    if all_regressions:
+        print(f"** Regressions beyond {args.tolerance:.0%}:")
+        for name, regressions in all_regressions.items():
+            for metric, (baseline, value) in regressions.items():
+                print(f"  {name}: {metric} {baseline:.4g} -> {value:.4g}")
+        if args.fail_on_regression:
+            exit(1)
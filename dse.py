@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from quantiphy import Quantity
+from rich.console import Console
+from rich.table import Table
+
+from netlist_graph import NetlistGraph
+from randomness import randomness_report
+from run_prolead import Campaign, Job, get_cell_counts
+from synth_flow import find_sources
+import yosys_worker
+
+# Design-space exploration of the masked adders: sweeps architecture, width, masking order and
+# gadget, synthesizes every design point, and finds the Pareto front of area vs. latency vs.
+# randomness per width and masking order (smaller widths and orders would dominate all others). With
+# `--prolead`, the fronts are checked with bounded PROLEAD runs: leaking points are
+# dropped and the fronts recomputed until they only contain points without detected leakage. Points
+# dominated by a checked point are never simulated.
+
+console = Console()
+
+# masked adder classes; `desiredName` is `<Class>_w<width>_d<order>_<gadget>`
+MASKED_ADDERS = {
+    "ks": "KSAdder",
+    "bk": "BKAdder",
+    "sk": "SKAdder",
+    "psk": "PipelinedSKAdder",
+    "lf": "LFAdder",
+    "rc": "RCAdder",
+}
+GADGETS = ["dom", "hpc2"]
+
+argparser = argparse.ArgumentParser(description="Design-space exploration of masked adders")
+argparser.add_argument(
+    "-a",
+    "--archs",
+    nargs="+",
+    default=list(MASKED_ADDERS),
+    choices=list(MASKED_ADDERS),
+    help="Adder architectures (psk: pipelined Sklansky)",
+)
+argparser.add_argument("-w", "--widths", nargs="+", type=int, default=[8], help="Adder widths")
+argparser.add_argument("-d", "--orders", nargs="+", type=int, default=[1], help="Masking orders")
+argparser.add_argument(
+    "-g", "--gadgets", nargs="+", default=GADGETS, choices=GADGETS, help="AND gadgets"
+)
+argparser.add_argument(
+    "--rtl-dir", type=Path, default=Path("gen_rtl"), help="Chisel generated RTL directory"
+)
+argparser.add_argument("--run-dir", type=Path, default=Path("dse_run"), help="Run directory")
+argparser.add_argument("--yosys-bin", help="Path to yosys binary", default="yosys")
+argparser.add_argument(
+    "--yosys-backend",
+    choices=["process", "pyosys"],
+    default="process",
+    help="Run Yosys as a process per design, or in warm pyosys worker processes",
+)
+argparser.add_argument("--yosys-lib", help="Path to .lib cell library", default=None, type=Path)
+argparser.add_argument(
+    "--prolead-root-dir", help="Path to PROLEAD source directory", type=Path, default=None
+)
+argparser.add_argument("--prolead-bin", help="Path to PROLEAD binary", default=None)
+argparser.add_argument("--library-json", help="Path to library JSON file", type=Path, default=None)
+argparser.add_argument("--library-name", help="Library name", type=str, default="custom")
+argparser.add_argument("--ports-json", type=Path, default=None, help="Port information json")
+argparser.add_argument("--force-synth", help="Force synthesis.", action="store_true")
+argparser.add_argument(
+    "--prolead", action="store_true", help="Check the Pareto front with bounded PROLEAD runs"
+)
+argparser.add_argument(
+    "-N",
+    "--num-simulations",
+    default=Quantity("100 k"),
+    type=Quantity,
+    help="Number of simulations of the PROLEAD checks",
+)
+argparser.add_argument(
+    "--extra-cycles",
+    type=int,
+    default=2,
+    help="Simulation cycles beyond the latency of the design in the PROLEAD checks",
+)
+argparser.add_argument(
+    "--transitional", action="store_true", help="Transitional leakage in the PROLEAD checks"
+)
+argparser.add_argument("--random-seed", default=None, type=int, help="Random seed")
+argparser.add_argument(
+    "-j", "--jobs", type=int, default=os.cpu_count(), help="Number of parallel synthesis runs"
+)
+argparser.add_argument(
+    "--prolead-jobs", type=int, default=1, help="Number of parallel PROLEAD runs"
+)
+argparser.add_argument("--results", type=Path, default=None, help="Write the results to JSON")
+
+
+@dataclass(eq=False)
+class DesignPoint:
+    arch: str
+    width: int
+    order: int
+    gadget: str
+    job: Optional[Job] = field(default=None, repr=False)
+    ports: Optional[list[dict]] = field(default=None, repr=False)
+    cells: dict[str, int] = field(default_factory=dict)
+    latency: Optional[int] = None
+    random_bits: Optional[int] = None
+    # random bits which never reach a gadget
+    removable_random_bits: Optional[int] = None
+    # None: not checked
+    leakage: Optional[bool] = None
+    max_p_log: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def top(self) -> str:
+        cls = MASKED_ADDERS[self.arch]
+        return f"{cls}_w{self.width}_d{self.order}_{self.gadget}"
+
+    @property
+    def area(self) -> int:
+        return sum(self.cells.values())
+
+    @property
+    def objectives(self) -> tuple[int, int, int]:
+        assert self.latency is not None and self.random_bits is not None
+        return (self.area, self.latency, self.random_bits)
+
+    def to_json(self) -> dict:
+        return {
+            "top": self.top,
+            "arch": self.arch,
+            "width": self.width,
+            "order": self.order,
+            "gadget": self.gadget,
+            "area": self.area,
+            "cells": self.cells,
+            "latency": self.latency,
+            "random_bits": self.random_bits,
+            "removable_random_bits": self.removable_random_bits,
+            "leakage": self.leakage,
+            "max_p_log": self.max_p_log,
+            "error": self.error,
+        }
+
+
+def dominates(a: DesignPoint, b: DesignPoint) -> bool:
+    return all(x <= y for x, y in zip(a.objectives, b.objectives)) and a.objectives != b.objectives
+
+
+def pareto_front(points: list[DesignPoint]) -> list[DesignPoint]:
+    return [p for p in points if not any(dominates(q, p) for q in points)]
+
+
+def pareto_fronts(points: list[DesignPoint]) -> dict[tuple[int, int], list[DesignPoint]]:
+    """Pareto front of each (width, order) group of `points`"""
+    groups: dict[tuple[int, int], list[DesignPoint]] = {}
+    for p in points:
+        groups.setdefault((p.width, p.order), []).append(p)
+    return {k: pareto_front(groups[k]) for k in sorted(groups)}
+
+
+def on_front(point: DesignPoint, fronts: dict[tuple[int, int], list[DesignPoint]]) -> bool:
+    return point in fronts.get((point.width, point.order), [])
+
+
+def synthesize_point(point: DesignPoint) -> DesignPoint:
+    job = point.job
+    assert job is not None
+    try:
+        job.prepare()
+        if job.needs_synthesis():
+            job.synthesize()
+        point.ports = job.parse_netlist()
+        classified = job.classify_ports(point.ports)
+        with open(job.netlist_file.with_suffix(".json"), "r") as f:
+            netlist = json.load(f)
+        assert job.top_module
+        point.cells = get_cell_counts(netlist, job.top_module)
+        share_inputs = [p.name for p in classified if p.is_input and p.share_id is not None]
+        point.latency = NetlistGraph(netlist, job.top_module).register_latency(share_inputs)
+        randomness = randomness_report(netlist, job.top_module, classified, point.latency)
+        point.random_bits = randomness.bits_per_cycle
+        point.removable_random_bits = len(randomness.removable_bits)
+    except Exception as e:
+        print(f"** [ERROR] Synthesis of {point.top} failed: {e}")
+        point.error = str(e)
+    return point
+
+
+def check_fronts(points: list[DesignPoint], args) -> dict[tuple[int, int], list[DesignPoint]]:
+    """Run bounded PROLEAD checks on the Pareto fronts until they have no leaking points"""
+    while True:
+        fronts = pareto_fronts([p for p in points if p.leakage is not True])
+        unchecked = [p for front in fronts.values() for p in front if p.leakage is None]
+        if not unchecked:
+            return fronts
+        print(f"** Checking {len(unchecked)} design point(s) of the Pareto fronts with PROLEAD")
+        jobs = []
+        for p in unchecked:
+            assert p.job and p.ports is not None and p.latency is not None
+            jobs.append(
+                p.job.on_netlist(
+                    p.ports,
+                    run_dir=p.job.run_dir / "prolead",
+                    order=p.order,
+                    transitional=args.transitional,
+                    num_simulations=int(args.num_simulations),
+                    sim_cycles=p.latency + args.extra_cycles,
+                    random_seed=args.random_seed,
+                    pretty=False,
+                    plot=False,
+                )
+            )
+        for p, r in zip(unchecked, Campaign(jobs, max_workers=args.prolead_jobs).run()):
+            if r.stats is None or r.error is not None or r.stats.failed:
+                # failed checks are treated as leaking, so the point is not on the front
+                p.error = str(r.error) if r.error else "PROLEAD failed"
+                p.leakage = True
+            else:
+                p.leakage = r.stats.leakage
+                p.max_p_log = r.stats.max_p_log
+
+
+def print_results(points: list[DesignPoint], fronts: dict[tuple[int, int], list[DesignPoint]]):
+    table = Table(title="Design Space Exploration")
+    for col in ("Design", "Area", "AND", "Latency", "Rand bits", "Removable", "Leakage", "Front"):
+        table.add_column(col, justify="left" if col == "Design" else "right")
+    points = sorted(points, key=lambda p: (p.width, p.order, p.arch, p.gadget))
+    for i, p in enumerate(points):
+        if i and (p.width, p.order) != (points[i - 1].width, points[i - 1].order):
+            table.add_section()
+        if p.latency is None:
+            table.add_row(p.top, f"[red]{p.error}[/red]", "", "", "", "", "", "")
+            continue
+        if p.leakage is None:
+            verdict = "-"
+        elif p.leakage:
+            verdict = "[red]LEAKAGE[/red]" if p.error is None else f"[red]{p.error}[/red]"
+        else:
+            verdict = f"[green]OKAY[/green] ({p.max_p_log:.2f})"
+        table.add_row(
+            p.top,
+            str(p.area),
+            str(sum(n for t, n in p.cells.items() if "AND" in t.upper())),
+            str(p.latency),
+            str(p.random_bits),
+            str(p.removable_random_bits or ""),
+            verdict,
+            "*" if on_front(p, fronts) else "",
+        )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    args = argparser.parse_args()
+
+    yosys_worker.pool_workers = args.jobs
+    points = []
+    for arch, width, order, gadget in itertools.product(
+        args.archs, args.widths, args.orders, args.gadgets
+    ):
+        point = DesignPoint(arch=arch, width=width, order=order, gadget=gadget)
+        sources = [s.absolute() for s in find_sources(args.rtl_dir, point.top)]
+        if not sources:
+            print(f"** [WARNING] No sources found for {point.top} in {args.rtl_dir}, skipping")
+            continue
+        point.job = Job(
+            source_files=sources,
+            top_module=point.top,
+            run_dir=(args.run_dir / point.top).absolute(),
+            force_synth=args.force_synth,
+            yosys_bin=args.yosys_bin,
+            yosys_backend=args.yosys_backend,
+            yosys_lib=args.yosys_lib,
+            prolead_root_dir=args.prolead_root_dir,
+            prolead_bin=args.prolead_bin,
+            library_json=args.library_json,
+            library_name=args.library_name,
+            ports_json=args.ports_json,
+            opt="flatten",
+        )
+        points.append(point)
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        points = list(executor.map(synthesize_point, points))
+
+    synthesized = [p for p in points if p.latency is not None]
+    if args.prolead:
+        fronts = check_fronts(synthesized, args)
+    else:
+        fronts = pareto_fronts(synthesized)
+
+    print_results(points, fronts)
+
+    if args.results:
+        args.results.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.results, "w") as f:
+            json.dump(
+                {
+                    "points": [dict(p.to_json(), front=on_front(p, fronts)) for p in points],
+                    "fronts": [
+                        {"width": w, "order": d, "front": [p.top for p in front]}
+                        for (w, d), front in fronts.items()
+                    ],
+                },
+                f,
+                indent=2,
+            )
+        print(f"** Results written to {args.results}")
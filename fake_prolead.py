@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+# Stand-in for the PROLEAD binary, for testing run_prolead.py without long simulations.
+# It accepts PROLEAD's command line, so it can be passed as `run_prolead.py --prolead-bin fake_prolead.py`.
+# Either replays a recorded PROLEAD stdout log, or synthesizes one from the simulation settings in the
+# config file. Since run_prolead.py only passes PROLEAD arguments, the emulator options can also be set
+# through FAKE_PROLEAD_* environment variables, e.g. FAKE_PROLEAD_SPEEDUP=0 FAKE_PROLEAD_LEAKS="..."
+
+HEADER = "| Elapsed Time | Used Memory | Total Simulations | Highest Leakage | -log10(p) | Status |"
+SEPARATOR = "|" + "|".join("-" * 20 for _ in range(6)) + "|"
+
+RESULT_ELAPSED_TIME_REGEX = re.compile(r"^\s*\|\s*(?P<elapsed_time>\d+\.\d+)s\s*\|")
+
+LEAK_THRESHOLD = 5.0
+
+
+def env(name: str, default=None):
+    return os.environ.get(f"FAKE_PROLEAD_{name}", default)
+
+
+argparser = argparse.ArgumentParser(description="PROLEAD emulator")
+# PROLEAD arguments
+argparser.add_argument("--libraryfile", type=Path, default=None)
+argparser.add_argument("--libraryname", default=None)
+argparser.add_argument("--designfile", type=Path, default=None)
+argparser.add_argument("--configfile", type=Path, default=None)
+argparser.add_argument("--resultfolder", type=Path, default=None)
+argparser.add_argument("--modulename", default=None)
+# emulator arguments
+argparser.add_argument(
+    "--replay", type=Path, default=env("REPLAY"), help="Recorded PROLEAD stdout to replay"
+)
+argparser.add_argument(
+    "--rate", type=float, default=float(env("RATE", 100_000)), help="Simulations per second"
+)
+argparser.add_argument(
+    "--speedup",
+    type=float,
+    default=float(env("SPEEDUP", 1.0)),
+    help="Time scaling of the emitted output. 0 emits the output as fast as possible.",
+)
+argparser.add_argument(
+    "--ram-start", type=float, default=float(env("RAM_START", 0.1)), help="Initial memory (GB)"
+)
+argparser.add_argument(
+    "--ram-growth",
+    type=float,
+    default=float(env("RAM_GROWTH", 0.05)),
+    help="Memory growth (GB) per million simulations",
+)
+argparser.add_argument(
+    "--leak",
+    action="append",
+    default=[l for l in env("LEAKS", "").split(";") if l],
+    help="Leakage event as N_SIM:SIGNAL(CYCLE):P_LOG, can be repeated",
+)
+argparser.add_argument(
+    "--num-simulations", type=int, default=env("NUM_SIMULATIONS"), help="Overrides config"
+)
+argparser.add_argument(
+    "--sims-per-step", type=int, default=env("SIMS_PER_STEP"), help="Overrides config"
+)
+argparser.add_argument(
+    "--start-sim",
+    type=int,
+    default=int(env("START_SIM", 0)),
+    help="Start from this number of simulations, e.g. to test resuming",
+)
+argparser.add_argument("--seed", type=int, default=int(env("SEED", 0)), help="Random seed")
+argparser.add_argument(
+    "--exit-code", type=int, default=int(env("EXIT_CODE", 0)), help="Exit code when done"
+)
+
+
+def emit(line: str):
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+def sleep_until(t0: float, elapsed: float, speedup: float):
+    if speedup > 0:
+        delay = t0 + elapsed / speedup - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def replay(log_file: Path, speedup: float):
+    t0 = time.monotonic()
+    with open(log_file, "r") as f:
+        for line in f:
+            m = RESULT_ELAPSED_TIME_REGEX.match(line)
+            if m:
+                sleep_until(t0, float(m.group("elapsed_time")), speedup)
+            emit(line.rstrip("\n"))
+
+
+def parse_leak(spec: str) -> tuple[int, str, float]:
+    m = re.fullmatch(r"(?P<n_sim>\d+):(?P<signal>[^\(]+\(\d+\)):(?P<p_log>\d+(\.\d+)?)", spec)
+    assert m, f"Invalid leakage event: {spec}. Expected N_SIM:SIGNAL(CYCLE):P_LOG"
+    return int(m.group("n_sim")), m.group("signal"), float(m.group("p_log"))
+
+
+def result_line(
+    elapsed: float,
+    ram_gb: float,
+    n_sim: int,
+    required_sims: Optional[int],
+    signals: list[str],
+    p_log: float,
+) -> str:
+    sims = f"{n_sim} / {required_sims}" if required_sims else f"{n_sim}"
+    status = "LEAKAGE" if p_log > LEAK_THRESHOLD else "OKAY"
+    return f"| {elapsed:.2f}s | {ram_gb:.2f}GB | {sims} | [{', '.join(signals)}] | {p_log:.2f} | {status} |"
+
+
+def synthesize_log(args, sim_config: dict):
+    rng = random.Random(args.seed)
+    num_simulations = int(
+        args.num_simulations or sim_config.get("number_of_simulations", 1_000_000)
+    )
+    per_step = int(args.sims_per_step or sim_config.get("number_of_simulations_per_step", 1024))
+    leaks = sorted(parse_leak(l) for l in args.leak)
+    probes = [f"probe_{i}({rng.randint(1, 8)})" for i in range(16)]
+
+    emit(f"Start PROLEAD emulation of {args.modulename or args.designfile}")
+    emit(f"Number of simulations: {num_simulations}, per step: {per_step}")
+    emit(SEPARATOR)
+    emit(HEADER)
+    emit(SEPARATOR)
+
+    t0 = time.monotonic()
+    n_sim = args.start_sim - args.start_sim % per_step
+    while n_sim < num_simulations:
+        n_sim += per_step
+        elapsed = n_sim / args.rate
+        ram_gb = args.ram_start + args.ram_growth * n_sim / 1e6
+        # p-values of a non-leaking design stay low and noisy
+        p_log = rng.expovariate(2.0)
+        signals = [rng.choice(probes)]
+        required_sims = None
+        for leak_n_sim, signal, leak_p_log in leaks:
+            if n_sim >= leak_n_sim:
+                # the leakage gets more significant as more simulations are collected
+                leak_p_log = leak_p_log * n_sim / max(leak_n_sim, 1)
+                if leak_p_log > p_log:
+                    p_log = leak_p_log
+                    signals = [signal]
+                    required_sims = leak_n_sim
+                elif leak_p_log == p_log:
+                    signals.append(signal)
+        sleep_until(t0, elapsed, args.speedup)
+        emit(result_line(elapsed, ram_gb, n_sim, required_sims, signals, p_log))
+    emit(SEPARATOR)
+
+
+if __name__ == "__main__":
+    args, unknown_args = argparser.parse_known_args()
+
+    if args.resultfolder:
+        args.resultfolder.mkdir(parents=True, exist_ok=True)
+
+    if args.replay:
+        replay(args.replay, args.speedup)
+    else:
+        sim_config = {}
+        if args.configfile:
+            with open(args.configfile, "r") as f:
+                sim_config = json.load(f).get("simulation", {})
+        synthesize_log(args, sim_config)
+
+    exit(args.exit_code)
@@ -0,0 +1,36 @@
+import fcntl
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+# File helpers shared by the tooling: outputs are replaced atomically, so concurrent readers and
+# interrupted runs never see partial files.
+
+
+@contextmanager
+def atomic_write(path: Path, mode: str = "w", encoding: Optional[str] = None, host: bool = False):
+    """Write to a temporary file next to `path`, which replaces `path` once complete. With `host`,
+    the temporary file is also named after the host, for directories shared between machines."""
+    writer = f"{socket.gethostname()}-" if host else ""
+    tmp = path.with_name(f".{path.name}.{writer}{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, mode, encoding=encoding) as f:
+            yield f
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+@contextmanager
+def file_lock(lock_file: Path):
+    """Exclusive lock between processes and threads (each holder opens the file itself)"""
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_file, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,72 @@
+import hashlib
+import re
+from typing import Union
+
+# Gadget instances of a hierarchical (pre-flatten) Yosys JSON netlist, for the compositional
+# verification of `run_prolead.py --hierarchical`: each distinct gadget module is verified once on
+# its own, and the probes within the instances of verified gadgets are excluded from the analysis of
+# the flattened design, leaving the composition layer. This is only sound for composable gadgets
+# (e.g. PINI or HPC gadgets).
+
+GADGET_MODULES_REGEX = r"(?i)^(dom|hpc)"
+
+
+def parameter_value(value: str) -> Union[int, str]:
+    """Yosys constant (`32'00...01` in derived module names, `00...01` in the JSON) or string"""
+    bits = value.split("'", 1)[-1]
+    if bits and set(bits) <= {"0", "1"}:
+        return int(bits, 2)
+    return value.rstrip()
+
+
+def module_name_and_parameters(module: str, netlist: dict) -> tuple[str, dict[str, str]]:
+    """Name and parameters of a module derived by `hierarchy`, e.g. `$paramod\\DOM\\W=32'...`. Long
+    parameter lists are hashed in the name (`$paramod$<hash>\\DOM`); then the parameter values of
+    the derived module are used."""
+    if not module.startswith("$paramod"):
+        return module, {}
+    parts = module.split("\\")
+    parameters = {}
+    for p in parts[2:]:
+        k, _, v = p.partition("=")
+        parameters[k] = str(parameter_value(v))
+    if not parameters:
+        defaults = netlist["modules"].get(module, {}).get("parameter_default_values", {})
+        parameters = {k: str(parameter_value(v)) for k, v in defaults.items()}
+    return parts[1], parameters
+
+
+def find_gadget_instances(
+    netlist: dict, top: str, regex: str = GADGET_MODULES_REGEX
+) -> dict[str, list[str]]:
+    """Hierarchical instance paths (`inst.sub_inst`) of the modules whose name matches `regex`,
+    per module. Instances within gadgets are not searched."""
+    modules = netlist["modules"]
+    pattern = re.compile(regex)
+    instances: dict[str, list[str]] = {}
+    stack = [(top, "")]
+    while stack:
+        module, prefix = stack.pop()
+        for cell_name, cell in modules[module].get("cells", {}).items():
+            cell_type = cell["type"]
+            if cell_type not in modules:
+                continue
+            path = prefix + cell_name.lstrip("\\")
+            if pattern.search(module_name_and_parameters(cell_type, netlist)[0]):
+                instances.setdefault(cell_type, []).append(path)
+            else:
+                stack.append((cell_type, path + "."))
+    return {m: sorted(paths) for m, paths in sorted(instances.items())}
+
+
+def gadget_dir_name(module: str) -> str:
+    """Run directory name of the gadget module"""
+    if not module.startswith("$paramod"):
+        return module
+    name = module.split("\\")[1]
+    return f"{name}_{hashlib.sha256(module.encode()).hexdigest()[:8]}"
+
+
+def exclude_instances_regex(paths: list[str]) -> str:
+    """Regex of the signals within the instances `paths` of the flattened netlist"""
+    return "^(" + "|".join(re.escape(p) for p in sorted(paths)) + r")\..*"
@@ -1,57 +1,178 @@
 #!/usr/bin/env python3
 from pathlib import Path
 import re
+import sys
 import argparse
 from textwrap import indent
+from typing import Iterable, Optional, TextIO
 
-parser = argparse.ArgumentParser(description="Inline bind file")
-parser.add_argument("file", help="SV file to convert", type=Path)
-parser.add_argument("-b", "--bindfile", type=Path)
-parser.add_argument("-o", "--output", help="Output file")
-parser.add_argument("-i", "--inplace", help="Overwrite the input file", action="store_true")
-args = parser.parse_args()
+from file_utils import atomic_write
 
-bindfile = args.bindfile or (args.file.parent / "bindfile.sv")
+# Inline the `bind` instances of Chisel bind files into the bound modules.
+# The SV sources are streamed line by line through a small tokenizer which tracks comments, strings and
+# module boundaries, so each file is scanned once regardless of the number of bound modules.
 
+BIND_REGEX = re.compile(r"bind\s+(\w+)\s+([^;]+;)", re.MULTILINE | re.DOTALL)
 
-with open(bindfile, "r", encoding="utf8") as f:
-    bind_content = f.read()
+TOKEN_REGEX = re.compile(
+    r'(?P<string>"(?:\\.|[^"\\])*")'
+    r"|(?P<line_comment>//)"
+    r"|(?P<block_comment>/\*)"
+    r"|(?P<module>\b(?:macro)?module\b)"
+    r"|(?P<endmodule>\bendmodule\b)"
+)
+MODULE_NAME_REGEX = re.compile(r"\s*(?:(?:static|automatic)\s+)?(\w+)")
+
+
+def log(msg: str):
+    # stdout may be the output stream
+    print(msg, file=sys.stderr)
+
+
+def bind_files(paths: Iterable[Path]) -> list[Path]:
+    """Expand directories into the bind files they contain"""
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files += sorted(f for f in path.glob("*.sv") if f.is_file())
+        else:
+            files.append(path)
+    # a bind file may be given both directly and through its directory
+    return list({f.resolve(): f for f in files}.values())
+
+
+def parse_bind_files(paths: Iterable[Path]) -> dict[str, list[str]]:
+    """Returns {bound module name: [instances]}"""
     instances: dict[str, list[str]] = dict()
-    for m in re.findall(r"bind\s+(\w+)\s+([^;]+;)", bind_content, re.MULTILINE | re.DOTALL):
-        assert m
-        module_name = m[0]
-        print(f"found bind for {module_name}")
-        submodule_inst = m[1]
-        sub_insts = instances.get(module_name, [])
-        sub_insts.append(submodule_inst)
-        instances[module_name] = sub_insts
-with open(args.file, "r", encoding="utf8") as f:
-    content = f.read()
-    for module_name, submodule_instances in instances.items():
-        inject = "\n\n".join(indent(si, "  ") for si in submodule_instances)
-        inject = "  initial assume(reset);\n\n" + inject
-        inject = (
-            "`ifndef SYNTHESIS\n"
-            # + "`ifdef FORMAL\n"
-            + inject
-            # + "\n`endif // FORMAL"
-            + "\n`endif // not SYNTHESIS"
-        )
-        (content, n) = re.subn(
-            r"(.*module\s+" + module_name + r"\s*\(.*)(endmodule)",
-            rf"\1\n{inject}\n\2",
-            content,
-            flags=re.MULTILINE | re.DOTALL,
-        )
-        assert n == 1
-
-
-if args.output:
-    assert not args.inplace, "Cannot use -o and -i together"
-    with open(args.output, "w", encoding="utf8") as f:
-        f.write(content)
-elif args.inplace:
-    with open(args.file, "w", encoding="utf8") as f:
-        f.write(content)
-else:
-    print(content)
+    for bindfile in bind_files(paths):
+        with open(bindfile, "r", encoding="utf8") as f:
+            for module_name, submodule_inst in BIND_REGEX.findall(f.read()):
+                log(f"found bind for {module_name}")
+                instances.setdefault(module_name, []).append(submodule_inst)
+    return instances
+
+
+def make_inject(submodule_instances: list[str]) -> str:
+    inject = "\n\n".join(indent(si, "  ") for si in submodule_instances)
+    inject = "  initial assume(reset);\n\n" + inject
+    return (
+        "`ifndef SYNTHESIS\n"
+        # + "`ifdef FORMAL\n"
+        + inject
+        # + "\n`endif // FORMAL"
+        + "\n`endif // not SYNTHESIS"
+    )
+
+
+class BindInliner:
+    def __init__(self, instances: dict[str, list[str]]):
+        self.injects = {name: make_inject(insts) for name, insts in instances.items()}
+        # bound module name -> number of definitions the instances were inlined into
+        self.inlined: dict[str, int] = {name: 0 for name in instances}
+
+    def process(self, lines: Iterable[str], out: TextIO):
+        """Copy `lines` to `out`, inserting the bind instances before the `endmodule` of bound modules"""
+        in_comment = False
+        module: Optional[str] = None
+        expect_name = False
+        for line in lines:
+            if not (in_comment or expect_name) and "module" not in line and "/*" not in line:
+                # cannot change the state
+                out.write(line)
+                continue
+            pos = 0
+            insert_at = []
+            while pos < len(line):
+                if in_comment:
+                    end = line.find("*/", pos)
+                    if end < 0:
+                        break
+                    in_comment = False
+                    pos = end + 2
+                    continue
+                if expect_name:
+                    m = MODULE_NAME_REGEX.match(line, pos)
+                    if m is None:
+                        # name on the next line
+                        break
+                    module = m.group(1)
+                    expect_name = False
+                    pos = m.end()
+                    continue
+                m = TOKEN_REGEX.search(line, pos)
+                if m is None:
+                    break
+                pos = m.end()
+                kind = m.lastgroup
+                if kind == "line_comment":
+                    break
+                elif kind == "block_comment":
+                    in_comment = True
+                elif kind == "module":
+                    expect_name = True
+                elif kind == "endmodule":
+                    if module in self.injects:
+                        insert_at.append((m.start(), module))
+                        self.inlined[module] += 1
+                    module = None
+            if not insert_at:
+                out.write(line)
+                continue
+            start = 0
+            for p, name in insert_at:
+                out.write(line[start:p])
+                out.write(f"\n{self.injects[name]}\n")
+                start = p
+            out.write(line[start:])
+
+    def process_file(self, file: Path, output: Optional[Path] = None):
+        """Inline into `file`, writing to `output` (stdout if None). `output` may be `file` itself."""
+        if output is None:
+            with open(file, "r", encoding="utf8") as f:
+                self.process(f, sys.stdout)
+            return
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(file, "r", encoding="utf8") as f, atomic_write(output, encoding="utf8") as out:
+            self.process(f, out)
+
+    def missing(self) -> list[str]:
+        return [name for name, n in self.inlined.items() if n == 0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inline bind file")
+    parser.add_argument("files", help="SV files to convert", type=Path, nargs="+")
+    parser.add_argument(
+        "-b",
+        "--bindfile",
+        type=Path,
+        action="append",
+        help="Bind file or directory of bind files, can be repeated",
+    )
+    parser.add_argument("-o", "--output", help="Output file", type=Path)
+    parser.add_argument("-d", "--output-dir", help="Output directory", type=Path)
+    parser.add_argument("-i", "--inplace", help="Overwrite the input files", action="store_true")
+    args = parser.parse_args()
+
+    bindfiles = args.bindfile or [args.files[0].parent / "bindfile.sv"]
+
+    assert (
+        sum(map(bool, (args.output, args.output_dir, args.inplace))) <= 1
+    ), "Only one of -o, -d and -i can be used"
+    assert args.output is None or len(args.files) == 1, "Use -d or -i with multiple input files"
+
+    inliner = BindInliner(parse_bind_files(bindfiles))
+
+    for file in args.files:
+        if args.output:
+            output = args.output
+        elif args.output_dir:
+            output = args.output_dir / file.name
+        elif args.inplace:
+            output = file
+        else:
+            output = None
+        inliner.process_file(file, output)
+
+    missing = inliner.missing()
+    assert not missing, f"Bound modules not found: {', '.join(missing)}"
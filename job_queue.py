@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional, Union
+
+from quantiphy import Quantity
+
+from file_utils import atomic_write
+
+# Work queue for campaigns on several machines sharing a filesystem, without external services.
+# Jobs are JSON files moving between the directories of the queue:
+#   pending/ -> claimed/ -> done/ or failed/
+# Workers claim a job by renaming it, which only one of them can, and hold a lease on it by
+# touching the claimed file every `--poll` seconds (the mtime is the heartbeat, so the clocks of the
+# nodes must be synchronized). Any worker requeues jobs whose lease expired, i.e. whose worker died.
+# claims/<id>.log records each claim, and releases by stopped workers: the failed attempts, and
+# whether a worker still owns its job.
+# Workers run as many jobs as fit their core and memory budgets; jobs may wait for others (`after`),
+# e.g. simulations for the synthesis of their design (`run_prolead.py --synth-only`).
+
+QUEUE_DIRS = ["pending", "claimed", "done", "failed", "claims", "logs", "results"]
+SCRIPTS_DIR = Path(__file__).parent
+
+
+@dataclass
+class QueueJob:
+    id: str
+    # command; scripts of this directory (e.g. run_prolead.py) are run with this Python
+    argv: list[str]
+    cwd: str
+    # number, or "half"/"all" of the cores of the node running it (as `run_prolead.py --num-cores`)
+    cores: Union[int, str] = 1
+    memory_gb: float = 1.0
+    # ids of the jobs to complete first
+    after: list[str] = field(default_factory=list)
+    priority: int = 0
+    max_attempts: int = 3
+    submitted: float = 0.0
+
+    def command(self) -> list[str]:
+        script = SCRIPTS_DIR / self.argv[0]
+        if "/" not in self.argv[0] and script.suffix == ".py" and script.exists():
+            return [sys.executable, str(script)] + self.argv[1:]
+        return list(self.argv)
+
+
+def option_value(argv: list[str], option: str) -> Optional[str]:
+    """Value of the (last) `option` in `argv`"""
+    value = None
+    for i, a in enumerate(argv):
+        if a.startswith(option + "="):
+            value = a.split("=", 1)[1]
+        elif a == option and i + 1 < len(argv):
+            value = argv[i + 1]
+    return value
+
+
+def run_prolead_cores(argv: list[str]) -> Union[int, str]:
+    """Cores used by a run_prolead.py command: `--num-cores` (default: half of the node) per job,
+    times `--max-workers` for sweeps. Other commands are counted as one core."""
+    if all(Path(a).name != "run_prolead.py" for a in argv[:2]) or "--synth-only" in argv:
+        return 1
+    cores = option_value(argv, "--num-cores") or "half"
+    workers = int(option_value(argv, "--max-workers") or 1) if "--sweep" in argv else 1
+    if cores.isdigit():
+        return int(cores) * workers
+    if cores in ("half", "all") and workers == 1:
+        return cores
+    raise ValueError(f"Cannot determine the cores of {' '.join(argv)}, specify --cores")
+
+
+def node_cores(cores: Union[int, str]) -> int:
+    """Cores of a job on this node"""
+    if cores == "all":
+        return os.cpu_count() or 1
+    if cores == "half":
+        return max(1, (os.cpu_count() or 1) // 2)
+    return int(cores)
+
+
+def total_memory_gb() -> float:
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1e9
+
+
+class JobQueue:
+    def __init__(self, queue_dir: Path):
+        self.dir = queue_dir
+        for d in QUEUE_DIRS:
+            (self.dir / d).mkdir(parents=True, exist_ok=True)
+
+    def path(self, state: str, job_id: str) -> Path:
+        return self.dir / state / f"{job_id}.json"
+
+    def _write(self, path: Path, data: dict):
+        # workers on other hosts may have the same pid
+        with atomic_write(path, host=True) as f:
+            json.dump(data, f, indent=2)
+
+    def submit(
+        self,
+        argv: list[str],
+        cwd: Optional[Path] = None,
+        cores: Union[int, str, None] = None,
+        memory_gb: float = 1.0,
+        after: Optional[list[str]] = None,
+        priority: int = 0,
+        max_attempts: int = 3,
+    ) -> QueueJob:
+        for d in after or []:
+            if not any(self.path(s, d).exists() for s in ("pending", "claimed", "done", "failed")):
+                raise ValueError(f"Unknown job to wait for: {d}")
+        # ids sort in submission order
+        job_id = f"{time.time_ns():x}-{secrets.token_hex(3)}"
+        job = QueueJob(
+            id=job_id,
+            argv=list(argv),
+            cwd=str((cwd or Path.cwd()).absolute()),
+            cores=cores or run_prolead_cores(argv),
+            memory_gb=memory_gb,
+            after=list(after or []),
+            priority=priority,
+            max_attempts=max_attempts,
+            submitted=time.time(),
+        )
+        # written elsewhere first, so workers never see a partial job
+        tmp = self.dir / "claims" / f".{job_id}.json"
+        self._write(tmp, asdict(job))
+        os.rename(tmp, self.path("pending", job_id))
+        return job
+
+    def jobs(self, state: str) -> list[QueueJob]:
+        jobs = []
+        for f in sorted((self.dir / state).glob("*.json")):
+            try:
+                with open(f, "r") as fp:
+                    jobs.append(QueueJob(**json.load(fp)))
+            except FileNotFoundError:
+                pass  # moved by another worker
+            except (OSError, ValueError, TypeError) as e:
+                print(f"** [WARNING] Ignoring invalid job {f}: {e}")
+        return jobs
+
+    def claims(self, job_id: str) -> list[str]:
+        try:
+            with open(self.dir / "claims" / f"{job_id}.log", "r") as f:
+                return f.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+    def claim(self, job: QueueJob, claim_id: str) -> bool:
+        pending = self.path("pending", job.id)
+        try:
+            # the lease starts now: renaming keeps the mtime
+            os.utime(pending)
+            os.rename(pending, self.path("claimed", job.id))
+        except FileNotFoundError:
+            return False
+        with open(self.dir / "claims" / f"{job.id}.log", "a") as f:
+            f.write(claim_id + "\n")
+        return True
+
+    def owns(self, job_id: str, claim_id: str) -> bool:
+        claims = self.claims(job_id)
+        return bool(claims) and claims[-1] == claim_id and self.path("claimed", job_id).exists()
+
+    def heartbeat(self, job_id: str, claim_id: str) -> bool:
+        """Renew the lease, False if it was lost"""
+        if not self.owns(job_id, claim_id):
+            return False
+        try:
+            os.utime(self.path("claimed", job_id))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def finish(self, job_id: str, state: str, result: dict, from_state: str = "claimed"):
+        self._write(self.path("results", job_id), result)
+        try:
+            os.rename(self.path(from_state, job_id), self.path(state, job_id))
+        except FileNotFoundError:
+            pass
+
+    def attempts(self, job_id: str) -> int:
+        """Claims not released by their worker"""
+        claims = self.claims(job_id)
+        return len(claims) - 2 * sum(c.endswith(" released") for c in claims)
+
+    def release(self, job_id: str, claim_id: Optional[str] = None) -> bool:
+        """Return a claimed job to the queue, without counting the attempt if released by the
+        worker of `claim_id`"""
+        try:
+            os.rename(self.path("claimed", job_id), self.path("pending", job_id))
+        except FileNotFoundError:
+            return False
+        if claim_id is not None:
+            with open(self.dir / "claims" / f"{job_id}.log", "a") as f:
+                f.write(f"{claim_id} released\n")
+        return True
+
+    def requeue_expired(self, lease: float) -> list[str]:
+        """Requeue the jobs of dead workers, whose lease expired"""
+        now = time.time()
+        requeued = []
+        for f in (self.dir / "claimed").glob("*.json"):
+            try:
+                expired = now - f.stat().st_mtime > lease
+            except FileNotFoundError:
+                continue
+            if expired and self.release(f.stem):
+                owner = (self.claims(f.stem) or ["?"])[-1]
+                print(f"** [WARNING] Lease of {f.stem} ({owner}) expired, requeued")
+                requeued.append(f.stem)
+        return requeued
+
+    def retry(self, job_id: str) -> bool:
+        """Requeue a failed job, with a fresh number of attempts"""
+        try:
+            os.rename(self.path("failed", job_id), self.path("pending", job_id))
+        except FileNotFoundError:
+            return False
+        (self.dir / "claims" / f"{job_id}.log").unlink(missing_ok=True)
+        return True
+
+
+@dataclass
+class RunningJob:
+    job: QueueJob
+    claim_id: str
+    proc: subprocess.Popen
+    started: float
+
+
+class Worker:
+    def __init__(
+        self,
+        queue: JobQueue,
+        cores: int,
+        memory_gb: float,
+        lease: float = 300.0,
+        poll: float = 10.0,
+        exit_when_empty: bool = False,
+    ):
+        self.queue = queue
+        self.cores = cores
+        self.memory_gb = memory_gb
+        self.lease = lease
+        self.poll = poll
+        self.exit_when_empty = exit_when_empty
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.running: dict[str, RunningJob] = {}
+        # pending jobs which need more cores or memory than this node has
+        self.too_large: set[str] = set()
+        self.claims = 0
+        self.stop = threading.Event()
+
+    @property
+    def free_cores(self) -> int:
+        return self.cores - sum(node_cores(r.job.cores) for r in self.running.values())
+
+    @property
+    def free_memory_gb(self) -> float:
+        return self.memory_gb - sum(r.job.memory_gb for r in self.running.values())
+
+    def fits(self, job: QueueJob) -> bool:
+        """Whether the job fits the budget of this node at all"""
+        return node_cores(job.cores) <= self.cores and job.memory_gb <= self.memory_gb
+
+    def runnable(self, pending: list[QueueJob]) -> set[str]:
+        """Pending jobs this node can run, now or once the pending jobs they wait for ran"""
+        pending_ids = {j.id for j in pending}
+        ids = {j.id for j in pending if self.fits(j)}
+        changed = True
+        while changed:
+            changed = False
+            for j in pending:
+                if j.id in ids and any(d in pending_ids and d not in ids for d in j.after):
+                    ids.discard(j.id)
+                    changed = True
+        return ids
+
+    def dependencies(self, job: QueueJob) -> Optional[bool]:
+        """True if all jobs to wait for are done, False if one failed, None if pending"""
+        if any(self.queue.path("failed", d).exists() for d in job.after):
+            return False
+        return True if all(self.queue.path("done", d).exists() for d in job.after) else None
+
+    def start(self, job: QueueJob, claim_id: str):
+        log_file = self.queue.dir / "logs" / f"{job.id}.log"
+        cores = node_cores(job.cores)
+        print(f"** Starting {job.id} ({cores} cores, {job.memory_gb:g} GB): {' '.join(job.argv)}")
+        with open(log_file, "a") as log:
+            log.write(f"** {claim_id} at {time.ctime()}\n")
+            log.flush()
+            proc = subprocess.Popen(
+                job.command(),
+                cwd=job.cwd,
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+        self.running[job.id] = RunningJob(job, claim_id, proc, time.time())
+
+    def claim_jobs(self):
+        pending = sorted(self.queue.jobs("pending"), key=lambda j: (-j.priority, j.id))
+        for job in pending:
+            if not self.fits(job):
+                if job.id not in self.too_large:
+                    self.too_large.add(job.id)
+                    print(
+                        f"** [WARNING] {job.id} needs more than this node ({job.cores} cores, "
+                        f"{job.memory_gb:g} GB), left to other workers"
+                    )
+                continue
+            if node_cores(job.cores) > self.free_cores or job.memory_gb > self.free_memory_gb:
+                continue
+            deps = self.dependencies(job)
+            if deps is None:
+                continue
+            self.claims += 1
+            claim_id = f"{self.name}:{self.claims}"
+            if not self.queue.claim(job, claim_id):
+                continue
+            if deps is False:
+                print(f"** [WARNING] {job.id} skipped, a job it waits for failed")
+                self.queue.finish(job.id, "failed", {"error": "dependency failed"})
+            elif self.queue.attempts(job.id) > job.max_attempts:
+                print(f"** [WARNING] {job.id} failed after {job.max_attempts} attempts")
+                self.queue.finish(job.id, "failed", {"error": "too many attempts"})
+            else:
+                self.start(job, claim_id)
+
+    def check_running(self):
+        for job_id, r in list(self.running.items()):
+            returncode = r.proc.poll()
+            if returncode is None:
+                if not self.queue.heartbeat(job_id, r.claim_id):
+                    print(f"** [WARNING] Lost the lease of {job_id}, terminating it")
+                    r.proc.terminate()
+                    r.proc.wait()
+                    del self.running[job_id]
+                continue
+            del self.running[job_id]
+            if not self.queue.owns(job_id, r.claim_id):
+                print(f"** [WARNING] {job_id} finished after its lease was lost, discarded")
+                continue
+            result = {
+                "worker": r.claim_id,
+                "returncode": returncode,
+                "started": r.started,
+                "finished": time.time(),
+            }
+            state = "done" if returncode == 0 else "failed"
+            print(f"** {job_id} {state} (return code {returncode})")
+            self.queue.finish(job_id, state, result)
+
+    def shutdown(self):
+        """Terminate the running jobs and return them to the queue"""
+        for job_id, r in self.running.items():
+            r.proc.terminate()
+        for job_id, r in self.running.items():
+            r.proc.wait()
+            if self.queue.owns(job_id, r.claim_id):
+                self.queue.release(job_id, r.claim_id)
+                print(f"** Returned {job_id} to the queue")
+        self.running.clear()
+
+    def run(self):
+        print(f"** Worker {self.name}: {self.cores} cores, {self.memory_gb:.1f} GB")
+        try:
+            while not self.stop.is_set():
+                self.queue.requeue_expired(self.lease)
+                self.check_running()
+                self.claim_jobs()
+                if self.exit_when_empty and not self.running:
+                    # jobs too large for this node don't keep it waiting
+                    pending = self.queue.jobs("pending")
+                    if not self.runnable(pending) and not self.queue.jobs("claimed"):
+                        break
+                self.stop.wait(self.poll)
+        finally:
+            self.shutdown()
+
+
+def print_status(queue: JobQueue, lease: float):
+    now = time.time()
+    for state in ("pending", "claimed", "done", "failed"):
+        jobs = queue.jobs(state)
+        print(f"** {state}: {len(jobs)}")
+        if state not in ("pending", "claimed", "failed"):
+            continue
+        for job in jobs:
+            info = f"{job.cores} cores, {job.memory_gb:g} GB"
+            if state == "claimed":
+                try:
+                    age = now - queue.path("claimed", job.id).stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                owner = (queue.claims(job.id) or ["?"])[-1]
+                info += f", {owner}, heartbeat {age:.0f}s ago" + (
+                    " (expired)" if age > lease else ""
+                )
+            elif job.after:
+                info += f", after {', '.join(job.after)}"
+            print(f"  {job.id} [{info}] {' '.join(job.argv)}")
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="File-based work queue for PROLEAD campaigns")
+    argparser.add_argument("queue_dir", type=Path, help="Queue directory on the shared filesystem")
+    argparser.add_argument(
+        "--lease",
+        type=float,
+        default=300.0,
+        help="Seconds without heartbeat until a job is requeued",
+    )
+    subparsers = argparser.add_subparsers(dest="command", required=True)
+
+    submit = subparsers.add_parser(
+        "submit", help="Submit a job, e.g. `submit -- run_prolead.py ...`"
+    )
+    submit.add_argument(
+        "--cores",
+        type=lambda s: s if s in ("half", "all") else int(s),
+        default=None,
+        help="Cores of the job, a number or half/all of the node (default: from the --num-cores "
+        "and --max-workers of run_prolead.py, else 1)",
+    )
+    submit.add_argument(
+        "--memory", type=lambda s: float(Quantity(s, "B")) / 1e9, default=1.0, help="e.g. 16G"
+    )
+    submit.add_argument("--after", nargs="+", default=[], help="Ids of the jobs to wait for")
+    submit.add_argument("--priority", type=int, default=0, help="Higher priorities run first")
+    submit.add_argument("--max-attempts", type=int, default=3, help="Claims before failing")
+    submit.add_argument("argv", nargs=argparse.REMAINDER, help="Command")
+
+    work = subparsers.add_parser("work", help="Run jobs of the queue on this node")
+    work.add_argument("--cores", type=int, default=os.cpu_count(), help="Core budget")
+    work.add_argument(
+        "--memory",
+        type=lambda s: float(Quantity(s, "B")) / 1e9,
+        default=total_memory_gb(),
+        help="Memory budget, e.g. 64G",
+    )
+    work.add_argument("--poll", type=float, default=10.0, help="Seconds between queue scans")
+    work.add_argument("--exit-when-empty", action="store_true", help="Stop when the queue is empty")
+
+    subparsers.add_parser("status", help="Show the jobs of the queue")
+    retry = subparsers.add_parser("retry", help="Requeue failed jobs")
+    retry.add_argument("ids", nargs="*", help="Job ids (default: all failed jobs)")
+    args = argparser.parse_args()
+
+    queue = JobQueue(args.queue_dir)
+    if args.command == "submit":
+        argv = args.argv[1:] if args.argv[:1] == ["--"] else args.argv
+        if not argv:
+            argparser.error("No command to submit")
+        try:
+            job = queue.submit(
+                argv,
+                cores=args.cores,
+                memory_gb=args.memory,
+                after=args.after,
+                priority=args.priority,
+                max_attempts=args.max_attempts,
+            )
+        except ValueError as e:
+            argparser.error(str(e))
+        print(job.id)
+    elif args.command == "work":
+        worker = Worker(queue, args.cores, args.memory, args.lease, args.poll, args.exit_when_empty)
+        signal.signal(signal.SIGTERM, lambda *_: worker.stop.set())
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "status":
+        print_status(queue, args.lease)
+    elif args.command == "retry":
+        for job_id in args.ids or [j.id for j in queue.jobs("failed")]:
+            if queue.retry(job_id):
+                print(f"** Requeued {job_id}")
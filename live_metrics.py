@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+from file_utils import atomic_write
+
+# Live progress of the PROLEAD runs of this process, for dashboards and schedulers: served over
+# HTTP in the Prometheus text format (`/metrics`) and as JSON (`/status.json`), and/or periodically
+# written to a status JSON file. All hooks are no-ops unless serving or a status file is enabled.
+
+
+@dataclass
+class RunMetrics:
+    run_id: str
+    top: str
+    # simulations to run (N)
+    target_sims: int = 0
+    n_sim: int = 0
+    elapsed_time: float = 0.0
+    ram_gb: float = 0.0
+    peak_ram_gb: float = 0.0
+    p_log: float = 0.0
+    max_p_log: float = 0.0
+    leakage: bool = False
+    # rolling estimates of `run_prolead.ThroughputEstimator`
+    sims_per_sec: Optional[float] = None
+    # seconds until `target_sims` are reached
+    eta: Optional[float] = None
+    projected_peak_ram_gb: Optional[float] = None
+    # signals with the highest -log10(p): cycle, signal, first_n_sim, max_p_log, hits
+    top_leaking_signals: list[dict] = field(default_factory=list)
+    # running, done, failed or terminated
+    state: str = "running"
+    started: float = 0.0
+    updated: float = 0.0
+
+    def to_json(self) -> dict:
+        return asdict(self)
+
+
+# (name, description, RunMetrics attribute)
+PROMETHEUS_GAUGES = [
+    ("prolead_simulations", "Completed simulations", "n_sim"),
+    ("prolead_target_simulations", "Simulations to run", "target_sims"),
+    ("prolead_simulations_per_second", "Recent simulation throughput", "sims_per_sec"),
+    ("prolead_elapsed_seconds", "Elapsed time reported by PROLEAD", "elapsed_time"),
+    ("prolead_p_log", "Current highest -log10(p)", "p_log"),
+    ("prolead_max_p_log", "Maximum -log10(p) of the run", "max_p_log"),
+    ("prolead_leakage", "Whether leakage was detected", "leakage"),
+    ("prolead_ram_gigabytes", "Current RAM usage of PROLEAD", "ram_gb"),
+    ("prolead_projected_ram_gigabytes", "Projected RAM at the target", "projected_peak_ram_gb"),
+    ("prolead_eta_seconds", "Estimated time until the target simulations are reached", "eta"),
+    ("prolead_running", "Whether the run is in progress", "running"),
+]
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class LiveMetrics:
+    def __init__(self):
+        self.enabled = False
+        self.runs: dict[str, RunMetrics] = {}
+        self.lock = threading.Lock()
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.status_file: Optional[Path] = None
+        self.status_interval = 10.0
+        self._stop = threading.Event()
+
+    def start_run(self, run_id: str, top: str, target_sims: int = 0) -> Optional[RunMetrics]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        run = RunMetrics(run_id=run_id, top=top, target_sims=target_sims, started=now, updated=now)
+        with self.lock:
+            self.runs[run_id] = run
+        return run
+
+    def update(self, run: Optional[RunMetrics], **values):
+        if run is None:
+            return
+        with self.lock:
+            for k, v in values.items():
+                setattr(run, k, v)
+            run.updated = time.time()
+
+    def snapshot(self) -> list[dict]:
+        with self.lock:
+            return [r.to_json() for r in self.runs.values()]
+
+    def status(self) -> dict:
+        return {"pid": os.getpid(), "time": time.time(), "runs": self.snapshot()}
+
+    def prometheus_text(self) -> str:
+        runs = self.snapshot()
+        lines = []
+        for name, description, attr in PROMETHEUS_GAUGES:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            for r in runs:
+                value = r["state"] == "running" if attr == "running" else r[attr]
+                if value is None:
+                    continue
+                labels = f'run="{_label(r["run_id"])}",top="{_label(r["top"])}"'
+                lines.append(f"{name}{{{labels}}} {float(value)!r}")
+        lines.append("# HELP prolead_signal_max_p_log Maximum -log10(p) of the top leaking signals")
+        lines.append("# TYPE prolead_signal_max_p_log gauge")
+        for r in runs:
+            for leak in r["top_leaking_signals"]:
+                labels = (
+                    f'run="{_label(r["run_id"])}",top="{_label(r["top"])}",'
+                    f'signal="{_label(leak["signal"])}",cycle="{leak["cycle"]}"'
+                )
+                lines.append(f"prolead_signal_max_p_log{{{labels}}} {float(leak['max_p_log'])!r}")
+        return "\n".join(lines) + "\n"
+
+    def write_status(self):
+        if self.status_file is None:
+            return
+        with atomic_write(self.status_file) as f:
+            json.dump(self.status(), f, indent=2)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> int:
+        """Serve the metrics in a daemon thread, returns the port (`port` 0 picks a free one)"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/metrics":
+                    body = metrics.prometheus_text().encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif path == "/status.json":
+                    body = json.dumps(metrics.status()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.enabled = True
+        port = self.server.server_address[1]
+        print(f"** Serving live metrics on http://{host}:{port}/metrics")
+        return port
+
+    def write_status_every(self, status_file: Path, interval: float = 10.0):
+        """Rewrite `status_file` every `interval` seconds, and when runs finish"""
+        self.status_file = status_file
+        self.status_interval = interval
+        status_file.parent.mkdir(parents=True, exist_ok=True)
+        self.enabled = True
+
+        def loop():
+            while not self._stop.wait(self.status_interval):
+                self.write_status()
+
+        threading.Thread(target=loop, daemon=True).start()
+
+    def finish_run(self, run: Optional[RunMetrics], state: str):
+        if run is None:
+            return
+        self.update(run, state=state, eta=0.0 if state == "done" else None)
+        self.write_status()
+
+    def stop(self):
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+        self.write_status()
+
+
+live_metrics = LiveMetrics()
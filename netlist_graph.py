@@ -0,0 +1,113 @@
+import re
+from collections import deque
+from typing import Iterable, Optional
+
+# Bit-level connectivity of a module of a Yosys JSON netlist
+
+FF_CELL_REGEX = re.compile(r"(?i)dff|latch")
+
+
+class NetlistGraph:
+    def __init__(self, netlist: dict, module_name: str):
+        module = netlist["modules"][module_name]
+        self.module_name = module_name
+        self.ports: dict[str, dict] = module["ports"]
+        self.cells: dict[str, dict] = module.get("cells", {})
+        # bit -> name of the driving cell
+        self.drivers: dict[int, str] = {}
+        # bit -> names of the cells reading it
+        self.loads: dict[int, list[str]] = {}
+        self.cell_inputs: dict[str, list[int]] = {}
+        self.cell_outputs: dict[str, list[int]] = {}
+        for name, cell in self.cells.items():
+            directions = cell.get("port_directions", {})
+            inputs, outputs = [], []
+            for p, bits in cell["connections"].items():
+                bits = [b for b in bits if isinstance(b, int)]  # skip constants
+                if directions.get(p) == "output":
+                    outputs += bits
+                else:
+                    inputs += bits
+            self.cell_inputs[name] = inputs
+            self.cell_outputs[name] = outputs
+            for b in outputs:
+                self.drivers[b] = name
+            for b in inputs:
+                self.loads.setdefault(b, []).append(name)
+
+    def is_ff(self, cell_name: str) -> bool:
+        return bool(FF_CELL_REGEX.search(self.cells[cell_name]["type"]))
+
+    def port_bits(
+        self, name: str, start_bit: Optional[int] = None, width: Optional[int] = None
+    ) -> list[int]:
+        bits = self.ports[name]["bits"]
+        if start_bit is not None:
+            bits = bits[start_bit : start_bit + (width or 1)]
+        return bits
+
+    def output_bits(self) -> set[int]:
+        return {
+            b
+            for p in self.ports.values()
+            if p["direction"] == "output"
+            for b in p["bits"]
+            if isinstance(b, int)
+        }
+
+    def reaches(
+        self, bits: Iterable[int], targets: set[int], stop_at_registers: bool = False
+    ) -> bool:
+        """Whether any of `bits` reaches `targets`, or any register if `stop_at_registers`"""
+        seen = set(bits)
+        if seen & targets:
+            return True
+        queue = deque(seen)
+        while queue:
+            b = queue.popleft()
+            for cell in self.loads.get(b, []):
+                if stop_at_registers and self.is_ff(cell):
+                    return True
+                for out in self.cell_outputs[cell]:
+                    if out in targets:
+                        return True
+                    if out not in seen:
+                        seen.add(out)
+                        queue.append(out)
+        return False
+
+    def register_latency(self, from_ports: list[str]) -> int:
+        """Maximum number of registers on a path from the `from_ports` inputs to an output port of
+        the (flattened) module. Sequential loops, e.g. of counters, are cut."""
+        sources = {b for name in from_ports for b in self.port_bits(name) if isinstance(b, int)}
+
+        # registers on the longest path from a source, None if not reachable from any source
+        memo: dict[int, Optional[int]] = {}
+        on_stack: set[int] = set()
+
+        def latency(bit: int) -> Optional[int]:
+            stack = [(bit, False)]
+            while stack:
+                b, expanded = stack.pop()
+                if b in memo or (not expanded and b in on_stack):
+                    continue
+                if expanded:
+                    cell = self.drivers[b]
+                    values = [memo[i] for i in self.cell_inputs[cell] if memo.get(i) is not None]
+                    memo[b] = max(values) + self.is_ff(cell) if values else None
+                    on_stack.discard(b)
+                elif b in sources:
+                    memo[b] = 0
+                elif b not in self.drivers:
+                    memo[b] = None
+                else:
+                    on_stack.add(b)
+                    stack.append((b, True))
+                    stack += [
+                        (i, False)
+                        for i in self.cell_inputs[self.drivers[b]]
+                        if i not in memo and i not in on_stack
+                    ]
+            return memo[bit]
+
+        return max((latency(b) or 0 for b in self.output_bits()), default=0)
@@ -1,87 +1,76 @@
 #!/usr/bin/env python3
 import argparse
+import json
 from pathlib import Path
 
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 
+# Post-processing stage plotting the -log10(p) curves of PROLEAD runs from their `<top>_data.npz`.
+# `run_prolead.py` starts it in the background after each run (`--plot-mode background`), or it
+# plots all runs of a run directory in one batch afterwards (`--plot-mode deferred`), e.g.
+# `./plot_prolead.py prolead_run --format pdf --dpi 300`.
 
-from rich.console import Console
-from rich.table import Table
-from rich.live import Live
-import time
+PLOT_FORMATS = ["png", "pdf", "svg", "jpg"]
 
 
-argparser = argparse.ArgumentParser(description="Plot ProLead")
-argparser.add_argument("data", help="Data file", type=Path)
-argparser.add_argument("--output", default=None, help="Output file", type=Path)
-argparser.add_argument("--dpi", default=600, help="DPI of the output image.", type=int)
+def find_data_files(paths: list[Path]) -> list[Path]:
+    files = []
+    for p in paths:
+        files += sorted(p.rglob("*_data.npz")) if p.is_dir() else [p]
+    return files
 
-args = argparser.parse_args()
 
-console = Console()
+def load_data(data_file: Path) -> np.ndarray:
+    with np.load(data_file) as data:
+        if isinstance(data, np.lib.npyio.NpzFile):
+            return data["arr_0"] if "arr_0" in data.files else data[data.files[0]]
+        return data
 
-data_file = args.data
-assert data_file and isinstance(data_file, Path)
 
-sns.set_theme(style="whitegrid", context="paper")
-plt.figure()
+def sca_config_of(data_file: Path) -> dict:
+    """Side-channel analysis config of the run of `data_file`"""
+    config_file = data_file.with_name("config.json")
+    if not config_file.exists():
+        return {}
+    with open(config_file, "r") as f:
+        return json.load(f).get("side_channel_analysis", {})
 
-table = Table()
-table.add_column("ID")
-table.add_column("Value")
 
+if __name__ == "__main__":
+    from run_prolead import plot_data
 
-
-
-with Live(table, console=console, refresh_per_second=4) as live:
-    for i in range(10):
-        table.add_row(str(i), str(i * 2))
-        time.sleep(1)
-
-with np.load(data_file) as data:
-    if isinstance(data, np.lib.npyio.NpzFile):
-        key = data.files[0]
-        data_np = data[key]
-    else:
-        data_np = data
-
-    print(f"Loaded data {data_np.shape}")
-
-    x = data_np[:, 0]
-    y = data_np[:, 1]
-
-    num_sims = np.max(x)
-    max_p_log = np.max(y)
-
-    if num_sims > 10_000_000_000:
-        x_scale = 1_000_000_000
-    elif num_sims > 10_000_000:
-        x_scale = 1_000_000
-    elif num_sims > 10_000:
-        x_scale = 1_000
-    else:
-        x_scale = 1
-
-    if x_scale > 1:
-        x = x / x_scale
-
-    plot = sns.lineplot(
-        x=x,
-        y=y,
-        # kind="line",
-        label=r"$-\log_{10}(p)$",
+    argparser = argparse.ArgumentParser(description="Plot PROLEAD runs")
+    argparser.add_argument(
+        "data", nargs="+", type=Path, help="Data files (*_data.npz) or run directories"
     )
-    plot.axhline(y=max_p_log, linestyle="--", label="Minimum p-value", alpha=0.5)
-    plot.axhline(y=5, color="r", linestyle="--", label="Threshold")
-    plot.set_xlabel("Number of Simulations" + (fr" ($\times${int(x_scale):,})" if x_scale > 1 else ""))
-    plot.set_ylabel(r"$-\log_{10}(p)$")
-    plot.legend(loc="best", fancybox=True, framealpha=0.9)
-    plt.tight_layout()
-
-    fig_file = args.output or data_file.with_suffix(".png")
-
-    print(f"Saving plot to {fig_file}")
-    plt.savefig(fig_file, dpi=args.dpi)
-    plt.show()
+    argparser.add_argument(
+        "--output", default=None, type=Path, help="Output file (only for a single data file)"
+    )
+    argparser.add_argument("--format", default="png", choices=PLOT_FORMATS, help="Image format")
+    argparser.add_argument("--dpi", default=600, type=int, help="DPI of the output image")
+    argparser.add_argument(
+        "--force", action="store_true", help="Also plot runs with an up-to-date plot"
+    )
+    argparser.add_argument("--show", action="store_true", help="Show the figures")
+    args = argparser.parse_args()
+
+    data_files = find_data_files(args.data)
+    if args.output and len(data_files) != 1:
+        argparser.error("--output requires a single data file")
+    for data_file in data_files:
+        fig_file = args.output or data_file.with_suffix(f".{args.format}")
+        if (
+            not args.force
+            and fig_file.exists()
+            and fig_file.stat().st_mtime >= data_file.stat().st_mtime
+        ):
+            continue
+        try:
+            data_np = load_data(data_file)
+            print(f"Loaded data {data_np.shape} from {data_file}")
+            if not len(data_np):
+                continue
+            plot_data(data_np, fig_file, sca_config_of(data_file), args.show, args.dpi)
+        except Exception as e:
+            # don't lose the other plots of a batch
+            print(f"** [ERROR] Plotting {data_file} failed: {e}")
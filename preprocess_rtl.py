@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from file_utils import atomic_write
+from inline_bind import BindInliner, parse_bind_files
+
+# Preprocess Chisel generated RTL directories (`gen_rtl/<package>.<Class>`) for the formal and PROLEAD flows:
+# inline the bind files into the sources, keep assertion-only files out of the synthesis sources, and write
+# source lists for `run_prolead.py --sources-list`. Files are processed in parallel, and only when they or
+# the bind files changed since the last run.
+
+MANIFEST_VERSION = 1
+
+ASSERT_FILE_REGEX = re.compile(r".*_assert\.s?v$")
+BIND_STMT_REGEX = re.compile(r"^\s*bind\s+\w+", re.MULTILINE)
+MODULE_REGEX = re.compile(r"\b(?:macro)?module\b")
+
+argparser = argparse.ArgumentParser(description="Preprocess Chisel generated RTL")
+argparser.add_argument("dirs", nargs="+", type=Path, help="Chisel output directories")
+argparser.add_argument(
+    "-o",
+    "--output-root",
+    type=Path,
+    default=Path("preprocessed_rtl"),
+    help="Outputs of each directory are written to OUTPUT_ROOT/<directory name>",
+)
+argparser.add_argument(
+    "-j", "--jobs", type=int, default=os.cpu_count(), help="Number of parallel workers"
+)
+argparser.add_argument("--force", action="store_true", help="Reprocess all files")
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def scan_file(path: Path) -> tuple[str, str]:
+    """Returns (sha256, kind) with kind one of "bind", "assert" or "source" """
+    with open(path, "rb") as f:
+        data = f.read()
+    if ASSERT_FILE_REGEX.fullmatch(path.name):
+        kind = "assert"
+    else:
+        text = data.decode("utf8", errors="replace")
+        is_bind = BIND_STMT_REGEX.search(text) and not MODULE_REGEX.search(text)
+        kind = "bind" if is_bind else "source"
+    return sha256_bytes(data), kind
+
+
+def inline_file(path: Path, output: Path, instances: dict[str, list[str]]) -> list[str]:
+    """Returns the bound modules inlined into `path`"""
+    inliner = BindInliner(instances)
+    inliner.process_file(path, output)
+    return [name for name, n in inliner.inlined.items() if n > 0]
+
+
+def load_manifest(manifest_file: Path) -> dict:
+    try:
+        with open(manifest_file, "r") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+
+def rtl_files(rtl_dir: Path) -> list[Path]:
+    return sorted(f for f in rtl_dir.rglob("*") if f.is_file() and f.suffix in (".sv", ".v"))
+
+
+def preprocess(
+    rtl_dir: Path, out_dir: Path, executor: ProcessPoolExecutor, force: bool = False
+) -> dict:
+    """Preprocess `rtl_dir` into `out_dir` and return the manifest"""
+    rtl_dir = rtl_dir.resolve()
+    out_dir = out_dir.resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_file = out_dir / "manifest.json"
+    old_files: dict[str, dict] = {} if force else load_manifest(manifest_file).get("files", {})
+
+    files = [f for f in rtl_files(rtl_dir) if out_dir not in f.parents]
+    entries: dict[str, dict] = {}
+    to_scan = []
+    for f in files:
+        rel = f.relative_to(rtl_dir).as_posix()
+        st = f.stat()
+        old = old_files.get(rel)
+        if old and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+            entries[rel] = dict(old)
+        else:
+            entries[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            to_scan.append(rel)
+    for rel, (sha, kind) in zip(to_scan, executor.map(scan_file, [rtl_dir / r for r in to_scan])):
+        entries[rel].update(sha256=sha, kind=kind)
+
+    bind_files = sorted(rel for rel, e in entries.items() if e["kind"] == "bind")
+    instances = parse_bind_files(rtl_dir / rel for rel in bind_files)
+    bind_hash = sha256_bytes(
+        "\0".join(f"{rel}:{entries[rel]['sha256']}" for rel in bind_files).encode()
+    )
+
+    to_inline = []
+    for rel, e in entries.items():
+        if e["kind"] != "source":
+            e.pop("output", None)
+            continue
+        e["output"] = rel
+        old = old_files.get(rel)
+        unchanged = (
+            old is not None
+            and old.get("sha256") == e["sha256"]
+            and old.get("bind_hash") == bind_hash
+            and (out_dir / rel).exists()
+        )
+        if unchanged:
+            e["inlined"] = old.get("inlined", [])
+        else:
+            to_inline.append(rel)
+        e["bind_hash"] = bind_hash
+    futures = {
+        rel: executor.submit(inline_file, rtl_dir / rel, out_dir / rel, instances)
+        for rel in to_inline
+    }
+    for rel, future in futures.items():
+        entries[rel]["inlined"] = future.result()
+
+    # remove outputs of deleted sources
+    for rel, old in old_files.items():
+        if old.get("output") and rel not in entries:
+            (out_dir / old["output"]).unlink(missing_ok=True)
+
+    inlined = {m for e in entries.values() for m in e.get("inlined", [])}
+    missing = [m for m in instances if m not in inlined]
+    if missing:
+        print(f"** [WARNING] {rtl_dir.name}: bound modules not found: {', '.join(missing)}")
+
+    sources = [out_dir / e["output"] for e in entries.values() if e["kind"] == "source"]
+    asserts = [rtl_dir / rel for rel, e in entries.items() if e["kind"] == "assert"]
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "rtl_dir": str(rtl_dir),
+        "bind_hash": bind_hash,
+        "files": entries,
+        "synthesis_sources": [str(s) for s in sources],
+        "formal_sources": [str(s) for s in asserts + sources],
+    }
+    with atomic_write(out_dir / "sources.txt") as f:
+        f.writelines(f"{s}\n" for s in sources)
+    with atomic_write(out_dir / "formal_sources.txt") as f:
+        f.writelines(f"{s}\n" for s in asserts + sources)
+    with atomic_write(manifest_file) as f:
+        json.dump(manifest, f, indent=2)
+    print(
+        f"** {rtl_dir.name}: {len(files)} files, {len(bind_files)} bind files, "
+        f"{len(to_inline)}/{len(sources)} sources processed -> {out_dir / 'sources.txt'}"
+    )
+    return manifest
+
+
+if __name__ == "__main__":
+    args = argparser.parse_args()
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        for rtl_dir in args.dirs:
+            assert rtl_dir.is_dir(), f"{rtl_dir} is not a directory"
+            preprocess(rtl_dir, args.output_root / rtl_dir.resolve().name, executor, args.force)
+    print(f"** Done in {time.perf_counter() - t0:.2f}s")
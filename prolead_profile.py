@@ -0,0 +1,160 @@
+import atexit
+import cProfile
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Optional
+
+from file_utils import atomic_write
+
+# Lightweight instrumentation of the PROLEAD flow: wall-time of phases, event counters, and optional
+# cProfile/tracemalloc capture. All hooks are no-ops unless the profiler is enabled.
+# Phases nest (e.g. `npz_write` within `prolead`): the breakdown is of the self time of each phase,
+# excluding its nested phases, so it adds up. Phases of concurrent threads are added up as well, so
+# percentages are of the time in all phases rather than of the wall time.
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        # inclusive and self time
+        self.phases: dict[str, float] = {}
+        self.phase_self_time: dict[str, float] = {}
+        self.phase_calls: dict[str, int] = {}
+        self.phase_peak_memory: dict[str, int] = {}
+        self.counters: dict[str, int] = {}
+        self.cprofile: Optional[cProfile.Profile] = None
+        self.cprofile_file: Optional[Path] = None
+        self.trace_memory = False
+        self.start_time = time.perf_counter()
+        self._null_phase = nullcontext()
+        self._lock = threading.Lock()
+        # open phases of each thread: [name, time of nested phases]
+        self._stack = threading.local()
+        self._active_phases = 0
+        self._threads: set[int] = set()
+
+    def enable(
+        self,
+        cprofile_file: Optional[Path] = None,
+        trace_memory: bool = False,
+        print_at_exit: bool = True,
+    ):
+        self.enabled = True
+        self.start_time = time.perf_counter()
+        if cprofile_file:
+            self.cprofile_file = cprofile_file
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        if trace_memory:
+            self.trace_memory = True
+            tracemalloc.start()
+        if print_at_exit:
+            atexit.register(self.print_report)
+
+    def phase(self, name: str):
+        """Context manager measuring the wall-time of the phase `name`"""
+        if not self.enabled:
+            return self._null_phase
+        return self._phase(name)
+
+    @contextmanager
+    def _phase(self, name: str):
+        stack = self._stack.__dict__.setdefault("phases", [])
+        with self._lock:
+            # the tracemalloc peak is global: only reset it when no phase (of any thread) is open,
+            # so the peaks of nested and concurrent phases are those since the outermost one began
+            if self.trace_memory and self._active_phases == 0:
+                tracemalloc.reset_peak()
+            self._active_phases += 1
+            self._threads.add(threading.get_ident())
+        frame = [name, 0.0]
+        stack.append(frame)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            self_time = elapsed - frame[1]
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            with self._lock:
+                self._active_phases -= 1
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+                self.phase_self_time[name] = self.phase_self_time.get(name, 0.0) + self_time
+                self.phase_calls[name] = self.phase_calls.get(name, 0) + 1
+                if self.trace_memory:
+                    _, peak = tracemalloc.get_traced_memory()
+                    self.phase_peak_memory[name] = max(self.phase_peak_memory.get(name, 0), peak)
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def stop(self):
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            assert self.cprofile_file
+            self.cprofile.dump_stats(self.cprofile_file)
+            self.cprofile = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def report(self) -> dict:
+        total = time.perf_counter() - self.start_time
+        return {
+            "total_time": total,
+            "phase_time": sum(self.phase_self_time.values()),
+            "threads": len(self._threads),
+            "phases": {
+                name: {
+                    "time": t,
+                    "self_time": self.phase_self_time[name],
+                    "calls": self.phase_calls[name],
+                    **(
+                        {"peak_memory": self.phase_peak_memory[name]}
+                        if name in self.phase_peak_memory
+                        else {}
+                    ),
+                }
+                for name, t in self.phases.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+    def write_report(self, report_file: Path):
+        if self.enabled:
+            with atomic_write(report_file) as f:
+                json.dump(self.report(), f, indent=2)
+
+    def print_report(self):
+        if not self.enabled:
+            return
+        self.stop()
+        report = self.report()
+        phase_time = report["phase_time"]
+        threads = f" over {report['threads']} threads" if report["threads"] > 1 else ""
+        print(
+            f"\n** Timing breakdown (total {report['total_time']:.3f}s, {phase_time:.3f}s in "
+            f"phases{threads}; self time, excluding nested phases):"
+        )
+        for name, p in sorted(report["phases"].items(), key=lambda x: -x[1]["self_time"]):
+            t = p["self_time"]
+            share = 100 * t / phase_time if phase_time else 0.0
+            nested = f" ({p['time']:.3f}s with nested)" if p["time"] - t > 5e-4 else ""
+            mem = f"  peak {p['peak_memory'] / 2**20:.1f} MiB" if "peak_memory" in p else ""
+            print(f"  {name:24s} {t:10.3f}s {share:5.1f}% ({p['calls']}x){nested}{mem}")
+        for name, n in report["counters"].items():
+            print(f"  {name:24s} {n:,}")
+        if self.cprofile_file:
+            print(f"** cProfile stats written to {self.cprofile_file}")
+            pstats.Stats(str(self.cprofile_file)).sort_stats("cumulative").print_stats(15)
+        self.enabled = False
+
+
+profiler = Profiler()
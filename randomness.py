@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import argparse
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from netlist_graph import NetlistGraph
+
+# Accounting of the fresh randomness consumed by a masked design. All inputs classified as `random`
+# are refreshed every cycle (`always_random_inputs` of the PROLEAD config), so each of their bits
+# costs one TRNG bit per cycle. Random bits which cannot influence a register or an output never
+# reach a gadget and can be removed.
+
+
+@dataclass
+class RandomnessReport:
+    top: str
+    # fresh random bits per cycle
+    bits_per_cycle: int = 0
+    # register stages from the share inputs to the outputs
+    latency: Optional[int] = None
+    # bit -> number of cells reading it
+    fanout: dict[str, int] = field(default_factory=dict)
+    # not connected to any cell
+    unused_bits: list[str] = field(default_factory=list)
+    # connected, but never reaching a register or an output
+    dead_bits: list[str] = field(default_factory=list)
+
+    @property
+    def removable_bits(self) -> list[str]:
+        return self.unused_bits + self.dead_bits
+
+    @property
+    def live_bits_per_cycle(self) -> int:
+        return self.bits_per_cycle - len(self.removable_bits)
+
+    def bits_per_operation(self, cycles_per_operation: int = 1) -> int:
+        """Random bits per operation when an operation starts every `cycles_per_operation` cycles"""
+        return self.bits_per_cycle * cycles_per_operation
+
+    def to_json(self) -> dict:
+        return {
+            **asdict(self),
+            "live_bits_per_cycle": self.live_bits_per_cycle,
+            "bits_per_operation_pipelined": self.bits_per_operation(1),
+            "bits_per_operation_unpipelined": (
+                self.bits_per_operation(self.latency) if self.latency else None
+            ),
+        }
+
+    def print(self):
+        print(f"** Randomness of {self.top}:")
+        print(f"  random bits per cycle:     {self.bits_per_cycle}")
+        print(f"  random bits per operation: {self.bits_per_operation(1)} (pipelined)", end="")
+        if self.latency:
+            print(f", {self.bits_per_operation(self.latency)} (one per {self.latency} cycles)")
+        else:
+            print()
+        if self.fanout:
+            fanouts = sorted(self.fanout.values())
+            median = fanouts[len(fanouts) // 2]
+            print(
+                f"  fan-out per random bit:    min {fanouts[0]}, median {median}, max {fanouts[-1]}"
+            )
+        if self.removable_bits:
+            n = len(self.removable_bits)
+            print(
+                f"** [WARNING] {n} random bits never reach a gadget and can be removed "
+                f"({self.live_bits_per_cycle} bits per cycle would remain):"
+            )
+            if self.unused_bits:
+                print(f"  unused: {', '.join(self.unused_bits)}")
+            if self.dead_bits:
+                print(f"  dead:   {', '.join(self.dead_bits)}")
+
+
+def randomness_report(
+    netlist: dict, top: str, ports: list, latency: Optional[int] = None
+) -> RandomnessReport:
+    """`ports` are the classified ports (`run_prolead.Port`)"""
+    graph = NetlistGraph(netlist, top)
+    report = RandomnessReport(top=top)
+    share_inputs = [p.name for p in ports if p.is_input and p.share_id is not None]
+    report.latency = graph.register_latency(share_inputs) if latency is None else latency
+    sinks = graph.output_bits()
+    for p in ports:
+        if p.type != "random" or not p.is_input:
+            continue
+        start = p.start_bit or 0
+        for i, b in enumerate(graph.port_bits(p.name, p.start_bit, p.width)):
+            report.bits_per_cycle += 1
+            bit_name = f"{p.name}[{start + i}]" if p.num_bits > 1 or p.start_bit else p.name
+            if not isinstance(b, int) or b not in graph.loads:
+                report.unused_bits.append(bit_name)
+                continue
+            report.fanout[bit_name] = len(graph.loads[b])
+            if not graph.reaches([b], sinks, stop_at_registers=True):
+                report.dead_bits.append(bit_name)
+    return report
+
+
+if __name__ == "__main__":
+    from run_prolead import Port, classify_ports, get_top_module_and_ports
+
+    argparser = argparse.ArgumentParser(description="Randomness report of a Yosys JSON netlist")
+    argparser.add_argument("netlist", type=Path, help="Yosys JSON netlist")
+    argparser.add_argument("--ports-json", type=Path, default=None, help="Port information json")
+    argparser.add_argument(
+        "--latency", type=int, default=None, help="Latency in cycles (default: from the netlist)"
+    )
+    argparser.add_argument("-o", "--output", type=Path, default=None, help="Write report to JSON")
+    args = argparser.parse_args()
+
+    with open(args.netlist, "r") as f:
+        netlist = json.load(f)
+    top, ports = get_top_module_and_ports(netlist)
+    assert top, "Top module not found in the netlist"
+    classified = [Port(**p) for p in classify_ports(ports, args.ports_json)]
+    report = randomness_report(netlist, top, classified, args.latency)
+    report.print()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report.to_json(), f, indent=2)
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import json
+import re
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+# Indexed SQLite store of the results of all PROLEAD runs: config, seed, netlist hash, progress
+# curve, leaking signals and performance of every run. The database is in WAL mode, so concurrent
+# jobs (and processes) can write to it while it is queried. Runs are keyed by their run directory;
+# ingesting a run directory again replaces its record.
+
+console = Console()
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_dir TEXT NOT NULL UNIQUE,
+    top TEXT NOT NULL,
+    finished REAL NOT NULL,
+    job_key TEXT,
+    config_hash TEXT,
+    netlist_sha256 TEXT,
+    random_seed INTEGER,
+    security_order INTEGER,
+    transitional INTEGER,
+    num_simulations INTEGER,
+    sim_cycles INTEGER,
+    n_sim INTEGER,
+    elapsed_time REAL,
+    sims_per_sec REAL,
+    peak_ram_gb REAL,
+    max_p_log REAL,
+    leakage INTEGER,
+    returncode INTEGER,
+    error TEXT,
+    config TEXT,
+    randomness TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_top ON runs (top, finished);
+CREATE INDEX IF NOT EXISTS runs_finished ON runs (finished);
+CREATE INDEX IF NOT EXISTS runs_leakage ON runs (leakage, finished);
+CREATE INDEX IF NOT EXISTS runs_config_hash ON runs (config_hash);
+CREATE INDEX IF NOT EXISTS runs_netlist ON runs (netlist_sha256);
+
+CREATE TABLE IF NOT EXISTS progress (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    n_sim INTEGER NOT NULL,
+    p_log REAL,
+    elapsed_time REAL,
+    ram_gb REAL
+);
+CREATE INDEX IF NOT EXISTS progress_run ON progress (run_id, n_sim);
+
+CREATE TABLE IF NOT EXISTS leaks (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    cycle INTEGER NOT NULL,
+    signal TEXT NOT NULL,
+    max_p_log REAL,
+    first_n_sim INTEGER,
+    hits INTEGER
+);
+CREATE INDEX IF NOT EXISTS leaks_run ON leaks (run_id);
+CREATE INDEX IF NOT EXISTS leaks_cycle ON leaks (cycle, signal);
+CREATE INDEX IF NOT EXISTS leaks_signal ON leaks (signal);
+"""
+
+RUN_COLUMNS = [
+    "run_dir",
+    "top",
+    "finished",
+    "job_key",
+    "config_hash",
+    "netlist_sha256",
+    "random_seed",
+    "security_order",
+    "transitional",
+    "num_simulations",
+    "sim_cycles",
+    "n_sim",
+    "elapsed_time",
+    "sims_per_sec",
+    "peak_ram_gb",
+    "max_p_log",
+    "leakage",
+    "returncode",
+    "error",
+    "config",
+    "randomness",
+]
+
+DATA_FILE_REGEX = re.compile(r"(?P<top>.+)_data\.npz")
+
+
+class ResultsDB:
+    def __init__(self, db_file: Path, timeout: float = 60.0):
+        self.db_file = db_file
+        self.timeout = timeout
+        db_file.parent.mkdir(parents=True, exist_ok=True)
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """A connection per use, so that jobs in any thread can write"""
+        with closing(sqlite3.connect(self.db_file, timeout=self.timeout)) as conn:
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                yield conn
+
+    def ingest(self, record: dict) -> int:
+        """Insert or replace the run `record` (see `read_run_dir`), returns its id"""
+        values = [record.get(c) for c in RUN_COLUMNS]
+        with self.connect() as conn:
+            conn.execute("DELETE FROM runs WHERE run_dir = ?", (record["run_dir"],))
+            cur = conn.execute(
+                f"INSERT INTO runs ({', '.join(RUN_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(RUN_COLUMNS))})",
+                values,
+            )
+            run_id = cur.lastrowid
+            assert run_id is not None
+            conn.executemany(
+                "INSERT INTO progress VALUES (?, ?, ?, ?, ?)",
+                ((run_id, *row) for row in record.get("progress", [])),
+            )
+            conn.executemany(
+                "INSERT INTO leaks VALUES (?, ?, ?, ?, ?, ?)",
+                ((run_id, *row) for row in record.get("leaks", [])),
+            )
+        return run_id
+
+    def query(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        with self.connect() as conn:
+            return conn.execute(sql, params).fetchall()
+
+
+def _nan_to_none(x: float) -> Optional[float]:
+    return None if np.isnan(x) else float(x)
+
+
+def read_run_dir(run_dir: Path, top: Optional[str] = None) -> Optional[dict]:
+    """Record of the PROLEAD run in `run_dir` (`<job run dir>/runs/<config hash>`) from its files,
+    None if it has no data file"""
+    # imported here to avoid the circular import with run_prolead
+    from run_prolead import DATA_COLUMNS, config_hash
+
+    run_dir = run_dir.absolute()
+    data_files = (
+        [run_dir / f"{top}_data.npz"]
+        if top
+        else [f for f in run_dir.glob("*_data.npz") if DATA_FILE_REGEX.fullmatch(f.name)]
+    )
+    data_files = [f for f in data_files if f.exists()]
+    if not data_files:
+        return None
+    data_file = data_files[0]
+    m = DATA_FILE_REGEX.fullmatch(data_file.name)
+    assert m
+    top = m.group("top")
+
+    record: dict = {"run_dir": str(run_dir), "top": top, "finished": data_file.stat().st_mtime}
+
+    config_file = run_dir / "config.json"
+    if config_file.exists():
+        with open(config_file, "r") as f:
+            config = json.load(f)
+        record["config"] = json.dumps(config)
+        record["config_hash"] = config_hash(config)
+        sca = config.get("side_channel_analysis", {})
+        sim = config.get("simulation", {})
+        record["security_order"] = sca.get("order")
+        record["transitional"] = sca.get("transitional_leakage")
+        record["num_simulations"] = sim.get("number_of_simulations")
+        record["sim_cycles"] = sim.get("number_of_clock_cycles")
+
+    randomness_file = run_dir / "randomness.json"
+    if randomness_file.exists():
+        record["randomness"] = randomness_file.read_text()
+
+    with np.load(data_file) as npz:
+        data = npz[npz.files[0]]
+        columns = list(npz["columns"]) if "columns" in npz.files else list(DATA_COLUMNS[:2])
+    if len(data):
+        col = {name: data[:, i] for i, name in enumerate(columns)}
+        nan = np.full(len(data), np.nan)
+        n_sim, p_log = col["n_sim"], col["p_log"]
+        elapsed, ram = col.get("elapsed_time", nan), col.get("ram_gb", nan)
+        record["progress"] = [
+            (int(n), _nan_to_none(p), _nan_to_none(t), _nan_to_none(r))
+            for n, p, t, r in zip(n_sim, p_log, elapsed, ram)
+        ]
+        record["n_sim"] = int(n_sim[-1])
+        record["max_p_log"] = float(np.max(p_log))
+        record["elapsed_time"] = _nan_to_none(elapsed[-1])
+        if record["elapsed_time"]:
+            record["sims_per_sec"] = record["n_sim"] / record["elapsed_time"]
+        record["peak_ram_gb"] = None if np.all(np.isnan(ram)) else float(np.nanmax(ram))
+
+    leaks_file = run_dir / f"{top}_leaking_signals.csv"
+    record["leaks"] = []
+    if leaks_file.exists():
+        with open(leaks_file, "r", newline="") as f:
+            for row in csv.DictReader(f):
+                first = row.get("First Simulation")
+                hits = row.get("Hits")
+                record["leaks"].append(
+                    (
+                        int(row["Cycle"]),
+                        row["Signal"],
+                        float(row["Log(p)"]),
+                        int(first) if first else None,
+                        int(hits) if hits else None,
+                    )
+                )
+    record["leakage"] = bool(record["leaks"])
+    return record
+
+
+def find_run_dirs(paths: list[Path]) -> list[Path]:
+    """Run directories containing a data file below `paths`"""
+    dirs = set()
+    for p in paths:
+        if p.is_file():
+            p = p.parent
+        dirs.update(f.parent for f in p.rglob("*_data.npz"))
+    return sorted(dirs)
+
+
+def parse_since(since: str) -> float:
+    """`<N>d`, `<N>h`, `<N>m` ago, or an ISO date"""
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([dhm])", since.strip())
+    if m:
+        seconds = {"d": 86400, "h": 3600, "m": 60}[m.group(2)]
+        return time.time() - float(m.group(1)) * seconds
+    return datetime.fromisoformat(since).timestamp()
+
+
+def print_rows(rows: list[sqlite3.Row], title: Optional[str] = None):
+    if not rows:
+        print("** No results")
+        return
+    table = Table(title=title)
+    for col in rows[0].keys():
+        table.add_column(col, justify="right" if isinstance(rows[0][col], (int, float)) else "left")
+    for row in rows:
+        table.add_row(
+            *(
+                "" if v is None else f"{v:.2f}" if isinstance(v, float) else str(v)
+                for v in row
+            )
+        )
+    console.print(table)
+
+
+argparser = argparse.ArgumentParser(description="Store and query the results of PROLEAD runs")
+argparser.add_argument(
+    "--db", type=Path, default=Path("prolead_results.db"), help="SQLite database file"
+)
+subparsers = argparser.add_subparsers(dest="command", required=True)
+
+ingest_parser = subparsers.add_parser("ingest", help="Ingest the run directories below PATHS")
+ingest_parser.add_argument("paths", nargs="+", type=Path, help="Run directories, e.g. prolead_run")
+
+runs_parser = subparsers.add_parser("runs", help="List runs")
+runs_parser.add_argument("--top", default=None, help="Top module (SQL LIKE pattern, e.g. KS%%)")
+runs_parser.add_argument(
+    "--leakage", action=argparse.BooleanOptionalAction, default=None, help="Only (non-)leaking runs"
+)
+runs_parser.add_argument(
+    "--cycle", type=int, default=None, help="Only runs leaking in this cycle"
+)
+runs_parser.add_argument(
+    "--signal", default=None, help="Only runs with a leaking signal matching this LIKE pattern"
+)
+runs_parser.add_argument(
+    "--since", default=None, help="Only runs finished since, e.g. 30d, 12h or 2024-05-01"
+)
+runs_parser.add_argument("--limit", type=int, default=100, help="Maximum number of runs")
+
+leaks_parser = subparsers.add_parser("leaks", help="Leaking signals, most frequent first")
+leaks_parser.add_argument("--top", default=None, help="Top module (SQL LIKE pattern)")
+leaks_parser.add_argument("--since", default=None, help="Only runs finished since")
+leaks_parser.add_argument("--limit", type=int, default=50, help="Maximum number of signals")
+
+sql_parser = subparsers.add_parser("sql", help="Run an SQL query")
+sql_parser.add_argument("query", help="SQL query")
+
+
+def main(argv=None) -> int:
+    args = argparser.parse_args(argv)
+    db = ResultsDB(args.db)
+
+    if args.command == "ingest":
+        t0 = time.perf_counter()
+        n = 0
+        for run_dir in find_run_dirs(args.paths):
+            record = read_run_dir(run_dir)
+            if record is not None:
+                db.ingest(record)
+                n += 1
+        print(f"** Ingested {n} runs into {args.db} in {time.perf_counter() - t0:.2f}s")
+        return 0
+
+    if args.command == "sql":
+        print_rows(db.query(args.query))
+        return 0
+
+    where, params = [], []
+    if args.top:
+        where.append("r.top LIKE ?")
+        params.append(args.top)
+    if args.since:
+        where.append("r.finished >= ?")
+        params.append(parse_since(args.since))
+
+    if args.command == "runs":
+        if args.leakage is not None:
+            where.append("r.leakage = ?")
+            params.append(int(args.leakage))
+        if args.cycle is not None or args.signal:
+            leak_where = ["l.run_id = r.id"]
+            if args.cycle is not None:
+                leak_where.append("l.cycle = ?")
+                params.append(args.cycle)
+            if args.signal:
+                leak_where.append("l.signal LIKE ?")
+                params.append(args.signal)
+            where.append(f"EXISTS (SELECT 1 FROM leaks l WHERE {' AND '.join(leak_where)})")
+        sql = (
+            "SELECT r.top, datetime(r.finished, 'unixepoch', 'localtime') AS finished, "
+            "r.security_order AS d, r.transitional, r.n_sim, r.sims_per_sec, r.peak_ram_gb, "
+            "r.max_p_log, r.leakage, r.run_dir FROM runs r"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + " ORDER BY r.finished DESC LIMIT ?"
+        )
+        print_rows(db.query(sql, (*params, args.limit)), "Runs")
+    elif args.command == "leaks":
+        sql = (
+            "SELECT l.cycle, l.signal, COUNT(DISTINCT r.id) AS runs, "
+            "COUNT(DISTINCT r.top) AS designs, MAX(l.max_p_log) AS max_p_log, "
+            "MIN(l.first_n_sim) AS first_n_sim FROM leaks l JOIN runs r ON r.id = l.run_id"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + " GROUP BY l.cycle, l.signal ORDER BY runs DESC, max_p_log DESC LIMIT ?"
+        )
+        print_rows(db.query(sql, (*params, args.limit)), "Leaking signals")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
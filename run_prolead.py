@@ -1,16 +1,32 @@
 #!/usr/bin/env python3
 import argparse
-from dataclasses import dataclass
+import atexit
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+import hashlib
+import heapq
+import itertools
 import json
+import math
 import os
 from pathlib import Path
 import random
 import re
 import shutil
+import sqlite3
 import subprocess
+import sys
+import threading
 import time
 from typing import Literal, Optional, OrderedDict, Sequence, Union
 
+try:
+    import re._parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
 import numpy as np
 import matplotlib.pyplot as plt
 import rich
@@ -21,8 +37,29 @@ from rich.console import Console
 from rich.table import Table
 from rich.live import Live
 
+from file_utils import atomic_write, file_lock
+from gadgets import (
+    GADGET_MODULES_REGEX,
+    exclude_instances_regex,
+    find_gadget_instances,
+    gadget_dir_name,
+    module_name_and_parameters,
+)
+from live_metrics import live_metrics
+from netlist_graph import NetlistGraph
+from plot_prolead import PLOT_FORMATS
+from prolead_profile import profiler
+from randomness import RandomnessReport, randomness_report
+from results_db import ResultsDB, read_run_dir
+from share_deps import ShareDependencyReport, share_dependency_report
+from vcd_activity import VCDActivity, net_weights, print_report
+from verdict_cache import CachedRun, VerdictCache, parse_age
+import yosys_worker
+
 console = Console()
 
+FIXED_GROUP_PATTERNS = ["zero", "ones", "alternating", "propagate", "carry_chain", "generate"]
+
 # Synthesize RTL sources using yosys and then run PROLEAD
 
 argparser = argparse.ArgumentParser(description="Run PROLEAD")
@@ -34,6 +71,11 @@ argparser.add_argument(
 argparser.add_argument("--netlist", type=Path, help="Netlist file")
 argparser.add_argument("-t", "--top-module", default=None, help="Top module")
 argparser.add_argument("--force-synth", help="Force synthesis.", action="store_true")
+argparser.add_argument(
+    "--synth-only",
+    action="store_true",
+    help="Only synthesize (or reuse) the netlist, e.g. as a separate job of a job queue",
+)
 argparser.add_argument(
     "--quiet-synth",
     action=argparse.BooleanOptionalAction,
@@ -41,10 +83,60 @@ argparser.add_argument(
     default=True,
     help="Supres synthesis output",
 )
+argparser.add_argument(
+    "--randomness-report",
+    action=argparse.BooleanOptionalAction,
+    default=True,
+    help="Report the random bits consumed per cycle and random bits which can be removed",
+)
+argparser.add_argument(
+    "--share-check",
+    action=argparse.BooleanOptionalAction,
+    default=True,
+    help="Statically check that no cell combines all shares of a secret before simulating "
+    "(see share_deps.py)",
+)
+argparser.add_argument(
+    "--results-db",
+    type=Path,
+    default=None,
+    help="Store the results of the runs in this SQLite database (see results_db.py)",
+)
+argparser.add_argument(
+    "--verdict-cache",
+    type=Path,
+    default=None,
+    help="Reuse the verdicts of runs with the same config, netlist and PROLEAD setup from this "
+    "cache directory, for up to as many simulations (see verdict_cache.py)",
+)
+argparser.add_argument(
+    "--cache-max-age",
+    type=parse_age,
+    default=None,
+    help="Evict cached verdicts unused for this long, e.g. 30d",
+)
+argparser.add_argument(
+    "--cache-max-size",
+    type=lambda s: int(Quantity(s, "B")),
+    default=None,
+    help="Evict the least recently used cached verdicts beyond this total size, e.g. 1G",
+)
 argparser.add_argument(
     "--prolead-root-dir", help="Path to PROLEAD source directory", type=Path, default=None
 )
 argparser.add_argument("--yosys-bin", help="Path to yosys binary", default="yosys")
+argparser.add_argument(
+    "--yosys-backend",
+    choices=["process", "pyosys"],
+    default="process",
+    help="Run Yosys as a process per synthesis, or in warm pyosys worker processes",
+)
+argparser.add_argument(
+    "--yosys-workers",
+    type=int,
+    default=None,
+    help="Number of pyosys worker processes (default: number of CPUs)",
+)
 argparser.add_argument(
     "--yosys-verilog-lib", help="Path to Verilog cell library", default=None, type=Path
 )
@@ -82,12 +174,78 @@ argparser.add_argument(
     default=None,
     help="Path to json file containing port information",
 )
+argparser.add_argument(
+    "--fixed-groups",
+    default="random",
+    help=f"""Comma-separated fixed group values: random[:N], corners, {', '.join(FIXED_GROUP_PATTERNS)},
+            or integer literals. Each fixed group is compared against the random group.""",
+)
+argparser.add_argument(
+    "--group-runs",
+    type=int,
+    default=1,
+    help="Split the fixed groups over this many parallel PROLEAD runs and aggregate the results",
+)
+argparser.add_argument(
+    "--stream-ops",
+    type=int,
+    default=1,
+    help="Stream this many operations with fresh shared operands into the design, to analyze "
+    "pipelined designs at full throughput. The simulation then runs for --sim-cycles cycles.",
+)
+argparser.add_argument(
+    "--stream-interval",
+    type=int,
+    default=1,
+    help="Cycles between the streamed operations",
+)
+argparser.add_argument(
+    "--vcd",
+    action="store_true",
+    help="Dump the waveforms of 64 simulations and report their switching activity "
+    "(see vcd_activity.py)",
+)
+argparser.add_argument(
+    "--sweep",
+    metavar="FIELD=V1,V2,...",
+    action="append",
+    default=[],
+    help="Run the job for each value of a job field, e.g. `--sweep num_simulations=1M,10M --sweep order=1,2`",
+)
+argparser.add_argument(
+    "--max-workers", type=int, default=1, help="Number of sweep jobs to run in parallel"
+)
+argparser.add_argument(
+    "--strict-ports",
+    action="store_true",
+    help="Fail if the shares of the classified ports are inconsistent, instead of warning",
+)
 argparser.add_argument(
     "--opt",
     help="Run optimizations during synthesis",
     default="none",
     choices=["full", "flatten", "none"],
 )
+argparser.add_argument(
+    "--hierarchical",
+    action="store_true",
+    help="Verify each distinct gadget module once (with cached verdicts) and only analyze the "
+    "composition layer of the design, excluding the probes within verified gadget instances",
+)
+argparser.add_argument(
+    "--gadget-modules",
+    default=GADGET_MODULES_REGEX,
+    help="Regex of the gadget module names for --hierarchical",
+)
+argparser.add_argument(
+    "--plot-mode",
+    choices=["background", "inline", "deferred"],
+    default="background",
+    help="Plot the results in a background process, before returning, or not at all (to plot "
+    "them later in a batch with plot_prolead.py)",
+)
+argparser.add_argument("--plot-format", choices=PLOT_FORMATS, default="png", help="Plot format")
+argparser.add_argument("--plot-dpi", type=int, default=600, help="DPI of the plots")
 argparser.add_argument(
     "--show-figure",
     action="store_true",
@@ -130,6 +288,35 @@ argparser.add_argument(
     default=None,
     help="Path to PROLEAD config file. All other PROLEAD options will be ignored.",
 )
+argparser.add_argument(
+    "--profile",
+    action="store_true",
+    help="Print a timing breakdown of the phases and write it to <top>_profile.json",
+)
+argparser.add_argument(
+    "--cprofile", type=Path, default=None, help="Write cProfile stats to this file (implies --profile)"
+)
+argparser.add_argument(
+    "--tracemalloc",
+    action="store_true",
+    help="Trace peak Python memory of each phase (implies --profile)",
+)
+argparser.add_argument(
+    "--metrics-port",
+    type=int,
+    default=None,
+    help="Serve live metrics of the runs on this port, in the Prometheus text format at /metrics "
+    "and as JSON at /status.json (0: any free port)",
+)
+argparser.add_argument(
+    "--metrics-host", default="127.0.0.1", help="Address to serve the live metrics on"
+)
+argparser.add_argument(
+    "--status-json", type=Path, default=None, help="Periodically write the live metrics to this file"
+)
+argparser.add_argument(
+    "--status-interval", type=float, default=10.0, help="Seconds between --status-json updates"
+)
 
 
 def synthesize(
@@ -146,7 +333,9 @@ def synthesize(
     opt_full: bool = True,
     split_nets: bool = False,
     quiet: bool = True,
+    backend: Literal["process", "pyosys"] = "process",
 ):
+    """With the `pyosys` backend, the flow runs in a warm worker of `yosys_worker.worker_pool()`"""
     yosys_run_dir.mkdir(parents=True, exist_ok=True)
 
     liberty_lib = liberty_lib.resolve()
@@ -327,16 +516,32 @@ def synthesize(
         "check -assert -noinit -initdrv",
         f"write_verilog {' '.join(write_verilog_args)}",
     ]
+    plugins = []
+    if vhdl_files:
+        plugins.append("ghdl")
+    if sv_slang and has_sv_files:
+        plugins.append("slang")
+
+    if backend == "pyosys":
+        print("\n" + "=" * 20 + " YOSYS SYNTHESIS (pyosys) " + "=" * 20)
+        with profiler.phase("yosys"):
+            stats = yosys_worker.worker_pool().run(
+                yosys_run_dir, yosys_script, plugins, liberty_lib, quiet
+            )
+        assert verilog_netlist.exists(), f"Failed to generate netlist {verilog_netlist}"
+        assert json_netlist.exists(), f"Failed to generate json netlist {json_netlist}"
+        print(f"** Generated netlist: {verilog_netlist} in {stats['elapsed_time']:.2f}s")
+        print(f"** Cells: {sum(stats['cells'].values())}\n")
+        return stats
+
     yosys_cmd = [yosys_bin, "-Q", "-T"]
     if quiet:
         yosys_cmd.append("-q")
         yosys_cmd += ["-l", "yosys.log"]
     # else:
     #     yosys_cmd.append("-g")
-    if vhdl_files:
-        yosys_cmd += ["-m", "ghdl"]
-    if sv_slang and has_sv_files:
-        yosys_cmd += ["-m", "slang"]
+    for plugin in plugins:
+        yosys_cmd += ["-m", plugin]
 
     # write yosys_script to file
     yosys_script_file = yosys_run_dir / "yosys_script.ys"
@@ -348,11 +553,12 @@ def synthesize(
     print("\n" + "=" * 20 + " YOSYS SYNTHESIS " + "=" * 20)
     yosys_cmd = [str(c) for c in yosys_cmd]
     print(f"** Running {' '.join(yosys_cmd)}\n")
-    subprocess.run(
-        yosys_cmd,
-        cwd=yosys_run_dir,
-        check=True,
-    )
+    with profiler.phase("yosys"):
+        subprocess.run(
+            yosys_cmd,
+            cwd=yosys_run_dir,
+            check=True,
+        )
     assert verilog_netlist.exists(), f"Failed to generate netlist {verilog_netlist}"
     assert json_netlist.exists(), f"Failed to generate json netlist {json_netlist}"
     print(f"** Generated netlist: {verilog_netlist}\n")
@@ -373,6 +579,21 @@ class Port:
     share_id: Optional[int] = None  # none for non-shared ports
     start_bit: Optional[int] = None
 
+    def __post_init__(self):
+        # normalize `name[end:start]` names and numeric values once, so the properties are pure
+        if self.start_bit is None:
+            name, end, start = Port.range_from_name(self.name)
+            self.name = name
+            self.start_bit = start
+            if not self.width:
+                self.width = end - start + 1 if start is not None else 1
+        if self.start_bit is None and self.num_bits > 1:
+            self.start_bit = 0
+        if self.start_bit is not None and self.width is None:
+            self.width = 1
+        if isinstance(self.value, str) and self.value.isnumeric():
+            self.value = int(self.value)
+
     @property
     def num_bits(self):
         if self.width is None:
@@ -382,18 +603,8 @@ class Port:
 
     @property
     def name_bits(self):
-        if self.start_bit is None:
-            name, end, start = Port.range_from_name(self.name)
-            self.name = name
-            self.start_bit = start
-            if not self.width:
-                self.width = end - start + 1 if start is not None else 1
-        if self.start_bit is None and self.num_bits > 1:
-            self.start_bit = 0
         if self.start_bit is not None:
-            if self.width is None:
-                self.width = 1
-            return f"{self.name}[{self.start_bit + self.width - 1}:{self.start_bit}]"
+            return f"{self.name}[{self.start_bit + (self.width or 1) - 1}:{self.start_bit}]"
         else:
             return self.name
 
@@ -407,10 +618,6 @@ class Port:
 
     @property
     def value_str(self):
-        if self.value == "fixed":
-            self.value = random.randint(0, self.num_bits - 1)
-        elif isinstance(self.value, str) and self.value.isnumeric():
-            self.value = int(self.value)
         if isinstance(self.value, int):
             # return f"{self.num_bits}'b{self.value:0{self.num_bits}b}"
             return verilog_value(self.value, self.width)
@@ -456,12 +663,481 @@ def get_top_module_and_ports(netlist: dict) -> tuple[Optional[str], list]:
     return top_name, ports
 
 
+def get_cell_counts(netlist: dict, module_name: Optional[str] = None) -> dict[str, int]:
+    """Number of cells of each type in `module_name` (default: the top module)"""
+    modules = netlist["modules"]
+    if module_name is None:
+        module_name, _ = get_top_module_and_ports(netlist)
+    assert module_name in modules, f"Module {module_name} not found in netlist"
+    counts: dict[str, int] = {}
+    for cell in modules[module_name].get("cells", {}).values():
+        counts[cell["type"]] = counts.get(cell["type"], 0) + 1
+    return counts
+
+
 def parse_json_netlist(json_netlist_file: Path) -> tuple[Optional[str], list]:
     with open(json_netlist_file, "r") as f:
         netlist = json.load(f)
     return get_top_module_and_ports(netlist)
 
 
+DEFAULT_SHARES_MAPS = [
+    (r"^(io_)?rand.*", {"type": "random"}),
+    (r"\w+_(?P<share_id>\d+)$", {}),
+    (r"^(clk|clock)", {"type": "clock"}),
+    (r"^(rst_n|reset_n)", {"type": "reset", "value": 0}),
+    (r"^(rst|reset)", {"type": "reset", "value": 1}),
+]
+
+
+class PortClassifier:
+    """Classifies ports with an ordered list of `(regex, attributes)` rules; the first matching rule
+    wins. The rules are compiled into a single regex, so each port name is matched only once; rules
+    which can't be combined (group references, inline global flags) are matched on their own."""
+
+    def __init__(self, rules: Sequence[tuple[str, dict]]):
+        self.rules = list(rules)
+        self.combined: Optional[re.Pattern] = None
+        self.compiled = [re.compile(regex) for regex, _ in self.rules]
+        # group names of each combined rule, as renamed in the combined regex
+        self.group_names: dict[int, dict[str, str]] = {}
+        # indices of the rules matched on their own
+        self.separate: list[int] = []
+        alternatives = []
+        for i, (regex, _) in enumerate(self.rules):
+            alternative = self.alternative(i, regex)
+            if alternative is None:
+                self.separate.append(i)
+            else:
+                alternatives.append(alternative)
+        try:
+            self.combined = re.compile("|".join(alternatives)) if alternatives else None
+        except re.error:
+            self.combined = None
+            self.separate = list(range(len(self.rules)))
+
+    @staticmethod
+    def has_group_references(regex: str) -> bool:
+        """Whether `regex` has backreferences or conditionals, which refer to groups by number once
+        parsed (also `(?P=name)`), and those numbers change in the combined regex"""
+
+        def walk(node) -> bool:
+            if isinstance(node, sre_parse.SubPattern):
+                return any(walk(item) for item in node.data)
+            if isinstance(node, (tuple, list)):
+                if node and str(node[0]).startswith("GROUPREF"):
+                    return True
+                return any(walk(item) for item in node)
+            return False
+
+        return walk(sre_parse.parse(regex))
+
+    def alternative(self, i: int, regex: str) -> Optional[str]:
+        """Rule `i` as an alternative of the combined regex, with its groups renamed, or None if it
+        can't be combined"""
+        if self.has_group_references(regex):
+            return None
+        compiled = self.compiled[i]
+        names = {n: f"_r{i}_{n}" for n in compiled.groupindex}
+        for n, renamed in names.items():
+            regex = regex.replace(f"(?P<{n}>", f"(?P<{renamed}>")
+        alternative = f"(?P<_r{i}>{regex})"
+        try:
+            renamed_rule = re.compile(alternative)
+        except re.error:  # e.g. inline global flags, which are only allowed at the start
+            return None
+        # the plain text replacement must have renamed exactly the groups of the rule
+        if renamed_rule.groups != compiled.groups + 1 or set(renamed_rule.groupindex) != {
+            f"_r{i}",
+            *names.values(),
+        }:
+            return None
+        self.group_names[i] = names
+        return alternative
+
+    def match(self, name: str) -> Optional[dict]:
+        """Attributes of the first rule matching `name`, including its named groups"""
+        i = None
+        if self.combined is not None:
+            m = self.combined.match(name)
+            if m:
+                i = int(m.lastgroup[2:])  # type: ignore
+        for j in self.separate:
+            if i is not None and j > i:
+                break
+            m_j = self.compiled[j].match(name)
+            if m_j:
+                return {**self.rules[j][1], **m_j.groupdict()}
+        if i is None:
+            return None
+        attrs = dict(self.rules[i][1])
+        attrs.update({n: m.group(renamed) for n, renamed in self.group_names[i].items()})
+        return attrs
+
+    @staticmethod
+    def load_ports_json(ports_json: Path) -> tuple[list[tuple[str, dict]], list[dict]]:
+        """Returns the regex rules and the explicit port entries of a ports json file"""
+        jports = []
+        with open(ports_json, "r") as f:
+            j = json.load(f)
+            p = j.get("ports", {})
+            shares_maps = p.get("regex")
+            if isinstance(shares_maps, dict):
+                shares_maps = [(k, v) for k, v in shares_maps.items()]
+            elif shares_maps is None:
+                shares_maps = []
+            for k, v in p.get("inputs", p.get("input", {})).items():
+                v["direction"] = "input"
+                jports.append({"name": k, **v})
+            for k, v in p.get("outputs", p.get("output", {})).items():
+                v["direction"] = "output"
+                jports.append({"name": k, **v})
+        return shares_maps, jports
+
+    def classify(self, ports: list[dict], jports: Optional[list[dict]] = None) -> list[dict]:
+        """Assign type/share_id/value to the netlist `ports` and merge the explicit port entries"""
+        ports_map = {p["name"]: p for p in ports}
+
+        jports_map = OrderedDict()
+
+        for p in jports or []:
+            name = p["name"]
+            width = p.get("width")
+            direction = p.get("direction")
+            name, end, start = Port.range_from_name(name)
+            if not width and start is not None:
+                width = end - start + 1
+            port_from_yosys = ports_map.get(name)
+            if port_from_yosys:
+                assert isinstance(port_from_yosys, dict), "Expected dict"
+                if not width:
+                    width = port_from_yosys.get("width")
+                if not direction:
+                    direction = port_from_yosys.get("direction")
+            elif ports:
+                print(f"** [WARNING] Port {name} not found in yosys netlist!!!")
+            if width:
+                p["width"] = int(width)
+            if direction:
+                p["direction"] = direction
+            p["name"] = name
+            jports_map[name] = p
+        if jports and not ports:
+            ports_map = {p["name"]: p for p in jports}
+
+        misses = 0
+        for p_name, p in ports_map.items():
+            attrs = self.match(p_name)
+            if attrs is not None:
+                p.update(**attrs)
+            else:
+                misses += 1
+            share_id = p.get("share_id")
+            if not p.get("width"):
+                name, end, start = Port.range_from_name(p_name)
+                p["width"] = end - start + 1 if start is not None else 1
+                p["name"] = name
+
+            if share_id is None:
+                if (
+                    jports_map
+                    and p_name not in jports_map
+                    and p.get("direction") == "input"
+                    and p.get("width", 0) > 1
+                ):
+                    print(
+                        f"** [WARNING] Input port {p_name} with width {p.get('width')} does not have a share_id!!!"
+                    )
+            else:
+                p["share_id"] = int(share_id)
+        profiler.count("port_regex_misses", misses)
+
+        for k, v in jports_map.items():
+            if k not in ports_map:
+                ports_map[k] = v
+            elif isinstance(ports_map[k], dict):
+                ports_map[k].update(v)
+            else:
+                print(f"** [WARNING] Port {k} already exists in ports_map!!!")
+
+        return list(ports_map.values())
+
+    @staticmethod
+    def validate(ports: list[dict]) -> list[str]:
+        """Check the consistency of the shares: all shares of a variable must have the same width,
+        share ids must be contiguous from 0, and all share ids must have the same total input width."""
+        issues = []
+        shares: dict[tuple[str, str], dict[int, int]] = {}
+        for p in ports:
+            share_id = p.get("share_id")
+            if share_id is None:
+                continue
+            share_id = int(share_id)
+            name = p["name"]
+            if name.endswith(str(share_id)):
+                name = name[: -len(str(share_id))].removesuffix("_")
+            widths = shares.setdefault((p.get("direction") or "input", name), {})
+            if share_id in widths:
+                issues.append(f"Duplicate share {share_id} of {name}")
+            widths[share_id] = int(p.get("width") or 1)
+
+        input_bits: dict[int, int] = {}
+        for (direction, name), widths in shares.items():
+            if sorted(widths) != list(range(len(widths))):
+                issues.append(f"Shares of {name} are not contiguous: {_abbrev(sorted(widths))}")
+            if len(set(widths.values())) > 1:
+                issues.append(f"Shares of {name} have different widths: {_abbrev(widths)}")
+            if direction == "input":
+                for share_id, width in widths.items():
+                    input_bits[share_id] = input_bits.get(share_id, 0) + width
+        num_shares = {len(w) for (d, _), w in shares.items() if d == "input"}
+        if len(num_shares) > 1:
+            issues.append(f"Inputs have different numbers of shares: {sorted(num_shares)}")
+        if len(set(input_bits.values())) > 1:
+            issues.append(f"Total input widths differ between share ids: {input_bits}")
+        return issues
+
+
+def _abbrev(items, n: int = 8) -> str:
+    items = list(items.items()) if isinstance(items, dict) else list(items)
+    return str(items) if len(items) <= n else f"{str(items[:n])[:-1]}, ... ({len(items)} total)]"
+
+
+# classification results and share issues, keyed by the netlist ports and the ports json
+_classify_cache: OrderedDict[str, tuple[list[dict], list[str]]] = OrderedDict()
+_classify_cache_lock = threading.Lock()
+CLASSIFY_CACHE_SIZE = 64
+
+
+def classify_ports(
+    ports: list[dict], ports_json: Optional[Path] = None, strict: bool = False
+) -> list[dict]:
+    """Assign type/share_id/value to the netlist ports using the regex rules and explicit
+    port entries from `ports_json`, or the default rules if no `ports_json` is given.
+    With `strict`, inconsistent shares raise a ValueError instead of a warning."""
+    ports_json_content = Path(ports_json).read_bytes() if ports_json else b""
+    key = hashlib.sha256(
+        json.dumps(ports, sort_keys=True).encode() + b"\0" + ports_json_content
+    ).hexdigest()
+
+    with _classify_cache_lock:
+        cached = _classify_cache.get(key)
+        if cached is not None:
+            _classify_cache.move_to_end(key)
+    if cached is None:
+        if ports_json:
+            rules, jports = PortClassifier.load_ports_json(ports_json)
+        else:
+            rules, jports = DEFAULT_SHARES_MAPS, []
+        # port entries are flat dicts
+        classified = PortClassifier(rules).classify([dict(p) for p in ports], jports)
+        cached = (classified, PortClassifier.validate(classified))
+        with _classify_cache_lock:
+            _classify_cache[key] = cached
+            while len(_classify_cache) > CLASSIFY_CACHE_SIZE:
+                _classify_cache.popitem(last=False)
+
+    classified, issues = cached
+    for issue in issues:
+        print(f"** [WARNING] {issue}")
+    if strict and issues:
+        raise ValueError("Inconsistent port shares: " + "; ".join(issues))
+
+    return [dict(p) for p in classified]
+
+
+RAM_UNIT_TO_GB = {"KB": 1e-6, "MB": 1e-3, "GB": 1.0, "TB": 1e3}
+
+
+@dataclass
+class ProleadStats:
+    """Summary of a PROLEAD run, collected from its progress output"""
+
+    n_sim: int = 0
+    elapsed_time: float = 0.0
+    peak_ram_gb: float = 0.0
+    max_p_log: float = 0.0
+    leakage: bool = False
+    returncode: Optional[int] = None
+    terminated: bool = False
+    # (cycle, signal, -log10(p)) sorted by cycle
+    leaking_signals: list[tuple[int, str, float]] = field(default_factory=list)
+
+    @classmethod
+    def merge(cls, stats: Sequence["ProleadStats"]) -> "ProleadStats":
+        """Aggregate the stats of parallel runs"""
+        merged = cls()
+        for s in stats:
+            merged.n_sim += s.n_sim
+            merged.elapsed_time = max(merged.elapsed_time, s.elapsed_time)
+            merged.peak_ram_gb = max(merged.peak_ram_gb, s.peak_ram_gb)
+            merged.max_p_log = max(merged.max_p_log, s.max_p_log)
+            merged.leakage |= s.leakage
+            merged.terminated |= s.terminated
+            if s.returncode and not merged.returncode:
+                merged.returncode = s.returncode
+            merged.leaking_signals += s.leaking_signals
+        if stats and merged.returncode is None:
+            merged.returncode = 0
+        # highest -log10(p) of each signal over the runs
+        max_p_logs: dict[tuple[int, str], float] = {}
+        for cycle, signal, p_log in merged.leaking_signals:
+            max_p_logs[(cycle, signal)] = max(p_log, max_p_logs.get((cycle, signal), p_log))
+        merged.leaking_signals = sorted((c, s, p) for (c, s), p in max_p_logs.items())
+        return merged
+
+    @classmethod
+    def from_cached(cls, cached: CachedRun) -> "ProleadStats":
+        return cls(
+            n_sim=cached.n_sim,
+            elapsed_time=cached.elapsed_time,
+            peak_ram_gb=cached.peak_ram_gb,
+            max_p_log=cached.max_p_log,
+            leakage=cached.leakage,
+            returncode=cached.returncode,
+            leaking_signals=sorted((c, s, p_log) for c, s, p_log, *_ in cached.leaks),
+        )
+
+    @property
+    def failed(self) -> bool:
+        return not self.terminated and bool(self.returncode)
+
+    @property
+    def sims_per_sec(self) -> float:
+        return self.n_sim / self.elapsed_time if self.elapsed_time > 0 else 0.0
+
+
+@dataclass
+class SignalLeakage:
+    first_n_sim: int
+    max_p_log: float
+    # number of progress lines reporting the signal as leaking
+    hits: int = 1
+
+
+# number of leaking signals reported in the live metrics
+LIVE_TOP_SIGNALS = 10
+
+
+class LeakageAggregator:
+    """Leaking signals of a run, keyed by (cycle, signal). Memory is bounded by the number of
+    distinct leaking signals, not by the run length."""
+
+    SIGNAL_REGEX = re.compile(r"([^\(]+)\((\d+)\)")
+
+    def __init__(self):
+        self.signals: dict[tuple[int, str], SignalLeakage] = {}
+        self.unmatched: set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.signals)
+
+    def add(self, sigs: list[str], n_sim: int, p_log: float):
+        """`sigs` in the `name(cycle)` format of the PROLEAD output"""
+        for sig in sigs:
+            m = self.SIGNAL_REGEX.fullmatch(sig)
+            if m is None:
+                if sig not in self.unmatched:
+                    self.unmatched.add(sig)
+                    print(f"** Unmatched signal / cycle format: {sig}")
+                continue
+            key = (int(m.group(2)), m.group(1))
+            leak = self.signals.get(key)
+            if leak is None:
+                self.signals[key] = SignalLeakage(first_n_sim=n_sim, max_p_log=p_log)
+            else:
+                leak.max_p_log = max(leak.max_p_log, p_log)
+                leak.hits += 1
+
+    def top(self, k: int = 10) -> list[tuple[int, str, SignalLeakage]]:
+        """The `k` signals with the highest -log10(p)"""
+        top = heapq.nlargest(k, self.signals.items(), key=lambda x: x[1].max_p_log)
+        return [(cycle, signal, leak) for (cycle, signal), leak in top]
+
+    def leaking_signals(self) -> list[tuple[int, str, float]]:
+        """(cycle, signal, max -log10(p)) sorted by cycle"""
+        return sorted((c, s, leak.max_p_log) for (c, s), leak in self.signals.items())
+
+    def write_csv(self, csv_file: Path):
+        with atomic_write(csv_file) as f:
+            f.write("Cycle,Signal,Log(p),First Simulation,Hits\n")
+            for (c, s), leak in sorted(self.signals.items()):
+                f.write(f"{c},{s},{leak.max_p_log},{leak.first_n_sim},{leak.hits}\n")
+
+
+class ThroughputEstimator:
+    """Rolling estimate of the simulation rate and of the memory growth per simulation from the
+    progress lines of PROLEAD, as exponential moving averages. Each interval between two lines is
+    weighted by its duration relative to `time_constant` (s), so rates follow the slowdown as the
+    probing sets grow while irregular line intervals are weighted fairly."""
+
+    def __init__(self, target_sims: int = 0, time_constant: float = 30.0):
+        self.target_sims = target_sims
+        self.time_constant = time_constant
+        self.sims_per_sec: Optional[float] = None
+        # GB per simulation
+        self.ram_per_sim: Optional[float] = None
+        self.n_sim = 0
+        self.ram_gb = 0.0
+        self.peak_ram_gb = 0.0
+        self._last: Optional[tuple[float, int, float]] = None
+
+    def update(self, elapsed_time: float, n_sim: int, ram_gb: float):
+        self.n_sim = n_sim
+        self.ram_gb = ram_gb
+        self.peak_ram_gb = max(self.peak_ram_gb, ram_gb)
+        if self._last is None:
+            if elapsed_time > 0 and n_sim > 0:
+                self.sims_per_sec = n_sim / elapsed_time
+            self._last = (elapsed_time, n_sim, ram_gb)
+            return
+        t0, n0, ram0 = self._last
+        dt, dn = elapsed_time - t0, n_sim - n0
+        if dt <= 0 or dn < 0:
+            return
+        alpha = 1 - math.exp(-dt / self.time_constant)
+        rate = dn / dt
+        if self.sims_per_sec is None:
+            self.sims_per_sec = rate
+        else:
+            self.sims_per_sec += alpha * (rate - self.sims_per_sec)
+        if dn > 0:
+            slope = (ram_gb - ram0) / dn
+            if self.ram_per_sim is None:
+                self.ram_per_sim = slope
+            else:
+                self.ram_per_sim += alpha * (slope - self.ram_per_sim)
+        self._last = (elapsed_time, n_sim, ram_gb)
+
+    @property
+    def remaining_sims(self) -> int:
+        return max(self.target_sims - self.n_sim, 0)
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Seconds until `target_sims` are reached"""
+        if not self.target_sims or not self.sims_per_sec:
+            return None
+        return self.remaining_sims / self.sims_per_sec
+
+    @property
+    def projected_peak_ram_gb(self) -> float:
+        growth = max(self.ram_per_sim or 0.0, 0.0) * self.remaining_sims
+        return max(self.peak_ram_gb, self.ram_gb + growth)
+
+
+# columns of the data array written by `run_prolead`; NaN where no estimate is available yet
+DATA_COLUMNS = (
+    "n_sim",
+    "p_log",
+    "elapsed_time",
+    "ram_gb",
+    "sims_per_sec",
+    "eta",
+    "projected_peak_ram_gb",
+)
+
+
 def format_time(seconds: float) -> str:
     seconds = int(seconds)
     return "{:2}:{:02}:{:02}".format(seconds // 3600, seconds % 3600 // 60, seconds % 60)
@@ -479,7 +1155,12 @@ def run_prolead(
     show_figure: bool = False,
     pretty: bool = True,
     result_folder: Union[str, Path] = "results",
-):
+    plot: bool = True,
+    console: Optional[Console] = None,
+    plot_mode: Literal["background", "inline", "deferred"] = "background",
+    plot_format: str = "png",
+    plot_dpi: int = 600,
+) -> ProleadStats:
 
     assert netlist_file.exists(), f"Netlist file {netlist_file} does not exist"
 
@@ -525,6 +1206,11 @@ def run_prolead(
 
     assert proc.stdout is not None, "stdout is None"
 
+    with open(config_file, "r") as f:
+        target_sims = json.load(f).get("simulation", {}).get("number_of_simulations", 0)
+    estimator = ThroughputEstimator(target_sims)
+    live_run = live_metrics.start_run(str(prolead_run_dir.absolute()), top_module, target_sims)
+
     result_line_regex = re.compile(
         r"^\s*\|\s*(?P<elapsed_time>\d+\.\d+)[s]\s*\|\s*(?P<ram_usage>\d+\.\d+)\s*(?P<ram_usage_unit>[A-Z]+)\s*\|\s*(?P<n_sim>\d+)(\s*\/\s*(?P<required_sims>\d+))?\s*\|\s*(\[(?P<signals>([^\(]+\(\d+\)(,\s)?)+)\])?\s*\|\s*(?P<p_log>(\d+\.\d+|inf))\s*\|\s*(?P<status>[A-Z]+)\s*\|\s*$",
     )
@@ -543,19 +1229,26 @@ def run_prolead(
     prev_checkpoint = 0
 
     npy_file = prolead_run_dir / f"{top_module}_data.npz"
+    # run directories are reused, leaks of an earlier run must not be read as leaks of this one
+    leaks_file = prolead_run_dir / f"{top_module}_leaking_signals.csv"
+    leaks_file.unlink(missing_ok=True)
 
     def save_data():
         if data_np is not None:
-            np.savez_compressed(npy_file, data_np)
+            with profiler.phase("npz_write"):
+                with atomic_write(npy_file, "wb") as f:
+                    np.savez_compressed(f, arr_0=data_np, columns=np.array(DATA_COLUMNS))
 
     table = Table() if pretty else None
 
-    leaking_signals = set()
+    leaking_signals = LeakageAggregator()
 
     stop_when_required_sims_reached = False
 
     terminated = False
 
+    stats = ProleadStats()
+
     def print_header(table: Table):
         table.add_column(rich.text.Text("Time", justify="center"), width=8, justify="right")
         table.add_column(rich.text.Text("Memory (GB)", justify="center"), width=6, justify="right")
@@ -565,6 +1258,9 @@ def run_prolead(
             width=20,
             max_width=26,
         )
+        table.add_column(rich.text.Text("Sims/s", justify="center"), justify="right")
+        table.add_column(rich.text.Text("ETA", justify="center"), width=8, justify="right")
+        table.add_column(rich.text.Text("Memory at N", justify="center"), width=6, justify="right")
         table.add_column(rich.text.Text("Highest Leakage", justify="center"), justify="left")
         table.add_column(rich.text.Text("-Log(p)", justify="center"), justify="right")
         table.add_column("Status", justify="center", width=8)
@@ -580,6 +1276,7 @@ def run_prolead(
         p_log: float,
         status: str,
         sigs: list[str],
+        estimator: ThroughputEstimator,
     ):
 
         if leakage:
@@ -592,15 +1289,29 @@ def run_prolead(
             format_time(elapsed_time),
             f"{ram_usage:.2f}{ram_usage_unit if ram_usage_unit != 'GB' else ''}",
             f"{n_sim:9,d} / {required_sims:6,d}" if required_sims else f"{n_sim:9,d}",
+            f"{Quantity(estimator.sims_per_sec or 0):.3}",
+            "--:--:--" if estimator.eta is None else format_time(estimator.eta),
+            f"{estimator.projected_peak_ram_gb:.2f}",
             f"{', '.join(sigs)}",
             f"{p_log:.2f}",
             f"[{stat_color}]{status}[/{stat_color}]",
         )
 
+    num_lines = 0
+    num_result_lines = 0
+
+    if console is None:
+        console = globals()["console"]
+
     # catch KeyboardInterrupt
     try:
-        with Live(table, console=console, vertical_overflow="visible", auto_refresh=False) as live:
+        with profiler.phase("prolead"), (
+            Live(table, console=console, vertical_overflow="visible", auto_refresh=False)
+            if table is not None
+            else nullcontext()
+        ) as live:
             for line in map(str.strip, proc.stdout):
+                num_lines += 1
                 if not first_line_done and first_result_line_regex.fullmatch(line):
                     first_line_done = True
                     if table is not None:
@@ -611,6 +1322,7 @@ def run_prolead(
                     continue
                 m = result_line_regex.fullmatch(line)
                 if m:
+                    num_result_lines += 1
                     elapsed_time = float(m.group("elapsed_time"))
                     ram_usage = float(m.group("ram_usage"))
                     ram_usage_unit = m.group("ram_usage_unit")
@@ -622,7 +1334,35 @@ def run_prolead(
                     signals = m.group("signals")
                     sigs = [] if signals is None else signals.split(", ")
                     if leakage and sigs:
-                        leaking_signals.update((s, n_sim, p_log) for s in sigs)
+                        leaking_signals.add(sigs, n_sim, p_log)
+                        if live_run is not None:
+                            live_metrics.update(
+                                live_run,
+                                top_leaking_signals=[
+                                    {"cycle": c, "signal": s, **dataclasses.asdict(leak)}
+                                    for c, s, leak in leaking_signals.top(LIVE_TOP_SIGNALS)
+                                ],
+                            )
+                    ram_gb = ram_usage * RAM_UNIT_TO_GB.get(ram_usage_unit, 1.0)
+                    stats.n_sim = n_sim
+                    stats.elapsed_time = elapsed_time
+                    stats.peak_ram_gb = max(stats.peak_ram_gb, ram_gb)
+                    stats.max_p_log = max(stats.max_p_log, p_log)
+                    stats.leakage |= leakage
+                    estimator.update(elapsed_time, n_sim, ram_gb)
+                    live_metrics.update(
+                        live_run,
+                        n_sim=n_sim,
+                        elapsed_time=elapsed_time,
+                        ram_gb=ram_gb,
+                        peak_ram_gb=stats.peak_ram_gb,
+                        p_log=p_log,
+                        max_p_log=stats.max_p_log,
+                        leakage=stats.leakage,
+                        sims_per_sec=estimator.sims_per_sec,
+                        eta=estimator.eta,
+                        projected_peak_ram_gb=estimator.projected_peak_ram_gb,
+                    )
                     if table is not None:
                         print_data_line(
                             table,
@@ -635,11 +1375,22 @@ def run_prolead(
                             p_log,
                             status,
                             sigs,
+                            estimator,
                         )
                         live.refresh()
                     else:
                         print(line)
-                    data.append((n_sim, p_log))
+                    data.append(
+                        (
+                            n_sim,
+                            p_log,
+                            elapsed_time,
+                            ram_gb,
+                            estimator.sims_per_sec,
+                            estimator.eta,
+                            estimator.projected_peak_ram_gb,
+                        )
+                    )
                     if stop_when_required_sims_reached and required_sims and n_sim > required_sims:
                         print(f"** Required simulations reached: {n_sim}/{required_sims}")
                         terminated = True
@@ -648,7 +1399,7 @@ def run_prolead(
                     if elapsed_time - prev_checkpoint >= write_every:
                         prev_checkpoint = elapsed_time
                         print(f"Writing checkpoint to {npy_file}")
-                        data_np = np.array(data)
+                        data_np = np.array(data, dtype=float)
                         save_data()
                     # print(f"{n_sim}/{total_sim} {signals} {p_log} {status}")
                 else:
@@ -657,85 +1408,192 @@ def run_prolead(
         print("*** Caught KeyboardInterrupt, terminating PROLEAD... ***")
         proc.terminate()
     finally:
+        profiler.count("prolead_lines", num_lines)
+        profiler.count("prolead_result_lines", num_result_lines)
+        profiler.count("prolead_unmatched_lines", num_lines - num_result_lines)
         if proc.poll() is None:
             proc.wait()
+        if terminated:
+            live_metrics.finish_run(live_run, "terminated")
+        else:
+            live_metrics.finish_run(live_run, "failed" if proc.returncode else "done")
         if data:
-            data_np = np.array(data)
+            data_np = np.array(data, dtype=float)
             print(f"** Writing data to {npy_file}")
             save_data()
         else:
             print("No data captured")
+        # only the header if nothing leaked
+        leaking_signals.write_csv(leaks_file)
         if leaking_signals:
             print(f"** Leakage Detected!!!")
-            cycles_signals = []
-            for s, n_sim, p_log in leaking_signals:
-                m = re.match(r"([^\(]+)\((\d+)\)", s)
-                if m:
-                    cycles_signals.append((int(m.group(2)), m.group(1), p_log))
-                else:
-                    print(f"** Unmatched signal / cycle format: {s}")
-            cycles_signals = list(set(cycles_signals))
-            cycles_signals.sort(key=lambda x: x[0])
-
-            with open(prolead_run_dir / f"{top_module}_leaking_signals.csv", "w") as f:
-                f.write("Cycle,Signal,Log(p)\n")
-                for c, s, p_log in cycles_signals:
-                    f.write(f"{c},{s},{p_log}\n")
-            pr = "\n".join(f" {c:4d}: {s} [{p_log:3.2f}]" for c, s, p_log in cycles_signals)
+            stats.leaking_signals = leaking_signals.leaking_signals()
+            pr = "\n".join(
+                f" {c:4d}: {s} [{p_log:3.2f}]" for c, s, p_log in stats.leaking_signals
+            )
             print(f"** Leaking signals:\n{pr}")
 
     ## https://github.com/ChairImpSec/PROLEAD/wiki/Results
 
-    if data_np is not None:
-        sns.set_theme(style="whitegrid", context="paper")
-        plt.figure()
+    stats.returncode = proc.returncode
+    stats.terminated = terminated
 
-        x = data_np[:, 0]
-        y = data_np[:, 1]  # The smallest p-value from the g-test in logarithmic form
+    if plot and data_np is not None:
+        fig_file = npy_file.with_suffix(f".{plot_format}")
+        if plot_mode == "inline" or show_figure:
+            with profiler.phase("plot"):
+                plot_data(data_np, fig_file, sca_config, show_figure, plot_dpi)
+        elif plot_mode == "background":
+            plot_in_background(npy_file, fig_file, plot_dpi)
+        else:
+            print(f"** Plot deferred: ./plot_prolead.py {npy_file} --format {plot_format}")
 
-        num_sims = np.max(x)
-        max_p_log = np.max(y)
+    if stats.failed:
+        print(f"PROLEAD failed with return code {proc.returncode}")
 
-        if num_sims >= 1e10:
-            x_scale = 1e9
-        elif num_sims >= 1e7:
-            x_scale = 1e6
-        elif num_sims >= 1e4:
-            x_scale = 1e3
-        else:
-            x_scale = 1
-
-        if x_scale > 1:
-            x = x / x_scale
-
-        plot = sns.lineplot(
-            x=x,
-            y=y,
-            # kind="line",
-            label=r"$-\log_{10}(p)$"
-            + " [glitch"
-            + ("+transition" if sca_config.get("transitional_leakage") else "")
-            + "]",
-        )
-        plot.axhline(y=max_p_log, linestyle="--", label="Minimum p-value", alpha=0.6)
-        plot.axhline(y=5, color="r", linestyle="--", label="Threshold")
-        plot.set_xlabel(
-            "Number of Simulations" + (rf" ($\times${int(x_scale):,})" if x_scale > 1 else "")
-        )
-        plot.set_ylabel(r"$-\log_{10}(p)$")
-        plot.legend(loc="best", fancybox=True, framealpha=0.9)
-        plt.tight_layout()
+    return stats
 
-        fig_file = npy_file.with_suffix(".png")
 
-        print(f"Saving plot to {fig_file}")
-        plt.savefig(fig_file, dpi=600)
-        if show_figure:
-            plt.show()
+# pyplot keeps global state and is not thread-safe
+_plot_lock = threading.Lock()
 
-    if not terminated and proc.returncode:
-        print(f"PROLEAD failed with return code {proc.returncode}")
-        exit(1)
+
+def plot_data(
+    data_np: np.ndarray,
+    fig_file: Path,
+    sca_config: dict,
+    show_figure: bool = False,
+    dpi: int = 600,
+):
+    with _plot_lock:
+        _plot_data(data_np, fig_file, sca_config, show_figure, dpi)
+
+
+class BackgroundPlotter:
+    """Plots data files with plot_prolead.py in detached processes, which outlive this one. Only one
+    plotter runs at a time: the files queued meanwhile are plotted in a batch by the next one, so
+    large campaigns don't start a plotter per run. Files queued at exit go to a last plotter."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # data files by (format, dpi)
+        self.pending: dict[tuple[str, int], list[Path]] = {}
+        self.thread: Optional[threading.Thread] = None
+        self.exiting = False
+        atexit.register(self.hand_off)
+
+    def submit(self, data_file: Path, fig_file: Path, dpi: int = 600):
+        assert fig_file == data_file.with_suffix(fig_file.suffix)
+        with self.lock:
+            self.pending.setdefault((fig_file.suffix.lstrip("."), dpi), []).append(data_file)
+            if self.thread is None and not self.exiting:
+                self.thread = threading.Thread(target=self._run, name="plotter", daemon=True)
+                self.thread.start()
+        print(f"** Plotting {fig_file} in the background")
+
+    def _start(self, plot_format: str, dpi: int, data_files: list[Path]) -> subprocess.Popen:
+        log_file = data_files[0].with_name(f"{data_files[0].stem}_plot.log")
+        print(f"** Background plotter: {len(data_files)} plot(s), log: {log_file}")
+        with open(log_file, "w") as log:
+            return subprocess.Popen(
+                [
+                    sys.executable,
+                    str(Path(__file__).with_name("plot_prolead.py")),
+                    *(str(f.absolute()) for f in data_files),
+                    "--format",
+                    plot_format,
+                    "--dpi",
+                    str(dpi),
+                    "--force",
+                ],
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+
+    def _run(self):
+        while True:
+            # started under the lock, so `hand_off` at exit never misses the popped files
+            with self.lock:
+                if not self.pending or self.exiting:
+                    self.thread = None
+                    return
+                (plot_format, dpi), data_files = next(iter(self.pending.items()))
+                del self.pending[(plot_format, dpi)]
+                proc = self._start(plot_format, dpi, data_files)
+            proc.wait()
+
+    def hand_off(self):
+        """Start a last plotter for the queued files, without waiting for the running one"""
+        with self.lock:
+            self.exiting = True
+            for (plot_format, dpi), data_files in self.pending.items():
+                self._start(plot_format, dpi, data_files)
+            self.pending.clear()
+
+
+_background_plotter: Optional[BackgroundPlotter] = None
+_background_plotter_lock = threading.Lock()
+
+
+def plot_in_background(data_file: Path, fig_file: Path, dpi: int = 600):
+    """Queue `data_file` to the background plotter of this process"""
+    global _background_plotter
+    with _background_plotter_lock:
+        if _background_plotter is None:
+            _background_plotter = BackgroundPlotter()
+    _background_plotter.submit(data_file, fig_file, dpi)
+
+
+def _plot_data(
+    data_np: np.ndarray, fig_file: Path, sca_config: dict, show_figure: bool, dpi: int
+):
+    sns.set_theme(style="whitegrid", context="paper")
+    plt.figure()
+
+    x = data_np[:, 0]
+    y = data_np[:, 1]  # The smallest p-value from the g-test in logarithmic form
+
+    num_sims = np.max(x)
+    max_p_log = np.max(y)
+
+    if num_sims >= 1e10:
+        x_scale = 1e9
+    elif num_sims >= 1e7:
+        x_scale = 1e6
+    elif num_sims >= 1e4:
+        x_scale = 1e3
+    else:
+        x_scale = 1
+
+    if x_scale > 1:
+        x = x / x_scale
+
+    plot = sns.lineplot(
+        x=x,
+        y=y,
+        # kind="line",
+        label=r"$-\log_{10}(p)$"
+        + " [glitch"
+        + ("+transition" if sca_config.get("transitional_leakage") else "")
+        + "]",
+    )
+    plot.axhline(y=max_p_log, linestyle="--", label="Minimum p-value", alpha=0.6)
+    plot.axhline(y=5, color="r", linestyle="--", label="Threshold")
+    plot.set_xlabel(
+        "Number of Simulations" + (rf" ($\times${int(x_scale):,})" if x_scale > 1 else "")
+    )
+    plot.set_ylabel(r"$-\log_{10}(p)$")
+    plot.legend(loc="best", fancybox=True, framealpha=0.9)
+    plt.tight_layout()
+
+    print(f"Saving plot to {fig_file}")
+    with atomic_write(fig_file, "wb") as f:
+        plt.savefig(f, dpi=dpi, format=fig_file.suffix.lstrip(".") or "png")
+    if show_figure and threading.current_thread() is threading.main_thread():
+        plt.show()
+    plt.close()
 
 
 def div_ceil(a: int, b: int) -> int:
@@ -765,506 +1623,1384 @@ def verilog_value(value: Union[int, str], width: Optional[int]) -> str:
     return prefix + v
 
 
-def generate_config(
-    config_file: Path,
-    ports: list[Port],
-    sca_config: dict,
-    sim_config: dict,
-    perf_config: dict,
-):
-
-    # print(f" ports: {ports}")
-    input_ports: list[Port] = [p for p in ports if p.is_input]
-    # print(f" input_ports: {input_ports}")
-    output_ports: list[Port] = [p for p in ports if p.is_output]
-
-    # print(f" output_ports: {output_ports}")
-
-    shared_inputs = [p for p in input_ports if p.share_id is not None]
-    print(f"  shared_inputs: {', '.join(f'{p.name_bits}::{p.share_id}' for p in shared_inputs)}")
-    # shared_outputs = [Output(**p) for p in output_ports if p.get("share_id") is not None]
-    rand_inputs = [p for p in input_ports if p.type == "random"]
-    print(f"  rand_inputs: {', '.join(p.name_bits for p in rand_inputs)}")
-    clocks = [p for p in input_ports if p.type == "clock"]
-    print(f"  clocks: {', '.join(p.name_bits for p in clocks)}")
-    resets = [p for p in input_ports if p.type == "reset"]
-    print(f"  resets: {', '.join(p.name_bits for p in resets)}")
-    reset_signal = resets[0] if resets else None
-
-    end_signals = [
-        p
-        for p in output_ports
-        if p.share_id is None and p.type == "end" and (p.value is not None or p.num_bits == 1)
-    ]
-    for p in end_signals:
-        if p.value is None:
-            p.value = 1
-    print(f"  end_signals: {', '.join(f'{p.name_bits} -> {p.value}' for p in end_signals)}")
-
-    if reset_signal is not None:
-        if reset_signal.value is None:
-            reset_signal.value = 1
-        sim_cycles = sim_config["number_of_clock_cycles"]
-        if sca_config.get("clock_cycles") is None:
-            assert sim_cycles > 1
-            # Note: range is exclusive w.r.t. the end value
-            sca_config["clock_cycles"] = [f"1-{sim_cycles}"]
-
-    assert len(clocks) <= 1, "Expected at most one clock signal"
-    assert len(resets) <= 1, "Expected at most one reset signal"
-    clock_signal = clocks[0].name if clocks else None
-    # sca_order = 2
-
-    total_input_bits = max(1, sum(p.num_bits for p in shared_inputs if p.share_id == 0))
-
-    groups = []
-    fixed_group_value = random.randint(0, 2**total_input_bits - 1)
-
-    # random group
-    groups.append(verilog_value("$", total_input_bits))
-    # fixed group
-    groups.append(verilog_value(fixed_group_value, total_input_bits))
-
-    end_cycles: Optional[int] = None
-
-    sim_vcd = sim_config.pop("vcd", False)
-
-    number_of_simulations: int = sim_config.pop("number_of_simulations", None)
-
-    number_of_simulations_per_step = sim_config.get("number_of_simulations_per_step", 256)
-
-    number_of_sim_steps = div_ceil(number_of_simulations, number_of_simulations_per_step)
-
-    assert number_of_sim_steps, "number_of_sim_steps must be specified"
-
-    assert (
-        number_of_simulations_per_step % 64 == 0
-    ), "number_of_simulations_per_step must be a multiple of 64"
-
-    if sim_vcd:
-        sim_config["waveform_simulation"] = True
-        print("** VCD waveform generation is enabled!")
-        print("** Number of simulations was set to 64!")
-        number_of_sim_steps = 1
-        number_of_simulations_per_step = 64
-
-    number_of_simulations = number_of_simulations_per_step * number_of_sim_steps
-
-    print(f"** Total number of simulations: {number_of_simulations:,}")
-    print(f"** Number of simulations per step: {number_of_simulations_per_step:,}")
-
-    input_sequence = []
-
-    start_bits = {}
+def group_fields(ports: Sequence[Port]) -> list[tuple[Port, int]]:
+    """(port, bit offset) of the share-0 inputs in the group value, in the order used by
+    `generate_config` to assign `group_in0` bits. Inputs with a fixed value get no group bits."""
+    fields = []
+    offset = 0
+    for p in ports:
+        if p.is_input and p.share_id == 0 and p.value is None:
+            fields.append((p, offset))
+            offset += p.num_bits
+    return fields
+
+
+def group_input_bits(ports: Sequence[Port]) -> int:
+    """Group bits of one operation"""
+    return max(1, sum(p.num_bits for p, _ in group_fields(ports)))
+
+
+def plan_fixed_groups(
+    ports: Sequence[Port], spec: str, rng: Optional[random.Random] = None
+) -> list[tuple[str, int]]:
+    """Fixed group values from a comma-separated `spec` of:
+    `random[:N]`: N random values,
+    `zero`, `ones`, `alternating`: all-zero, all-one and 0101/1010 patterns over all inputs,
+    `propagate`, `carry_chain`, `generate`: adder corner cases on the first two equal-width inputs
+        (a=~b: all bits propagate, a=~0 b=1: carry ripples through all bits, a=b=~0: all bits generate),
+    `corners`: all of the above structured patterns,
+    or an integer literal, e.g. `0x1f`.
+    Returns a list of (name, value)."""
+    randint = rng.randint if rng is not None else random.randint
+    fields = group_fields(ports)
+    total_bits = group_input_bits(ports)
+    mask = (1 << total_bits) - 1
+
+    def fields_value(*field_values: int) -> int:
+        value = 0
+        for (p, offset), v in zip(fields, field_values):
+            value |= (v & ((1 << p.num_bits) - 1)) << offset
+        return value
+
+    operands = None
+    if len(fields) >= 2 and fields[0][0].num_bits == fields[1][0].num_bits:
+        operands = fields[0][0].num_bits
+
+    groups: list[tuple[str, int]] = []
+    for item in spec.split(","):
+        item = item.strip()
+        name, _, arg = item.partition(":")
+        if not item:
+            continue
+        if name == "corners":
+            groups += plan_fixed_groups(ports, ",".join(FIXED_GROUP_PATTERNS), rng)
+        elif name == "random":
+            n = int(arg or 1)
+            groups += [(f"random{i}", randint(0, mask)) for i in range(n)]
+        elif name == "zero":
+            groups.append((name, 0))
+        elif name == "ones":
+            groups.append((name, mask))
+        elif name == "alternating":
+            pattern = int("01" * div_ceil(total_bits, 2), 2)
+            groups += [("alternating01", pattern & mask), ("alternating10", ~pattern & mask)]
+        elif name in ("propagate", "carry_chain", "generate"):
+            if operands is None:
+                print(f"** [WARNING] Fixed group {name} needs two equal-width inputs, skipped")
+                continue
+            ones = (1 << operands) - 1
+            if name == "propagate":
+                alternating = int("01" * div_ceil(operands, 2), 2) & ones
+                groups += [
+                    ("propagate", fields_value(0, ones)),
+                    ("propagate_alternating", fields_value(alternating, ~alternating)),
+                ]
+            elif name == "carry_chain":
+                groups.append((name, fields_value(ones, 1)))
+            else:
+                groups.append((name, fields_value(ones, ones)))
+        else:
+            try:
+                groups.append((item, int(item, 0) & mask))
+            except ValueError:
+                raise ValueError(f"Invalid fixed group: {item}")
+    # e.g. `ones` and `generate` are the same value for adders
+    unique: dict[int, str] = {}
+    for name, value in groups:
+        unique.setdefault(value, name)
+    return [(name, value) for value, name in unique.items()]
+
+
+class ConfigTemplate:
+    """Design-dependent part of a PROLEAD config: signals, groups, input sequence and end condition.
+    Per-run variants (number of simulations, SCA order, leakage model, performance options) are
+    stamped out of it with `stamp`.
+
+    With `stream_ops` > 1, fresh shared operands are applied every `stream_interval` cycles for
+    `stream_ops` operations, as a pipelined design runs at full throughput. Each group then holds
+    the inputs of all operations, the fixed groups repeat their value for every operation, and the
+    simulation ends after the number of clock cycles instead of on the end signals."""
+
+    def __init__(
+        self,
+        ports: list[Port],
+        fixed_groups: Sequence[int],
+        stream_ops: int = 1,
+        stream_interval: int = 1,
+    ):
+        # print(f" ports: {ports}")
+        input_ports: list[Port] = [p for p in ports if p.is_input]
+        # print(f" input_ports: {input_ports}")
+        output_ports: list[Port] = [p for p in ports if p.is_output]
 
-    end_condition = {}
+        # print(f" output_ports: {output_ports}")
 
-    if end_cycles:
-        end_condition["clock_cycles"] = end_cycles
-    if end_signals:
-        end_condition["signals"] = [
-            {
-                "name": p.name_bits,  ## FIXME??? p.name?
-                "value": (
-                    p.value
-                    if isinstance(p.value, str)
-                    else verilog_value(p.value if p.value is not None else 1, p.num_bits)
-                ),
-            }
-            for p in end_signals
+        shared_inputs = [p for p in input_ports if p.share_id is not None]
+        print(
+            f"  shared_inputs: {', '.join(f'{p.name_bits}::{p.share_id}' for p in shared_inputs)}"
+        )
+        # shared_outputs = [Output(**p) for p in output_ports if p.get("share_id") is not None]
+        rand_inputs = [p for p in input_ports if p.type == "random"]
+        print(f"  rand_inputs: {', '.join(p.name_bits for p in rand_inputs)}")
+        clocks = [p for p in input_ports if p.type == "clock"]
+        print(f"  clocks: {', '.join(p.name_bits for p in clocks)}")
+        resets = [p for p in input_ports if p.type == "reset"]
+        print(f"  resets: {', '.join(p.name_bits for p in resets)}")
+        reset_signal = resets[0] if resets else None
+
+        end_signals = [
+            p
+            for p in output_ports
+            if p.share_id is None and p.type == "end" and (p.value is not None or p.num_bits == 1)
         ]
-
-    sim_config["number_of_simulations_per_step"] = number_of_simulations_per_step
-    sim_config["number_of_simulations"] = number_of_simulations
-
-    sim_config["groups"] = groups
-    sim_config["always_random_inputs"] = [p.name_bits for p in rand_inputs]
-    sim_config["input_sequence"] = input_sequence
-    sim_config["end_condition"] = end_condition
-
-    def assign_fresh_values(inputs: Sequence[Port]) -> list[dict[str, str]]:
-        signals = []
-        for p in inputs:
-            value = p.value_str
-
-            if value is None and p.share_id is not None:
-                start_bit = start_bits.get(p.share_id, 0)
-                value = "group_in" + (
-                    f"{p.share_id}[{p.num_bits + start_bit - 1}:{start_bit}]"
-                    if p.num_bits > 1
-                    else f"{p.share_id}[{start_bit}]"
-                )
-                start_bits[p.share_id] = start_bit + p.num_bits
-            if value is not None:
-                signals.append(
-                    {
-                        "name": p.name_bits,
-                        "value": value,
-                    }
-                )
-        return signals
-
-    initial_signals = assign_fresh_values(
-        [p for p in input_ports if p.share_id is not None or p.type is None]
-    )
-    if reset_signal:
-        assert reset_signal.value_str is not None, "Expected reset value at this point"
-        initial_signals.append({"name": reset_signal.name, "value": reset_signal.value_str})
-
-    input_sequence += [
-        {
-            "signals": initial_signals,
-            "hold_for_cycles": 1,
-        },
-    ]
-    if reset_signal:
-        not_reset = (
-            (~reset_signal.value) & ((1 << (reset_signal.num_bits or 1)) - 1)
-            if isinstance(reset_signal.value, int)
-            else 1 if reset_signal.value in ("1'b0", "1'h0", "0") else 0
+        for p in end_signals:
+            if p.value is None:
+                p.value = 1
+        print(f"  end_signals: {', '.join(f'{p.name_bits} -> {p.value}' for p in end_signals)}")
+
+        if reset_signal is not None:
+            if reset_signal.value is None:
+                reset_signal.value = 1
+
+        assert len(clocks) <= 1, "Expected at most one clock signal"
+        assert len(resets) <= 1, "Expected at most one reset signal"
+        clock_signal = clocks[0].name if clocks else None
+        # sca_order = 2
+
+        self.has_reset = reset_signal is not None
+        self.stream = stream_ops > 1
+        if not self.stream:
+            stream_interval = 1
+        # cycles until the inputs of all operations were applied
+        self.stream_cycles = int(self.has_reset) + stream_ops * stream_interval
+
+        # input bits of one operation
+        total_input_bits = group_input_bits(shared_inputs)
+        group_bits = total_input_bits * stream_ops
+
+        groups = []
+        # random group
+        groups.append(verilog_value("$", group_bits))
+        # fixed groups, the same value for all operations
+        groups += [
+            verilog_value(sum(v << (i * total_input_bits) for i in range(stream_ops)), group_bits)
+            for v in fixed_groups
+        ]
+        self.groups = groups
+
+        end_cycles: Optional[int] = None
+
+        input_sequence = []
+
+        start_bits = {}
+
+        end_condition = {}
+
+        if end_cycles:
+            end_condition["clock_cycles"] = end_cycles
+        if end_signals and self.stream:
+            print("** Streaming operations: the simulation ends after the clock cycles")
+        elif end_signals:
+            end_condition["signals"] = [
+                {
+                    "name": p.name_bits,  ## FIXME??? p.name?
+                    "value": (
+                        p.value
+                        if isinstance(p.value, str)
+                        else verilog_value(p.value if p.value is not None else 1, p.num_bits)
+                    ),
+                }
+                for p in end_signals
+            ]
+
+        self.always_random_inputs = [p.name_bits for p in rand_inputs]
+        self.input_sequence = input_sequence
+        self.end_condition = end_condition
+
+        def assign_fresh_values(inputs: Sequence[Port], op: int = 0) -> list[dict[str, str]]:
+            """Values of the `op`-th operation"""
+            signals = []
+            start_bits.clear()
+            for p in inputs:
+                value = p.value_str
+
+                if value is None and p.share_id is not None:
+                    start_bit = start_bits.get(p.share_id, op * total_input_bits)
+                    value = "group_in" + (
+                        f"{p.share_id}[{p.num_bits + start_bit - 1}:{start_bit}]"
+                        if p.num_bits > 1
+                        else f"{p.share_id}[{start_bit}]"
+                    )
+                    start_bits[p.share_id] = start_bit + p.num_bits
+                if value is not None:
+                    signals.append(
+                        {
+                            "name": p.name_bits,
+                            "value": value,
+                        }
+                    )
+            return signals
+
+        initial_signals = assign_fresh_values(
+            [p for p in input_ports if p.share_id is not None or p.type is None]
         )
-        print(f"** Reset signal: {reset_signal.name} = {reset_signal.value} -> {not_reset}")
+        if reset_signal:
+            assert reset_signal.value_str is not None, "Expected reset value at this point"
+            initial_signals.append({"name": reset_signal.name, "value": reset_signal.value_str})
+
         input_sequence += [
             {
-                "signals": [
-                    {
-                        "name": reset_signal.name,
-                        "value": verilog_value(not_reset, 1),
-                    },
-                ],
-                "hold_for_cycles": 1,
+                "signals": initial_signals,
+                "hold_for_cycles": 1 if reset_signal else stream_interval,
             },
         ]
+        if reset_signal:
+            not_reset = (
+                (~reset_signal.value) & ((1 << (reset_signal.num_bits or 1)) - 1)
+                if isinstance(reset_signal.value, int)
+                else 1 if reset_signal.value in ("1'b0", "1'h0", "0") else 0
+            )
+            print(f"** Reset signal: {reset_signal.name} = {reset_signal.value} -> {not_reset}")
+            input_sequence += [
+                {
+                    "signals": [
+                        {
+                            "name": reset_signal.name,
+                            "value": verilog_value(not_reset, 1),
+                        },
+                    ],
+                    "hold_for_cycles": stream_interval,
+                },
+            ]
+        for op in range(1, stream_ops):
+            input_sequence.append(
+                {
+                    "signals": assign_fresh_values(
+                        [p for p in input_ports if p.share_id is not None], op
+                    ),
+                    "hold_for_cycles": stream_interval,
+                }
+            )
+
+        hardware = {}
+
+        if clock_signal:
+            hardware["clock_signal_name"] = clock_signal
+        self.hardware = hardware
+
+    def stamp(self, sca_config: dict, sim_config: dict, perf_config: dict) -> dict:
+        """A complete config for these run options. The design-dependent parts are shared with the
+        template, not copied."""
+        sca_config = dict(sca_config)
+        sim_config = dict(sim_config)
+        end_condition = self.end_condition
+
+        if self.stream:
+            sim_cycles = sim_config["number_of_clock_cycles"]
+            if sim_cycles < self.stream_cycles:
+                raise ValueError(
+                    f"{sim_cycles} simulation cycles are too few to stream all operations, "
+                    f"which takes {self.stream_cycles} cycles"
+                )
+            end_condition = {"clock_cycles": sim_cycles}
 
-    hardware = {}
+        if self.has_reset:
+            sim_cycles = sim_config["number_of_clock_cycles"]
+            if sca_config.get("clock_cycles") is None:
+                assert sim_cycles > 1
+                # Note: range is exclusive w.r.t. the end value
+                sca_config["clock_cycles"] = [f"1-{sim_cycles}"]
 
-    if clock_signal:
-        hardware["clock_signal_name"] = clock_signal
+        sim_vcd = sim_config.pop("vcd", False)
 
-    config = {
-        "performance": perf_config,
-        "simulation": sim_config,
-        "hardware": hardware,
-        "side_channel_analysis": sca_config,
-    }
-    print(f"Writing config to {config_file.absolute()}")
+        number_of_simulations: int = sim_config.pop("number_of_simulations", None)
 
-    with open(config_file, "w") as f:
-        f.write(json.dumps(config, indent=2))
+        number_of_simulations_per_step = sim_config.get("number_of_simulations_per_step", 256)
 
+        number_of_sim_steps = div_ceil(number_of_simulations, number_of_simulations_per_step)
 
-if __name__ == "__main__":
-    args = argparser.parse_args()
-
-    if not args.source_files and not args.sources_list:
-        if not args.netlist:
-            print("No source files specified")
-            exit(1)
-        if not args.top_module:
-            print("Top module not specified")
-            exit(1)
-    else:
-        if args.netlist:
-            print("Either specify source files or netlist file, not both")
-            exit(1)
+        assert number_of_sim_steps, "number_of_sim_steps must be specified"
+
+        assert (
+            number_of_simulations_per_step % 64 == 0
+        ), "number_of_simulations_per_step must be a multiple of 64"
 
-    if args.sources_list:
-        with open(args.sources_list, "r") as f:
-            args.source_files = [Path(l.strip()) for l in f]
+        if sim_vcd:
+            sim_config["waveform_simulation"] = True
+            print("** VCD waveform generation is enabled!")
+            print("** Number of simulations was set to 64!")
+            number_of_sim_steps = 1
+            number_of_simulations_per_step = 64
 
-    prolead_root_dir = args.prolead_root_dir or os.environ.get("PROLEAD_ROOT_DIR")
+        number_of_simulations = number_of_simulations_per_step * number_of_sim_steps
 
-    if prolead_root_dir is None and args.prolead_bin:
-        prolead_root_dir = Path(args.prolead_bin).parent.parent
+        print(f"** Total number of simulations: {number_of_simulations:,}")
+        print(f"** Number of simulations per step: {number_of_simulations_per_step:,}")
 
-    if prolead_root_dir:
-        prolead_root_dir = Path(prolead_root_dir).resolve()
-        if args.prolead_bin is None:
-            args.prolead_bin = prolead_root_dir / "release" / "PROLEAD"
+        sim_config["number_of_simulations_per_step"] = number_of_simulations_per_step
+        sim_config["number_of_simulations"] = number_of_simulations
 
-    if args.netlist is None:
-        verilog_lib = args.yosys_verilog_lib
-        liberty_lib = args.yosys_lib
-        
-        if liberty_lib is None:
-            if prolead_root_dir is None:
-                print("Neither --yosys-verilog-lib/--yosys-lib nor --prolead-root-dir where specified")
-                exit(1)
-            assert isinstance(prolead_root_dir, Path)
-            LIBRARY_PATH = prolead_root_dir / "yosys" / "lib"
-            liberty_lib = LIBRARY_PATH / "custom_cells.lib"
+        sim_config["groups"] = self.groups
+        sim_config["always_random_inputs"] = self.always_random_inputs
+        sim_config["input_sequence"] = self.input_sequence
+        sim_config["end_condition"] = end_condition
 
-            if verilog_lib is None:
-                verilog_lib = LIBRARY_PATH / "custom_cells.v"
+        return {
+            "performance": perf_config,
+            "simulation": sim_config,
+            "hardware": self.hardware,
+            "side_channel_analysis": sca_config,
+        }
 
-        if verilog_lib:
-            assert verilog_lib.exists(), f"Verilog library {verilog_lib} does not exist"
 
-        assert liberty_lib, f"Liberty library not specified"
-        assert liberty_lib.exists(), f"Liberty library {liberty_lib} does not exist"
+# file hashes keyed by path, mtime and size, e.g. of the PROLEAD binary hashed for every job
+_file_sha256_cache: dict[tuple[str, int, int], str] = {}
+
+
+def file_sha256(path: Path) -> str:
+    st = os.stat(path)
+    key = (str(Path(path).resolve()), st.st_mtime_ns, st.st_size)
+    digest = _file_sha256_cache.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = _file_sha256_cache[key] = h.hexdigest()
+    return digest
+
+
+def config_hash(config: dict) -> str:
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+# templates keyed by the ports and fixed group values
+_template_cache: OrderedDict[str, ConfigTemplate] = OrderedDict()
+_template_cache_lock = threading.Lock()
+TEMPLATE_CACHE_SIZE = 64
+
+# simulation cycles of the gadget runs beyond the gadget latency
+GADGET_EXTRA_CYCLES = 2
+
+
+def get_config_template(
+    ports: list[Port], fixed_groups: Sequence[int], stream_ops: int = 1, stream_interval: int = 1
+) -> ConfigTemplate:
+    key = hashlib.sha256(
+        json.dumps(
+            [dataclasses.asdict(p) for p in ports]
+            + list(fixed_groups)
+            + [stream_ops, stream_interval]
+        ).encode()
+    ).hexdigest()
+    with _template_cache_lock:
+        template = _template_cache.get(key)
+        if template is not None:
+            _template_cache.move_to_end(key)
+            return template
+    template = ConfigTemplate(ports, fixed_groups, stream_ops, stream_interval)
+    with _template_cache_lock:
+        _template_cache[key] = template
+        while len(_template_cache) > TEMPLATE_CACHE_SIZE:
+            _template_cache.popitem(last=False)
+    return template
+
+
+def make_config(
+    ports: list[Port],
+    sca_config: dict,
+    sim_config: dict,
+    perf_config: dict,
+    rng: Optional[random.Random] = None,
+    fixed_groups: Optional[Sequence[int]] = None,
+    stream_ops: int = 1,
+    stream_interval: int = 1,
+) -> dict:
+    randint = rng.randint if rng is not None else random.randint
 
-    prolead_run_dir: Path = Path("prolead_run") / (args.top_module or "top")
+    for p in ports:
+        if p.value == "fixed":
+            p.value = randint(0, p.num_bits - 1)
 
-    if not prolead_run_dir.exists():
-        prolead_run_dir.mkdir(parents=True)
+    if not fixed_groups:
+        fixed_groups = [randint(0, 2 ** group_input_bits(ports) - 1)]
 
-    yosys_run_dir = prolead_run_dir
+    template = get_config_template(ports, fixed_groups, stream_ops, stream_interval)
+    return template.stamp(sca_config, sim_config, perf_config)
 
-    if not yosys_run_dir.exists():
-        yosys_run_dir.mkdir(parents=True)
 
-    for f in args.source_files:
-        assert isinstance(f, Path), f"Expected Path, got {f}"
-        assert f.exists(), f"File {f} does not exist"
+def write_config(config_file: Path, config: dict):
+    print(f"Writing config to {config_file.absolute()}")
+    with atomic_write(config_file) as f:
+        f.write(json.dumps(config, indent=2))
 
-    assert isinstance(args.source_files, list)
 
-    assert all(isinstance(f, Path) for f in args.source_files)
+def generate_config(
+    config_file: Path,
+    ports: list[Port],
+    sca_config: dict,
+    sim_config: dict,
+    perf_config: dict,
+    rng: Optional[random.Random] = None,
+    fixed_groups: Optional[Sequence[int]] = None,
+    stream_ops: int = 1,
+    stream_interval: int = 1,
+) -> dict:
+    config = make_config(
+        ports, sca_config, sim_config, perf_config, rng, fixed_groups, stream_ops, stream_interval
+    )
+    write_config(config_file, config)
+    return config
 
-    args.source_files = [Path(f).absolute() for f in args.source_files]
 
-    if args.netlist:
-        netlist_file = args.netlist
-        run_synth = False
-    else:
-        netlist_file = None
+class JobError(Exception):
+    pass
 
-        if args.top_module:
-            netlist_file = prolead_run_dir / "netlist.v"
 
-        run_synth = args.force_synth
+@dataclass
+class Job:
+    """A PROLEAD job: synthesis (unless a netlist is given), port classification, config generation
+    and the PROLEAD run. Fields mirror the command line options of this script."""
+
+    source_files: list[Path] = field(default_factory=list)
+    netlist: Optional[Path] = None
+    top_module: Optional[str] = None
+    run_dir: Optional[Path] = None
+    force_synth: bool = False
+    quiet_synth: bool = True
+    prolead_root_dir: Optional[Path] = None
+    yosys_bin: Union[str, Path] = "yosys"
+    yosys_backend: Literal["process", "pyosys"] = "process"
+    yosys_verilog_lib: Optional[Path] = None
+    yosys_lib: Optional[Path] = None
+    prolead_bin: Union[str, Path, None] = None
+    library_json: Optional[Path] = None
+    library_name: str = "custom"
+    random_seed: Optional[int] = None
+    order: int = 1
+    num_simulations: int = 10_000_000
+    sim_cycles: Optional[int] = None
+    transitional: bool = True
+    compact: bool = False
+    ports_json: Optional[Path] = None
+    # pre-parsed netlist ports, instead of parsing the json netlist
+    ports: Optional[list[dict]] = None
+    strict_ports: bool = False
+    fixed_groups: str = "random"
+    # (name, value) of the fixed groups, overrides `fixed_groups`
+    fixed_group_plan: Optional[list[tuple[str, int]]] = None
+    group_runs: int = 1
+    # operations streamed into the design, one every `stream_interval` cycles
+    stream_ops: int = 1
+    stream_interval: int = 1
+    # waveform simulation, followed by the switching activity report
+    vcd: bool = False
+    opt: Literal["full", "flatten", "none"] = "none"
+    # parameters of the top module
+    parameters: Optional[dict[str, str]] = None
+    hierarchical: bool = False
+    gadget_modules: str = GADGET_MODULES_REGEX
+    # regex of the signals not to probe
+    exclude_probes: Optional[str] = None
+    minimize_probing_sets: str = "trivial"
+    simulations_per_step: Optional[int] = None
+    probing_sets_per_step: Optional[int] = None
+    num_cores: Optional[str] = None
+    prolead_config: Optional[Path] = None
+    pretty: bool = True
+    show_figure: bool = False
+    plot: bool = True
+    plot_mode: Literal["background", "inline", "deferred"] = "background"
+    plot_format: str = "png"
+    plot_dpi: int = 600
+    report_randomness: bool = True
+    share_check: bool = True
+    results_db: Optional[Path] = None
+    verdict_cache: Optional[Path] = None
+    # seconds since the last use
+    cache_max_age: Optional[float] = None
+    # bytes
+    cache_max_size: Optional[int] = None
+    # (result, sca_config, ports, rng) set by `prepare_run`
+    _prepared: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+    _synth_key: Optional[str] = field(default=None, init=False, repr=False, compare=False)
 
-        if not run_synth:
-            # Check if the netlist file exists
-            if not netlist_file or not netlist_file.exists():
-                run_synth = True
-            else:
-                # check if modification time of the netlist file is older than the source files
-                netlist_mtime = netlist_file.stat().st_mtime
-                if any(netlist_mtime < Path(f).stat().st_mtime for f in args.source_files):
-                    run_synth = True
-        netlist_file = prolead_run_dir / "netlist.v"
-
-    if run_synth:
-        synthesize(
-            args.yosys_bin,
-            yosys_run_dir,
-            args.source_files,
-            args.top_module,
-            verilog_lib=verilog_lib,
-            liberty_lib=liberty_lib,
-            verilog_netlist=netlist_file,
-            opt_flatten=args.opt == "flatten" or args.opt == "full",
-            opt_full=args.opt == "full",
-            split_nets=True,
-            quiet=args.quiet_synth,
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "Job":
+        sources = list(args.source_files)
+        if args.sources_list:
+            with open(args.sources_list, "r") as f:
+                sources = [Path(l.strip()) for l in f]
+        return cls(
+            source_files=sources,
+            netlist=args.netlist,
+            top_module=args.top_module,
+            force_synth=args.force_synth,
+            quiet_synth=args.quiet_synth,
+            prolead_root_dir=args.prolead_root_dir,
+            yosys_bin=args.yosys_bin,
+            yosys_backend=args.yosys_backend,
+            yosys_verilog_lib=args.yosys_verilog_lib,
+            yosys_lib=args.yosys_lib,
+            prolead_bin=args.prolead_bin,
+            library_json=args.library_json,
+            library_name=args.library_name,
+            random_seed=args.random_seed,
+            order=args.order,
+            num_simulations=int(args.num_simulations),
+            sim_cycles=args.sim_cycles,
+            transitional=args.transitional,
+            compact=args.compact,
+            ports_json=args.ports_json,
+            strict_ports=args.strict_ports,
+            fixed_groups=args.fixed_groups,
+            group_runs=args.group_runs,
+            stream_ops=args.stream_ops,
+            stream_interval=args.stream_interval,
+            vcd=args.vcd,
+            opt=args.opt,
+            hierarchical=args.hierarchical,
+            gadget_modules=args.gadget_modules,
+            minimize_probing_sets=args.minimize_probing_sets,
+            simulations_per_step=(
+                int(args.simulations_per_step) if args.simulations_per_step else None
+            ),
+            probing_sets_per_step=(
+                int(args.probing_sets_per_step) if args.probing_sets_per_step else None
+            ),
+            num_cores=args.num_cores,
+            prolead_config=args.prolead_config,
+            pretty=args.pretty,
+            show_figure=args.show_figure,
+            plot_mode=args.plot_mode,
+            plot_format=args.plot_format,
+            plot_dpi=args.plot_dpi,
+            report_randomness=args.randomness_report,
+            share_check=args.share_check,
+            results_db=args.results_db,
+            verdict_cache=args.verdict_cache,
+            cache_max_age=args.cache_max_age,
+            cache_max_size=args.cache_max_size,
         )
-    else:
-        print(f"** Using existing netlist: {netlist_file}")
 
-    if not args.netlist:
-        json_netlist = netlist_file.with_suffix(".json")
+    def prepare(self):
+        """Validate the job and resolve tool, library and run directory paths"""
+        if not self.source_files:
+            if not self.netlist:
+                raise JobError("No source files specified")
+            if not self.top_module:
+                raise JobError("Top module not specified")
+        elif self.netlist:
+            raise JobError("Either specify source files or netlist file, not both")
+
+        prolead_root_dir = self.prolead_root_dir or os.environ.get("PROLEAD_ROOT_DIR")
+
+        if prolead_root_dir is None and self.prolead_bin:
+            prolead_root_dir = Path(self.prolead_bin).parent.parent
+
+        if prolead_root_dir:
+            self.prolead_root_dir = Path(prolead_root_dir).resolve()
+            if self.prolead_bin is None:
+                self.prolead_bin = self.prolead_root_dir / "release" / "PROLEAD"
+
+        if self.netlist is None:
+            if self.yosys_lib is None:
+                if self.prolead_root_dir is None:
+                    raise JobError(
+                        "Neither --yosys-verilog-lib/--yosys-lib nor --prolead-root-dir where specified"
+                    )
+                LIBRARY_PATH = self.prolead_root_dir / "yosys" / "lib"
+                self.yosys_lib = LIBRARY_PATH / "custom_cells.lib"
+
+                if self.yosys_verilog_lib is None:
+                    self.yosys_verilog_lib = LIBRARY_PATH / "custom_cells.v"
+
+            if self.yosys_verilog_lib:
+                assert (
+                    self.yosys_verilog_lib.exists()
+                ), f"Verilog library {self.yosys_verilog_lib} does not exist"
+
+            assert self.yosys_lib, f"Liberty library not specified"
+            assert self.yosys_lib.exists(), f"Liberty library {self.yosys_lib} does not exist"
+
+        if self.run_dir is None:
+            self.run_dir = Path("prolead_run") / (self.top_module or "top")
+
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+
+        for f in self.source_files:
+            assert f.exists(), f"File {f} does not exist"
+
+        self.source_files = [Path(f).absolute() for f in self.source_files]
+
+        if self.yosys_backend == "pyosys" and not self.netlist and not yosys_worker.available():
+            raise JobError("The pyosys Yosys backend requires the pyosys package")
+
+        if self.minimize_probing_sets in (False, 0, "false", "none"):
+            self.minimize_probing_sets = "no"
+
+        if not self.num_cores:
+            self.num_cores = "half"
+
+    def synth_key(self) -> str:
+        """Hash of the synthesis inputs. Jobs on the same design share the netlist directory. Computed
+        once, before the top module is detected, so it is the same for all jobs without a top."""
+        if self._synth_key is None:
+            h = hashlib.sha256()
+            for f in self.source_files:
+                h.update(file_sha256(Path(f)).encode())
+            for s in (self.top_module, self.opt, self.yosys_lib, self.yosys_verilog_lib):
+                h.update(b"\0" + str(s).encode())
+            if self.parameters:
+                h.update(b"\0" + json.dumps(self.parameters, sort_keys=True).encode())
+            self._synth_key = h.hexdigest()
+        return self._synth_key
+
+    @property
+    def netlist_file(self) -> Path:
+        if self.netlist:
+            return self.netlist
+        assert self.run_dir
+        return self.run_dir / "netlist" / self.synth_key()[:16] / "netlist.v"
+
+    def needs_synthesis(self) -> bool:
+        if self.netlist:
+            return False
+        # sources changes result in a new netlist directory; without a top module the synthesis key
+        # is that of the sources with the automatically detected top
+        return self.force_synth or not self.netlist_file.exists()
+
+    def synthesize(self) -> Path:
+        """Synthesize into a temporary directory which is renamed to the netlist directory when
+        complete, under a lock, so concurrent jobs on the same design synthesize only once"""
+        assert self.run_dir and self.yosys_lib
+        netlist_dir = self.netlist_file.parent
+        with file_lock(netlist_dir.with_name(netlist_dir.name + ".lock")):
+            if self.netlist_file.exists() and not self.force_synth:
+                print(f"** Netlist was synthesized by another job: {self.netlist_file}")
+                return self.netlist_file
+            tmp_dir = netlist_dir.with_name(
+                f".{netlist_dir.name}.{os.getpid()}-{threading.get_ident()}.tmp"
+            )
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            try:
+                synthesize(
+                    self.yosys_bin,
+                    tmp_dir,
+                    self.source_files,
+                    self.top_module,
+                    verilog_lib=self.yosys_verilog_lib,  # type: ignore
+                    liberty_lib=self.yosys_lib,
+                    verilog_netlist=tmp_dir / self.netlist_file.name,
+                    parameters=self.parameters,
+                    opt_flatten=self.opt == "flatten" or self.opt == "full",
+                    opt_full=self.opt == "full",
+                    split_nets=True,
+                    quiet=self.quiet_synth,
+                    backend=self.yosys_backend,
+                )
+                shutil.rmtree(netlist_dir, ignore_errors=True)
+                os.replace(tmp_dir, netlist_dir)
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        return self.netlist_file
+
+    def parse_netlist(self) -> list[dict]:
+        """Ports of the synthesized netlist. Also detects the top module if not specified."""
+        if self.ports is not None:
+            return self.ports
+        if self.netlist:
+            return []
+        json_netlist = self.netlist_file.with_suffix(".json")
 
         print(f"** Parsing {json_netlist}")
-        top, ports = parse_json_netlist(json_netlist)
+        with profiler.phase("json_parse"):
+            top, ports = parse_json_netlist(json_netlist)
 
-        if not args.top_module:
+        if not self.top_module:
             print(f"** Detected top module: {top}")
-            args.top_module = top
-            assert args.top_module, "Failed to detect top module"
-            # new_name = prolead_run_dir.parent / args.top_module
-            # print(f"Renaming {prolead_run_dir} to {new_name}")
-            # prolead_run_dir.rename(new_name)
-            # prolead_run_dir = new_name
-            # netlist_file = prolead_run_dir / "netlist.v"
-    else:
-        ports = []
+            self.top_module = top
+            assert self.top_module, "Failed to detect top module"
+        return ports
+
+    def classify_ports(self, ports: list[dict]) -> list[Port]:
+        with profiler.phase("port_classification"):
+            try:
+                port_dicts = classify_ports(ports, self.ports_json, strict=self.strict_ports)
+            except ValueError as e:
+                raise JobError(str(e))
+            return [Port(**p) for p in port_dicts]
+
+    def randomness_report(self, ports: list[Port]) -> Optional[RandomnessReport]:
+        """Randomness consumption of the synthesized netlist"""
+        json_netlist = self.netlist_file.with_suffix(".json")
+        if not self.report_randomness or not self.top_module or not json_netlist.exists():
+            return None
+        with profiler.phase("randomness_report"):
+            with open(json_netlist, "r") as f:
+                netlist = json.load(f)
+            report = randomness_report(netlist, self.top_module, ports)
+        report.print()
+        return report
+
+    def share_dependency_report(self, ports: list[Port]) -> Optional[ShareDependencyReport]:
+        """Static first-order screening of the synthesized netlist for combined shares"""
+        json_netlist = self.netlist_file.with_suffix(".json")
+        if not self.share_check or not self.top_module or not json_netlist.exists():
+            return None
+        with profiler.phase("share_check"):
+            with open(json_netlist, "r") as f:
+                netlist = json.load(f)
+            report = share_dependency_report(netlist, self.top_module, ports)
+        report.print()
+        return report
+
+    def verify_gadgets(self) -> list["JobResult"]:
+        """Verify each distinct gadget module of the design once, and exclude the probes within the
+        instances of the verified gadgets from this job"""
+        assert self.run_dir and self.top_module
+        rtl_json = self.netlist_file.parent / "yosys_rtl.json"
+        if not self.source_files or not rtl_json.exists():
+            raise JobError("Hierarchical verification needs the RTL sources of the design")
+        with open(rtl_json, "r") as f:
+            rtl = json.load(f)
+        instances = find_gadget_instances(rtl, self.top_module, self.gadget_modules)
+        if not instances:
+            print(
+                f"** [WARNING] No instances of gadget modules ({self.gadget_modules}) found in "
+                f"{self.top_module}, analyzing the whole design"
+            )
+            return []
+
+        jobs = []
+        for module, paths in instances.items():
+            name, parameters = module_name_and_parameters(module, rtl)
+            print(f"** Gadget {module}: {len(paths)} instance(s)")
+            job = dataclasses.replace(
+                self,
+                top_module=name,
+                parameters=parameters or None,
+                netlist=None,
+                ports=None,
+                ports_json=None,
+                run_dir=self.run_dir / "gadgets" / gadget_dir_name(module),
+                force_synth=False,
+                fixed_groups="random",
+                fixed_group_plan=None,
+                group_runs=1,
+                stream_ops=1,
+                stream_interval=1,
+                vcd=False,
+                prolead_config=None,
+                hierarchical=False,
+                exclude_probes=None,
+                # same config for every design using the gadget, so its verdict is reused
+                random_seed=int(hashlib.sha256(module.encode()).hexdigest()[:16], 16),
+                verdict_cache=self.verdict_cache or self.run_dir / "gadget_verdicts",
+                pretty=False,
+                plot=False,
+                show_figure=False,
+            )
+            job.prepare()
+            if job.needs_synthesis():
+                job.synthesize()
+            classified = job.classify_ports(job.parse_netlist())
+            with open(job.netlist_file.with_suffix(".json"), "r") as f:
+                netlist = json.load(f)
+            share_inputs = [p.name for p in classified if p.is_input and p.share_id is not None]
+            latency = NetlistGraph(netlist, name).register_latency(share_inputs)
+            job.sim_cycles = latency + GADGET_EXTRA_CYCLES
+            jobs.append(job)
+
+        results = Campaign(jobs).run()
+        print_results(results, "Gadget verification")
+        verified = []
+        for (module, paths), r in zip(instances.items(), results):
+            if r.ok and r.leakage is False:
+                verified += paths
+            else:
+                print(f"** [WARNING] Gadget {module} is not verified, its instances are probed")
+        if verified:
+            print(f"** Excluding the probes within {len(verified)} verified gadget instance(s)")
+            self.exclude_probes = exclude_instances_regex(verified)
+        return results
+
+    def sca_config(self) -> dict:
+        exclude_signals_regex = self.exclude_probes or ""
+
+        probe_placement = {
+            "include": {"signals": ".*", "paths": ".*"},
+            "exclude": {
+                "signals": exclude_signals_regex if exclude_signals_regex else "(?!)",
+                "paths": "(?!)",
+            },
+        }
 
-    assert netlist_file
+        sca_config = {
+            "order": self.order,
+            "transitional_leakage": self.transitional,
+            "effect_size": 0.1,
+        }
 
-    exclude_signals_regex = ""
+        if probe_placement:
+            sca_config["probe_placement"] = probe_placement
+        return sca_config
+
+    def plan_fixed_groups(self, ports: list[Port], rng: random.Random) -> list[tuple[str, int]]:
+        if self.fixed_group_plan is not None:
+            return self.fixed_group_plan
+        try:
+            return plan_fixed_groups(ports, self.fixed_groups, rng)
+        except ValueError as e:
+            raise JobError(str(e))
+
+    def config_run_dir(self, config: dict) -> Path:
+        """Each PROLEAD run gets its own directory keyed by the config hash"""
+        assert self.run_dir
+        return self.run_dir / "runs" / config_hash(config)[:16]
+
+    def generate_config(self, ports: list[Port], sca_config: dict, rng: random.Random) -> Path:
+        """Write the config (and the fixed groups) to the run directory of the config"""
+        assert self.run_dir
+        if not self.sim_cycles:
+            raise JobError("Number of simulation cycles (--sim-cycles) must be specified!")
+
+        num_simulations = int(self.num_simulations)
+
+        if self.simulations_per_step:
+            number_of_simulations_per_step = int(self.simulations_per_step)
+        else:
+            number_of_simulations_per_step = (
+                min(16, div_ceil(num_simulations, 1_000_000) * 2) * 1024
+            )
 
-    probe_placement = {
-        "include": {"signals": ".*", "paths": ".*"},
-        "exclude": {
-            "signals": exclude_signals_regex if exclude_signals_regex else "(?!)",
-            "paths": "(?!)",
-        },
-    }
+        sim_config = {
+            "number_of_simulations": num_simulations,
+            "number_of_simulations_per_step": number_of_simulations_per_step,
+            # "end_wait_cycles": 0,
+            "number_of_clock_cycles": self.sim_cycles,
+            "number_of_simulations_per_write": 1024 * number_of_simulations_per_step,
+        }
+        if self.vcd:
+            sim_config["vcd"] = True
 
-    sca_config = {
-        "order": args.order,
-        "transitional_leakage": args.transitional,
-        "effect_size": 0.1,
-    }
+        perf_config = {
+            # "max_number_of_threads": "half",  ### half of the available cores
+            "max_number_of_threads": self.num_cores,
+            # "minimize_probing_sets": "aggressive", # "trivial" ,"aggressive", "no"
+            "minimize_probing_sets": self.minimize_probing_sets,
+            "compact_distributions": self.compact,
+        }
 
-    if probe_placement:
-        sca_config["probe_placement"] = probe_placement
+        if self.probing_sets_per_step:
+            perf_config["number_of_probing_sets_per_step"] = int(self.probing_sets_per_step)
+
+        fixed_groups = self.plan_fixed_groups(ports, rng)
+        print(f"** Fixed groups: {', '.join(f'{name}={value:#x}' for name, value in fixed_groups)}")
+
+        if self.stream_ops < 1 or self.stream_interval < 1:
+            raise JobError("--stream-ops and --stream-interval must be at least 1")
+
+        with profiler.phase("config_generation"):
+            try:
+                config = make_config(
+                    ports,
+                    sca_config,
+                    sim_config,
+                    perf_config,
+                    rng=rng,
+                    fixed_groups=[value for _, value in fixed_groups],
+                    stream_ops=self.stream_ops,
+                    stream_interval=self.stream_interval,
+                )
+            except ValueError as e:
+                raise JobError(str(e))
+        run_dir = self.config_run_dir(config)
+        run_dir.mkdir(parents=True, exist_ok=True)
+        with atomic_write(run_dir / "groups.json") as f:
+            json.dump([{"name": name, "value": value} for name, value in fixed_groups], f, indent=2)
+        config_file = run_dir / "config.json"
+        write_config(config_file, config)
+        return config_file
+
+    def split_groups(self, ports: list[dict], rng: random.Random) -> list["Job"]:
+        """Jobs running the fixed groups in `group_runs` parallel PROLEAD runs on this job's netlist"""
+        assert self.run_dir
+        plan = self.plan_fixed_groups(self.classify_ports(ports), rng)
+        chunks = [plan[i :: self.group_runs] for i in range(self.group_runs)]
+        return [
+            self.on_netlist(
+                ports,
+                run_dir=self.run_dir / f"groups{i}",
+                random_seed=rng.randint(0, 2**64 - 1),
+                fixed_group_plan=chunk,
+                group_runs=1,
+            )
+            for i, chunk in enumerate(chunks)
+            if chunk
+        ]
 
-    num_simulations = int(args.num_simulations)
+    def run_prolead(
+        self, config_file: Path, sca_config: dict, console: Optional[Console] = None
+    ) -> ProleadStats:
+        assert self.run_dir and self.library_json and self.top_module
+        if self.prolead_bin is None:
+            raise JobError("Neither --prolead-bin nor --prolead-root-dir where specified")
+        run_dir = config_file.parent
+        if self.prolead_config:
+            with open(config_file, "r") as f:
+                run_dir = self.config_run_dir(json.load(f))
+            run_dir.mkdir(parents=True, exist_ok=True)
+        # identical jobs in other processes run in the same directory
+        with file_lock(run_dir / ".lock"):
+            return self._run_prolead(run_dir, config_file, sca_config, console)
+
+    def _run_prolead(
+        self, run_dir: Path, config_file: Path, sca_config: dict, console: Optional[Console]
+    ) -> ProleadStats:
+        assert self.library_json and self.top_module and self.prolead_bin
+        return run_prolead(
+            self.prolead_bin,
+            run_dir,
+            self.netlist_file,
+            self.top_module,
+            library_name=self.library_name,
+            library_json=self.library_json,
+            sca_config=sca_config,
+            config_file=config_file,
+            show_figure=self.show_figure,
+            result_folder="results",
+            pretty=self.pretty,
+            plot=self.plot,
+            console=console,
+            plot_mode=self.plot_mode,
+            plot_format=self.plot_format,
+            plot_dpi=self.plot_dpi,
+        )
 
-    if args.simulations_per_step:
-        number_of_simulations_per_step = int(args.simulations_per_step)
-    else:
-        number_of_simulations_per_step = min(16, div_ceil(num_simulations, 1_000_000) * 2) * 1024
+    def job_key(self, config_file: Path) -> str:
+        """Hash of everything determining the PROLEAD results: config, netlist and PROLEAD setup"""
+        with open(config_file, "r") as f:
+            return self._inputs_key(json.load(f))
+
+    def verdict_key(self, config: dict) -> str:
+        """`job_key` without the number of simulations"""
+        sim = dict(config.get("simulation", {}))
+        sim.pop("number_of_simulations", None)
+        # derived from the number of simulations
+        sim.pop("number_of_simulations_per_step", None)
+        sim.pop("number_of_simulations_per_write", None)
+        return self._inputs_key({**config, "simulation": sim})
+
+    def _inputs_key(self, config: dict) -> str:
+        h = hashlib.sha256(config_hash(config).encode())
+        h.update(file_sha256(self.netlist_file).encode())
+        # contents of the PROLEAD binary and library, which may be rebuilt or edited in place
+        prolead_bin = shutil.which(str(self.prolead_bin)) or self.prolead_bin
+        for f in (prolead_bin, self.library_json):
+            exists = f is not None and Path(f).is_file()
+            h.update(b"\0" + (file_sha256(Path(f)) if exists else str(f)).encode())
+        for s in (self.top_module, self.library_name):
+            h.update(b"\0" + str(s).encode())
+        return h.hexdigest()
+
+    def on_netlist(self, ports: list[dict], **changes) -> "Job":
+        """A copy of this job reusing its (already synthesized) netlist and parsed ports"""
+        return dataclasses.replace(
+            self, source_files=[], netlist=self.netlist_file, ports=ports, **changes
+        )
 
-    ports_map = {p["name"]: p for p in ports}
+    def variants(self, **sweep: Sequence) -> list["Job"]:
+        """Jobs for the cartesian product of the `sweep` field values on this job's netlist, e.g.
+        `job.variants(num_simulations=[10**6, 10**7], order=[1, 2])`, each in its own run directory.
+        The variants share the random seed, so their configs are stamped from the same template."""
+        self.prepare()
+        assert self.run_dir
+        if self.needs_synthesis():
+            self.synthesize()
+        ports = self.parse_netlist()
+        seed = self.random_seed if self.random_seed is not None else random.randint(0, 2**64 - 1)
+        jobs = []
+        for values in itertools.product(*(dict.fromkeys(v) for v in sweep.values())):
+            changes = dict(zip(sweep.keys(), values))
+            name = "_".join(f"{k}={v}" for k, v in changes.items())
+            jobs.append(
+                self.on_netlist(ports, random_seed=seed, run_dir=self.run_dir / name, **changes)
+            )
+        return jobs
+
+    def prepare_prolead(self):
+        """Resolve the PROLEAD library, which synthesis alone does not need"""
+        if self.library_json is None:
+            if self.prolead_root_dir is None:
+                raise JobError("Neither --library-json nor --prolead-root-dir where specified")
+            self.library_json = self.prolead_root_dir / "library.json"
+
+        self.library_json = self.library_json.resolve()
+
+        assert self.library_json.exists(), f"Library JSON file {self.library_json} does not exist"
+
+    def prepare_run(self) -> "JobResult":
+        """Everything before running PROLEAD: synthesis, port classification and config generation.
+        The returned result includes the job key used to dedupe identical jobs."""
+        if self._prepared is not None:
+            return self._prepared[0]
+
+        self.prepare()
+        self.prepare_prolead()
+        assert self.run_dir
+
+        if self.needs_synthesis():
+            self.synthesize()
+        else:
+            print(f"** Using existing netlist: {self.netlist_file}")
 
-    jports_map = OrderedDict()
+        ports = self.parse_netlist()
 
-    if args.ports_json:
-        jports = []  # merge?
-        with open(args.ports_json, "r") as f:
-            j = json.load(f)
-            p = j.get("ports", {})
-            shares_maps = p.get("regex")
-            if isinstance(shares_maps, dict):
-                shares_maps = [(k, v) for k, v in shares_maps.items()]
-            elif shares_maps is None:
-                shares_maps = []
-            for k, v in p.get("inputs", p.get("input", {})).items():
-                v["direction"] = "input"
-                jports.append({"name": k, **v})
-            for k, v in p.get("outputs", p.get("output", {})).items():
-                v["direction"] = "output"
-                jports.append({"name": k, **v})
-        for p in jports:
-            name = p["name"]
-            width = p.get("width")
-            direction = p.get("direction")
-            name, end, start = Port.range_from_name(name)
-            if not width and start is not None:
-                width = end - start + 1
-            port_from_yosys = ports_map.get(name)
-            if port_from_yosys:
-                assert isinstance(port_from_yosys, dict), "Expected dict"
-                if not width:
-                    width = port_from_yosys.get("width")
-                if not direction:
-                    direction = port_from_yosys.get("direction")
-            elif ports:
-                print(f"** [WARNING] Port {name} not found in yosys netlist!!!")
-            if width:
-                p["width"] = int(width)
-            if direction:
-                p["direction"] = direction
-            p["name"] = name
-            jports_map[name] = p
-        if not ports:
-            ports = jports
-            ports_map = {p["name"]: p for p in ports}
-    else:
-        shares_maps = [
-            (r"^(io_)?rand.*", {"type": "random"}),
-            (r"\w+_(?P<share_id>\d+)$", {}),
-            (r"^(clk|clock)", {"type": "clock"}),
-            (r"^(rst_n|reset_n)", {"type": "reset", "value": 0}),
-            (r"^(rst|reset)", {"type": "reset", "value": 1}),
-        ]
+        gadget_results = []
+        if self.hierarchical and self.exclude_probes is None:
+            gadget_results = self.verify_gadgets()
 
-    for p_name, p in ports_map.items():
-        for regex, d in shares_maps:
-            m = re.match(regex, p_name)
-            if m:
-                p.update(**d)
-                p.update(**m.groupdict())
-                break
-        share_id = p.get("share_id")
-        if not p.get("width"):
-            name, end, start = Port.range_from_name(name)
-            p["width"] = end - start + 1 if start is not None else 1
-            p["name"] = name
+        sca_config = self.sca_config()
 
-        if share_id is None:
-            if (
-                jports_map
-                and p_name not in jports_map
-                and p.get("direction") == "input"
-                and p.get("width", 0) > 1
-            ):
-                print(
-                    f"** [WARNING] Input port {p_name} with width {p.get('width')} does not have a share_id!!!"
-                )
+        result = JobResult(
+            top_module=self.top_module,
+            run_dir=self.run_dir,
+            netlist_file=self.netlist_file,
+            gadget_results=gadget_results,
+        )
+        rng = None
+
+        if self.prolead_config:
+            print(
+                f"** Using existing config file: {self.prolead_config}. All other prolead configuration arguments are ignored!"
+            )
+            result.config_file = Path(self.prolead_config)
+            with open(result.config_file, "r") as f:
+                result.run_dir = self.config_run_dir(json.load(f))
         else:
-            p["share_id"] = int(share_id)
-
-    # print(f"** Ports Map: {ports_map}")
-    # print(f"** JSON Ports Map: {jports_map}")
-
-    for k, v in jports_map.items():
-        if k not in ports_map:
-            ports_map[k] = v
-        elif isinstance(ports_map[k], dict):
-            ports_map[k].update(v)
+            result.random_seed = (
+                self.random_seed if self.random_seed is not None else random.randint(0, 2**64 - 1)
+            )
+            print(f"Using random seed: {result.random_seed}")
+            rng = random.Random(result.random_seed)
+            if self.group_runs <= 1:
+                classified = self.classify_ports(ports)
+                result.randomness = self.randomness_report(classified)
+                result.share_deps = self.share_dependency_report(classified)
+                result.config_file = self.generate_config(classified, sca_config, rng)
+                result.run_dir = result.config_file.parent
+                if result.randomness is not None:
+                    with atomic_write(result.run_dir / "randomness.json") as f:
+                        json.dump(result.randomness.to_json(), f, indent=2)
+                if result.share_deps is not None:
+                    with atomic_write(result.run_dir / "share_deps.json") as f:
+                        json.dump(result.share_deps.to_json(), f, indent=2)
+        if result.config_file is not None:
+            result.job_key = self.job_key(result.config_file)
+
+        self._prepared = (result, sca_config, ports, rng)
+        return result
+
+    def run(self, console: Optional[Console] = None) -> "JobResult":
+        self.prepare_run()
+        assert self._prepared is not None
+        result, sca_config, ports, rng = self._prepared
+
+        if result.config_file is None:
+            assert rng is not None
+            result.sub_results = Campaign(
+                self.split_groups(ports, rng), max_workers=self.group_runs
+            ).run()
+            errors = [r.error for r in result.sub_results if r.error is not None]
+            if errors:
+                result.error = errors[0]
+            result.stats = ProleadStats.merge(
+                [r.stats for r in result.sub_results if r.stats is not None]
+            )
+            print_results(result.sub_results, "Fixed group runs")
+            return result
+
+        if self.verdict_cache:
+            result.stats = self.run_cached(result, sca_config, console)
         else:
-            print(f"** [WARNING] Port {k} already exists in ports_map!!!")
-
-    if args.library_json is None:
-        assert isinstance(prolead_root_dir, Path)
-        library_json = prolead_root_dir / "library.json"
-    else:
-        library_json = args.library_json
+            result.stats = self.run_prolead(result.config_file, sca_config, console=console)
+        if self.results_db and not result.cached:
+            self.store_result(result)
+        if self.vcd and not result.cached:
+            self.report_activity(result)
+        return result
+
+    def run_cached(
+        self, result: "JobResult", sca_config: dict, console: Optional[Console] = None
+    ) -> ProleadStats:
+        """Run PROLEAD unless the verdict cache answers the job. Otherwise all the requested
+        simulations are run (PROLEAD cannot continue a cached run), and the run replaces a cached
+        run with fewer simulations."""
+        assert self.verdict_cache and result.config_file and result.run_dir and self.top_module
+        cache = VerdictCache(self.verdict_cache, self.cache_max_age, self.cache_max_size)
+        with open(result.config_file, "r") as f:
+            config = json.load(f)
+        num_simulations = config["simulation"]["number_of_simulations"]
+        key = self.verdict_key(config)
+        cached = cache.get(key)
+        if cached is not None and cached.answers(num_simulations):
+            print(
+                f"** Using the cached verdict of {cached.n_sim:,} simulations from "
+                f"{', '.join(cached.run_dirs)}"
+            )
+            result.cached = True
+            return ProleadStats.from_cached(cached.truncated(num_simulations))
+
+        stats = self.run_prolead(result.config_file, sca_config, console=console)
+        if stats.failed or stats.terminated:
+            return stats
+        record = read_run_dir(result.run_dir, self.top_module)
+        if record is None:
+            return stats
+        entry = CachedRun(
+            key=key,
+            top=self.top_module,
+            n_sim=stats.n_sim,
+            elapsed_time=stats.elapsed_time,
+            peak_ram_gb=stats.peak_ram_gb,
+            returncode=stats.returncode,
+            curve=[list(row) for row in record.get("progress", [])],
+            leaks=[list(leak) for leak in record["leaks"]],
+            run_dirs=[str(result.run_dir.absolute())],
+            created=time.time(),
+        )
+        cache.put(entry)
+        return stats
+
+    def report_activity(self, result: "JobResult"):
+        """Switching activity of the dumped waveforms, written to `<top>_activity.json`"""
+        assert result.run_dir
+        vcd_files = sorted(result.run_dir.rglob("*.vcd"))
+        if not vcd_files:
+            print(f"** [WARNING] No VCD files found in {result.run_dir}")
+            return
+        json_netlist = self.netlist_file.with_suffix(".json")
+        weights = net_weights(json_netlist, self.top_module) if json_netlist.exists() else None
+        reports = []
+        for vcd_file in vcd_files:
+            try:
+                reports.append(VCDActivity(weights=weights).analyze(vcd_file))
+            except (OSError, ValueError) as e:
+                print(f"** [WARNING] Failed to analyze {vcd_file}: {e}")
+                continue
+            print_report(reports[-1])
+        with atomic_write(result.run_dir / f"{self.top_module}_activity.json") as f:
+            json.dump([r.to_json() for r in reports], f, indent=2)
+
+    def store_result(self, result: "JobResult"):
+        """Ingest the run into the results database. Failures only warn, the run is complete."""
+        assert self.results_db and result.run_dir
+        try:
+            record = read_run_dir(result.run_dir, self.top_module)
+            if record is None:
+                print(f"** [WARNING] No data of {result.run_dir} to store in {self.results_db}")
+                return
+            stats = result.stats
+            record.update(
+                finished=time.time(),
+                job_key=result.job_key,
+                netlist_sha256=file_sha256(self.netlist_file),
+                random_seed=result.random_seed,
+                error=str(result.error) if result.error else None,
+            )
+            if stats is not None:
+                record.update(
+                    n_sim=stats.n_sim,
+                    elapsed_time=stats.elapsed_time,
+                    sims_per_sec=stats.sims_per_sec,
+                    peak_ram_gb=stats.peak_ram_gb,
+                    max_p_log=stats.max_p_log,
+                    leakage=stats.leakage,
+                    returncode=stats.returncode,
+                )
+            ResultsDB(self.results_db).ingest(record)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print(f"** [WARNING] Failed to store the results in {self.results_db}: {e}")
 
-    library_json = library_json.resolve()
 
-    assert library_json.exists(), f"Library JSON file {library_json} does not exist"
+@dataclass
+class JobResult:
+    top_module: Optional[str] = None
+    run_dir: Optional[Path] = None
+    netlist_file: Optional[Path] = None
+    config_file: Optional[Path] = None
+    random_seed: Optional[int] = None
+    job_key: Optional[str] = None
+    randomness: Optional[RandomnessReport] = None
+    share_deps: Optional[ShareDependencyReport] = None
+    stats: Optional[ProleadStats] = None
+    error: Optional[BaseException] = None
+    # run directory of the identical job whose results were reused
+    duplicate_of: Optional[Path] = None
+    # the verdict is from the verdict cache
+    cached: bool = False
+    # results of the parallel runs of a job with `group_runs` > 1
+    sub_results: list["JobResult"] = field(default_factory=list)
+    # results of the gadget runs of a hierarchical job
+    gadget_results: list["JobResult"] = field(default_factory=list)
 
-    if args.minimize_probing_sets in (False, 0, "false", "none"):
-        args.minimize_probing_sets = "no"
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.stats is not None and not self.stats.failed
 
-    if not args.num_cores:
-        args.num_cores = "half"
+    @property
+    def leakage(self) -> Optional[bool]:
+        return self.stats.leakage if self.stats else None
+
+
+class Campaign:
+    """Runs many jobs in-process, optionally concurrently.
+    Errors of individual jobs are captured in their `JobResult.error`.
+    With `dedupe`, jobs with identical configs, netlists and PROLEAD setups are run only once."""
+
+    def __init__(self, jobs: Sequence[Job] = (), max_workers: int = 1, dedupe: bool = True):
+        self.jobs: list[Job] = list(jobs)
+        self.max_workers = max_workers
+        self.dedupe = dedupe
+
+    def add(self, job: Job) -> Job:
+        self.jobs.append(job)
+        return job
+
+    @staticmethod
+    def _catch(job: Job, f) -> JobResult:
+        try:
+            return f()
+        except Exception as e:
+            print(f"** [ERROR] Job {job.top_module or job.netlist or job.source_files} failed: {e}")
+            return JobResult(top_module=job.top_module, run_dir=job.run_dir, error=e)
+
+    def _map(self, f, jobs: Sequence[Job]) -> list[JobResult]:
+        if self.max_workers <= 1:
+            return [self._catch(job, lambda: f(job)) for job in jobs]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda job: self._catch(job, lambda: f(job)), jobs))
+
+    def run(self) -> list[JobResult]:
+        if self.max_workers > 1:
+            for job in self.jobs:
+                # only one rich Live display can be active at a time
+                job.pretty = False
+                job.show_figure = False
+
+        if not self.dedupe:
+            return self._map(Job.run, self.jobs)
+
+        results: list[Optional[JobResult]] = list(self._map(Job.prepare_run, self.jobs))
+        first_by_key: dict[str, int] = {}
+        duplicates: dict[int, int] = {}
+        to_run = []
+        for i, r in enumerate(results):
+            assert r is not None
+            if r.error is not None:
+                continue
+            if r.job_key is not None and r.job_key in first_by_key:
+                duplicates[i] = first_by_key[r.job_key]
+                continue
+            if r.job_key is not None:
+                first_by_key[r.job_key] = i
+            to_run.append(i)
+        if duplicates:
+            print(f"** Skipping {len(duplicates)} duplicate job(s)")
+        for i, r in zip(to_run, self._map(Job.run, [self.jobs[i] for i in to_run])):
+            results[i] = r
+        for i, first in duplicates.items():
+            original = results[first]
+            assert original is not None
+            results[i] = dataclasses.replace(original, duplicate_of=original.run_dir)
+        return results  # type: ignore
+
+
+def print_results(results: list[JobResult], title: str):
+    print(f"** {title}:")
+    for r in results:
+        groups = "?"
+        if r.run_dir and (r.run_dir / "groups.json").exists():
+            with open(r.run_dir / "groups.json", "r") as f:
+                groups = ", ".join(g["name"] for g in json.load(f))
+        if r.stats is None:
+            verdict = f"ERROR: {r.error}"
+        else:
+            verdict = "LEAKAGE" if r.stats.leakage else "OKAY"
+            verdict += f" (max -log10(p) = {r.stats.max_p_log:.2f})"
+        dup = f" (duplicate of {r.duplicate_of})" if r.duplicate_of else ""
+        if r.cached:
+            dup += " (cached)"
+        print(f"  {r.run_dir}: [{groups}] {verdict}{dup}")
+
+
+def parse_sweep(job: Job, sweeps: list[str]) -> dict[str, list]:
+    """Parse `FIELD=V1,V2,...` sweep arguments, converting the values to the type of the job field"""
+    fields = {f.name for f in dataclasses.fields(Job) if f.init}
+    sweep = {}
+    for s in sweeps:
+        name, sep, values = s.partition("=")
+        name = name.strip().replace("-", "_")
+        if not sep or name not in fields:
+            raise JobError(f"Invalid sweep: {s}. Expected FIELD=V1,V2,... of a job field")
+        current = getattr(job, name)
+        if isinstance(current, bool):
+            convert = lambda v: v.lower() in ("1", "true", "yes", "on")
+        elif isinstance(current, int):
+            convert = lambda v: int(Quantity(v))
+        else:
+            convert = str
+        sweep[name] = [convert(v.strip()) for v in values.split(",") if v.strip()]
+    return sweep
 
-    if args.prolead_config:
-        print(
-            f"** Using existing config file: {args.prolead_config}. All other prolead configuration arguments are ignored!"
-        )
-        config_file = Path(args.prolead_config)
-    else:
-        random_seed = (
-            args.random_seed if args.random_seed is not None else random.randint(0, 2**64 - 1)
-        )
-        print(f"Using random seed: {random_seed}")
-        random.seed(random_seed)
 
-        config_file = prolead_run_dir / "config.json"
-        ports = [Port(**p) for p in ports_map.values()]
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = argparser.parse_args(argv)
 
-        if not args.sim_cycles:
-            print(f"** Number of simulation cycles (--sim-cycles) must be specified!")
-            exit(1)
+    if args.profile or args.cprofile or args.tracemalloc:
+        profiler.enable(cprofile_file=args.cprofile, trace_memory=args.tracemalloc)
+    yosys_worker.pool_workers = args.yosys_workers
+    if args.metrics_port is not None:
+        live_metrics.serve(args.metrics_port, args.metrics_host)
+    if args.status_json:
+        live_metrics.write_status_every(args.status_json, args.status_interval)
 
-        sim_config = {
-            "number_of_simulations": num_simulations,
-            "number_of_simulations_per_step": number_of_simulations_per_step,
-            # "end_wait_cycles": 0,
-            "number_of_clock_cycles": args.sim_cycles,
-            "number_of_simulations_per_write": 1024 * number_of_simulations_per_step,
-        }
+    job = Job.from_args(args)
+    try:
+        if args.synth_only:
+            job.prepare()
+            if job.needs_synthesis():
+                job.synthesize()
+            else:
+                print(f"** Using existing netlist: {job.netlist_file}")
+            return 0
+        if args.sweep:
+            results = Campaign(
+                job.variants(**parse_sweep(job, args.sweep)), max_workers=args.max_workers
+            ).run()
+            print_results(results, "Sweep runs")
+            result = JobResult(
+                top_module=job.top_module,
+                run_dir=job.run_dir,
+                stats=ProleadStats.merge([r.stats for r in results if r.stats is not None]),
+                error=next((r.error for r in results if r.error is not None), None),
+                sub_results=results,
+            )
+        else:
+            result = job.run()
+    except JobError as e:
+        print(e)
+        return 1
+    finally:
+        live_metrics.stop()
 
-        perf_config = {
-            # "max_number_of_threads": "half",  ### half of the available cores
-            "max_number_of_threads": args.num_cores,
-            # "minimize_probing_sets": "aggressive", # "trivial" ,"aggressive", "no"
-            "minimize_probing_sets": args.minimize_probing_sets,
-            "compact_distributions": args.compact,
-        }
+    run_dir = result.run_dir or job.run_dir
+    assert run_dir
+    profiler.write_report(run_dir / f"{job.top_module}_profile.json")
 
-        if args.probing_sets_per_step:
-            perf_config["number_of_probing_sets_per_step"] = int(args.probing_sets_per_step)
+    return 0 if result.ok else 1
 
-        generate_config(config_file, ports, sca_config, sim_config, perf_config)
 
-    run_prolead(
-        args.prolead_bin,
-        prolead_run_dir,
-        netlist_file,
-        args.top_module,
-        library_name=args.library_name,
-        library_json=library_json,
-        sca_config=sca_config,
-        config_file=config_file,
-        show_figure=args.show_figure,
-        result_folder="results",
-        pretty=args.pretty,
-    )
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from netlist_graph import NetlistGraph
+
+# Static first-order screening of a masked netlist: the support of every net, i.e. the input shares
+# and random bits it depends on, is propagated as packed bitsets through the combinational logic
+# (glitch-extended) and across registers (transitions) until a fixpoint. A cell or register whose
+# support covers all shares of a secret bit without any fresh random bit combines the shares: it
+# leaks, e.g. after the optimizer merged the share domains. With fresh randomness in the support the
+# cell may be correctly remasked and is only counted. Secret bit `k` is bit `k` of the concatenated
+# inputs of each share id, as grouped in the PROLEAD config (`group_in<share_id>[k]`).
+
+WORD_BITS = 64
+MAX_ITERATIONS = 1000
+
+
+@dataclass
+class ShareLeak:
+    cell: str
+    type: str
+    net: str
+    register: bool
+    secrets: list[str]
+
+
+@dataclass
+class ShareDependencyReport:
+    top: str
+    num_shares: int = 0
+    secret_bits: int = 0
+    random_bits: int = 0
+    cells: int = 0
+    iterations: int = 0
+    # cells covering all shares of a secret without fresh randomness
+    leaks: list[ShareLeak] = field(default_factory=list)
+    # cells covering all shares of a secret with fresh randomness in their support
+    remasked: int = 0
+
+    def to_json(self) -> dict:
+        return asdict(self)
+
+    def print(self, max_leaks: int = 20):
+        if self.num_shares < 2:
+            print(f"** Share dependencies of {self.top}: no shared inputs")
+            return
+        print(
+            f"** Share dependencies of {self.top}: {self.secret_bits} secret bits with "
+            f"{self.num_shares} shares, {self.random_bits} random bits, {self.cells} cells "
+            f"({self.iterations} iterations)"
+        )
+        if self.remasked:
+            print(f"  cells combining all shares of a secret, remasked: {self.remasked}")
+        if self.leaks:
+            print(
+                f"** [WARNING] {len(self.leaks)} cells combine all shares of a secret without "
+                "fresh randomness:"
+            )
+            for leak in self.leaks[:max_leaks]:
+                kind = "register" if leak.register else leak.type
+                secrets = ", ".join(leak.secrets[:4]) + (", ..." if len(leak.secrets) > 4 else "")
+                print(f"  {leak.cell} ({kind}) -> {leak.net}: {secrets}")
+            if len(self.leaks) > max_leaks:
+                print(f"  ... and {len(self.leaks) - max_leaks} more")
+
+
+def _levels(graph: NetlistGraph, cells: list[str]) -> list[list[str]]:
+    """Combinational `cells` in topological levels. Cells on combinational loops form the last
+    level; the fixpoint iteration propagates through them."""
+    comb = set(cells)
+    drivers = {b: c for b, c in graph.drivers.items() if c in comb}
+    deps = {c: {drivers[b] for b in graph.cell_inputs[c] if b in drivers} for c in cells}
+    readers: dict[str, list[str]] = {}
+    for c, ds in deps.items():
+        for d in ds:
+            readers.setdefault(d, []).append(c)
+    pending = {c: len(ds) for c, ds in deps.items()}
+    level = [c for c, n in pending.items() if n == 0]
+    levels = []
+    done = 0
+    while level:
+        levels.append(level)
+        done += len(level)
+        nxt = []
+        for c in level:
+            for r in readers.get(c, []):
+                pending[r] -= 1
+                if pending[r] == 0:
+                    nxt.append(r)
+        level = nxt
+    if done < len(cells):
+        levels.append([c for c, n in pending.items() if n > 0])
+    return levels
+
+
+def share_dependency_report(netlist: dict, top: str, ports: list) -> ShareDependencyReport:
+    """`ports` are the classified ports (`run_prolead.Port`)"""
+    graph = NetlistGraph(netlist, top)
+    report = ShareDependencyReport(top=top)
+
+    # secret and random bit of each input bit
+    shares: dict[int, list[int]] = {}
+    secret_names: list[str] = []
+    random_bits: list[int] = []
+    for p in ports:
+        if not p.is_input:
+            continue
+        bits = graph.port_bits(p.name, p.start_bit, p.width)
+        if p.share_id is not None:
+            shares.setdefault(p.share_id, []).extend(bits)
+            if p.share_id == 0:
+                name = p.name.removesuffix("0").removesuffix("_")
+                start = p.start_bit or 0
+                secret_names += [
+                    f"{name}[{start + i}]" if p.num_bits > 1 or p.start_bit else name
+                    for i in range(len(bits))
+                ]
+        elif p.type == "random":
+            random_bits.extend(bits)
+    report.num_shares = len(shares)
+    report.secret_bits = len(secret_names)
+    report.random_bits = len(random_bits)
+    if sorted(shares) != list(range(report.num_shares)):
+        print(f"** [WARNING] Share ids of {top} are not contiguous: {sorted(shares)}")
+        return report
+    if report.num_shares < 2 or not report.secret_bits:
+        return report
+
+    secret_words = -(-report.secret_bits // WORD_BITS)
+    random_words = -(-len(random_bits) // WORD_BITS)
+    words = report.num_shares * secret_words + random_words
+    rows: dict[int, int] = {}
+
+    def row(b: int) -> int:
+        return rows.setdefault(b, len(rows))
+
+    sources: list[tuple[int, int]] = []
+    for share_id, bits in shares.items():
+        for k, b in enumerate(bits[: report.secret_bits]):
+            if isinstance(b, int):
+                sources.append((row(b), share_id * secret_words * WORD_BITS + k))
+    offset = report.num_shares * secret_words * WORD_BITS
+    for k, b in enumerate(random_bits):
+        if isinstance(b, int):
+            sources.append((row(b), offset + k))
+
+    ffs = {c for c in graph.cells if graph.is_ff(c)}
+    registers = [c for c in graph.cells if c in ffs]
+    comb_cells = [c for c in graph.cells if c not in ffs]
+    report.cells = len(graph.cells)
+
+    # (input rows, reduceat offsets, output rows, output cell index) per level, registers last
+    def plan(cells: list[str]) -> Optional[tuple]:
+        cells = [c for c in cells if graph.cell_inputs[c] and graph.cell_outputs[c]]
+        if not cells:
+            return None
+        inputs = [row(b) for c in cells for b in graph.cell_inputs[c]]
+        offsets = np.cumsum([0] + [len(graph.cell_inputs[c]) for c in cells[:-1]])
+        outputs = [(row(b), i) for i, c in enumerate(cells) for b in graph.cell_outputs[c]]
+        return (
+            np.array(inputs),
+            offsets,
+            np.array([o for o, _ in outputs]),
+            np.array([i for _, i in outputs]),
+        )
+
+    steps = [s for s in map(plan, _levels(graph, comb_cells)) if s is not None]
+    register_step = plan(registers)
+
+    support = np.zeros((len(rows), words), dtype=np.uint64)
+    for r, k in sources:
+        support[r, k // WORD_BITS] |= np.uint64(1 << (k % WORD_BITS))
+
+    def propagate(step: tuple) -> bool:
+        inputs, offsets, outputs, cell_index = step
+        merged = np.bitwise_or.reduceat(support[inputs], offsets, axis=0)[cell_index]
+        new = support[outputs] | merged
+        changed = bool((new != support[outputs]).any())
+        support[outputs] = new
+        return changed
+
+    changed = True
+    while changed and report.iterations < MAX_ITERATIONS:
+        report.iterations += 1
+        changed = False
+        for step in steps:
+            changed |= propagate(step)
+        if register_step is not None:
+            changed |= propagate(register_step)
+
+    # all shares of a secret bit: AND over the share blocks
+    blocks = support[:, : report.num_shares * secret_words].reshape(
+        len(rows), report.num_shares, secret_words
+    )
+    covered = np.bitwise_and.reduce(blocks, axis=1)
+    randomized = support[:, report.num_shares * secret_words :].any(axis=1)
+    combining = covered.any(axis=1)
+
+    net_names = {}
+    for name, net in netlist["modules"][top].get("netnames", {}).items():
+        for i, b in enumerate(net["bits"]):
+            # prefer user names over the $-prefixed names of Yosys
+            if isinstance(b, int) and (b not in net_names or not name.startswith("$")):
+                net_names[b] = f"{name}[{i}]" if len(net["bits"]) > 1 else name
+    for cell, c in graph.cells.items():
+        out_rows = [(b, rows[b]) for b in graph.cell_outputs[cell] if b in rows]
+        hits = [(b, r) for b, r in out_rows if combining[r]]
+        if not hits:
+            continue
+        if any(not randomized[r] for _, r in hits):
+            b, r = next((b, r) for b, r in hits if not randomized[r])
+            bits = np.unpackbits(covered[r].view(np.uint8), bitorder="little")
+            report.leaks.append(
+                ShareLeak(
+                    cell=cell,
+                    type=c["type"],
+                    net=net_names.get(b, str(b)),
+                    register=cell in ffs,
+                    secrets=[secret_names[k] for k in np.flatnonzero(bits[: report.secret_bits])],
+                )
+            )
+        else:
+            report.remasked += 1
+    return report
+
+
+if __name__ == "__main__":
+    from run_prolead import Port, classify_ports, get_top_module_and_ports
+
+    argparser = argparse.ArgumentParser(
+        description="Static share-dependency screening of a Yosys JSON netlist"
+    )
+    argparser.add_argument("netlist", type=Path, help="Yosys JSON netlist")
+    argparser.add_argument("--ports-json", type=Path, default=None, help="Port information json")
+    argparser.add_argument("-o", "--output", type=Path, default=None, help="Write report to JSON")
+    args = argparser.parse_args()
+
+    with open(args.netlist, "r") as f:
+        netlist = json.load(f)
+    top, ports = get_top_module_and_ports(netlist)
+    assert top, "Top module not found in the netlist"
+    classified = [Port(**p) for p in classify_ports(ports, args.ports_json)]
+    report = share_dependency_report(netlist, top, classified)
+    report.print()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report.to_json(), f, indent=2)
+    sys.exit(1 if report.leaks else 0)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import re
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from rich.console import Console
+from rich.table import Table
+
+# Generate and run Yosys synthesis flows for the adder architectures at any width, and collect their
+# area (cell counts) and logic depth. The flows are those of the former per-adder TCL scripts; all
+# architectures are synthesized with the same flow (`--flow`). The scripts can be written with
+# `--emit-tcl`.
+
+console = Console()
+
+ADDER_TOPS = {
+    "ksa": "KSAdder{width}",
+    "bka": "BKAdder{width}",
+    "ska": "SKAdder{width}",
+    "lfa": "LFAdder{width}",
+    "rca": "RCAdder{width}",
+}
+
+# optimization passes run after `prep`
+FLOWS = {
+    "fast": [
+        "opt -fast -full",
+        "techmap",
+        "opt -fast",
+        "opt -full -purge -sat",
+        "opt_clean -purge",
+        "clean -purge",
+    ],
+    "memory": [
+        "opt -fast -full",
+        "memory_map",
+        "opt -full",
+        "techmap",
+        "opt -full -purge -sat",
+        "opt -fast",
+        "opt_clean -purge",
+        "clean -purge",
+    ],
+    "full": [
+        "hierarchy -check",
+        "flatten",
+        "opt_expr",
+        "opt_clean",
+        "opt -nodffe -nosdff",
+        "fsm",
+        "opt",
+        "opt -full -purge -sat",
+        "wreduce",
+        "peepopt",
+        "opt_clean",
+        "alumacc",
+        "share",
+        "opt",
+        "opt_clean",
+        "opt -fast -full",
+        "memory_map",
+        "techmap",
+        "opt -fast",
+        "opt -full -purge -sat",
+        "opt -fast",
+        "opt -full -purge -sat",
+        "opt -full -purge -sat",
+        "setundef -zero",
+        "opt_clean -purge",
+        "opt -full",
+        "clean -purge",
+    ],
+}
+
+LTP_REGEX = re.compile(r"Longest topological path in \S+ \(length=(\d+)\)")
+
+argparser = argparse.ArgumentParser(description="Synthesize adders and collect area/depth")
+argparser.add_argument(
+    "-a", "--archs", nargs="+", default=list(ADDER_TOPS), choices=list(ADDER_TOPS), help="Adders"
+)
+argparser.add_argument("-w", "--widths", nargs="+", type=int, default=[8, 12], help="Adder widths")
+argparser.add_argument(
+    "--flow",
+    choices=list(FLOWS),
+    default="fast",
+    help="Optimization flow, the same for all architectures so their results are comparable",
+)
+argparser.add_argument(
+    "--rtl-dir", type=Path, default=Path("gen_rtl"), help="Chisel generated RTL directory"
+)
+argparser.add_argument("--run-dir", type=Path, default=Path("synth_run"), help="Run directory")
+argparser.add_argument("--yosys-bin", help="Path to yosys binary", default="yosys")
+argparser.add_argument(
+    "--with-asserts", action="store_true", help="Also read the `*_assert.sv` files"
+)
+argparser.add_argument(
+    "--show", action="store_true", help="Also render the netlist with the AND gates highlighted"
+)
+argparser.add_argument(
+    "-j", "--jobs", type=int, default=os.cpu_count(), help="Number of parallel Yosys runs"
+)
+argparser.add_argument(
+    "--emit-tcl", action="store_true", help="Only write the TCL scripts, don't run Yosys"
+)
+argparser.add_argument(
+    "--results", type=Path, default=None, help="Write the results to this JSON file"
+)
+
+
+def find_sources(rtl_dir: Path, top: str, with_asserts: bool = False) -> list[Path]:
+    """Chisel outputs are in `<rtl_dir>/<package>.<Class>/<top>.sv`; assertion files are skipped
+    unless `with_asserts`"""
+    sources = sorted(rtl_dir.glob(f"*/{top}.sv")) + sorted(rtl_dir.glob(f"*/{top}.v"))
+    if with_asserts:
+        sources = sorted(rtl_dir.glob(f"*/{top}_assert.sv")) + sources
+    return sources
+
+
+@dataclass
+class SynthResult:
+    arch: str
+    width: int
+    top: str
+    flow: str
+    run_dir: Path
+    cells: dict[str, int] = field(default_factory=dict)
+    depth: Optional[int] = None
+    time: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def num_cells(self) -> int:
+        return sum(self.cells.values())
+
+    def count(self, cell_regex: str) -> int:
+        return sum(n for t, n in self.cells.items() if re.search(cell_regex, t))
+
+
+def flow_script(sources: list[Path], top: str, flow: str, run_dir: Path, show: bool = False) -> str:
+    lines = [
+        "yosys logger -notime -stderr",
+        "yosys -import",
+        *(f"yosys read_verilog -defer -noautowire -sv  {s}" for s in sources),
+        f"yosys hierarchy -check  -top {top}",
+        "",
+        "prep",
+        "",
+        *FLOWS[flow],
+        "",
+        "check",
+        "stat",
+        f"tee -q -o {run_dir / 'ltp.txt'} ltp -noff",
+        f"write_json {run_dir / 'netlist.json'}",
+    ]
+    if show:
+        lines.append(
+            f"show -href -color orange t:*AND* -stretch -viewer none -prefix {run_dir / top}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def run_flow(yosys_bin: str, result: SynthResult, script: str) -> SynthResult:
+    # imported here so that the TCL scripts can be generated without the PROLEAD dependencies
+    from run_prolead import get_cell_counts
+
+    run_dir = result.run_dir
+    script_file = run_dir / "synth.tcl"
+    with open(script_file, "w") as f:
+        f.write(script)
+    t0 = time.perf_counter()
+    with open(run_dir / "yosys.log", "w") as log:
+        proc = subprocess.run([yosys_bin, "-c", script_file], stdout=log, stderr=subprocess.STDOUT)
+    result.time = time.perf_counter() - t0
+    if proc.returncode != 0:
+        result.error = f"yosys failed with exit code {proc.returncode}, see {run_dir / 'yosys.log'}"
+        return result
+    try:
+        with open(run_dir / "netlist.json", "r") as f:
+            result.cells = get_cell_counts(json.load(f), result.top)
+        with open(run_dir / "ltp.txt", "r") as f:
+            m = LTP_REGEX.search(f.read())
+            if m:
+                result.depth = int(m.group(1))
+    except (OSError, ValueError, AssertionError) as e:
+        result.error = f"failed to read the synthesis results: {e}"
+    return result
+
+
+def print_results(results: list[SynthResult]):
+    table = Table(title="Synthesis Results")
+    for col in ("Design", "Flow", "Cells", "AND", "XOR", "Depth", "Time (s)"):
+        table.add_column(col, justify="left" if col in ("Design", "Flow") else "right")
+    for r in sorted(results, key=lambda r: (r.arch, r.width)):
+        if r.error:
+            table.add_row(r.top, r.flow, f"[red]{r.error}[/red]", "", "", "", "")
+            continue
+        table.add_row(
+            r.top,
+            r.flow,
+            str(r.num_cells),
+            str(r.count(r"AND")),
+            str(r.count(r"XOR|XNOR")),
+            "-" if r.depth is None else str(r.depth),
+            "-" if r.time is None else f"{r.time:.2f}",
+        )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    args = argparser.parse_args()
+
+    jobs = []
+    for arch in args.archs:
+        for width in args.widths:
+            top = ADDER_TOPS[arch].format(width=width)
+            sources = [s.absolute() for s in find_sources(args.rtl_dir, top, args.with_asserts)]
+            if not sources:
+                print(f"** [WARNING] No sources found for {top} in {args.rtl_dir}, skipping")
+                continue
+            run_dir = (args.run_dir / top).absolute()
+            run_dir.mkdir(parents=True, exist_ok=True)
+            result = SynthResult(arch=arch, width=width, top=top, flow=args.flow, run_dir=run_dir)
+            jobs.append((result, flow_script(sources, top, args.flow, run_dir, args.show)))
+
+    if args.emit_tcl:
+        for result, script in jobs:
+            script_file = result.run_dir / "synth.tcl"
+            with open(script_file, "w") as f:
+                f.write(script)
+            print(f"** Wrote {script_file}")
+        exit(0)
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        results = list(executor.map(lambda j: run_flow(args.yosys_bin, *j), jobs))
+
+    print_results(results)
+
+    if args.results:
+        args.results.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.results, "w") as f:
+            json.dump(
+                [
+                    {**asdict(r), "run_dir": str(r.run_dir), "num_cells": r.num_cells}
+                    for r in results
+                ],
+                f,
+                indent=2,
+            )
+        print(f"** Results written to {args.results}")
+
+    if any(r.error for r in results):
+        exit(1)
@@ -0,0 +1,48 @@
+import io
+
+from inline_bind import BindInliner, make_inject
+
+INSTANCE = "Checker check (.a(a));"
+
+
+def inline(source: str, instances=None) -> tuple[str, BindInliner]:
+    inliner = BindInliner(instances or {"Foo": [INSTANCE]})
+    out = io.StringIO()
+    inliner.process(io.StringIO(source), out)
+    return out.getvalue(), inliner
+
+
+def test_inlines_before_endmodule():
+    source = "module Foo(input a);\nendmodule\nmodule Bar(input a);\nendmodule\n"
+    out, inliner = inline(source)
+    inject = make_inject([INSTANCE])
+    assert out == f"module Foo(input a);\n\n{inject}\nendmodule\nmodule Bar(input a);\nendmodule\n"
+    assert inliner.inlined == {"Foo": 1}
+    assert inliner.missing() == []
+
+
+def test_ignores_comments_and_strings():
+    source = (
+        "module Foo(input a);\n"
+        '  initial $display("endmodule");\n'
+        "  // endmodule\n"
+        "  /* endmodule\n"
+        "     endmodule */\n"
+        "endmodule\n"
+    )
+    out, inliner = inline(source)
+    assert out.count("Checker check") == 1
+    assert out.index("Checker check") > out.index("*/")
+    assert inliner.inlined == {"Foo": 1}
+
+
+def test_module_name_on_next_line():
+    out, inliner = inline("module\n  Foo(input a); endmodule\n")
+    assert out.count("Checker check") == 1
+    assert inliner.inlined == {"Foo": 1}
+
+
+def test_missing_module():
+    out, inliner = inline("module Bar(input a);\nendmodule\n")
+    assert "Checker" not in out
+    assert inliner.missing() == ["Foo"]
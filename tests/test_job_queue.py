@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+
+import pytest
+
+from job_queue import JobQueue, Worker, node_cores, run_prolead_cores
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(tmp_path / "queue")
+
+
+def expire(queue, job_id, age=3600.0):
+    t = time.time() - age
+    os.utime(queue.path("claimed", job_id), (t, t))
+
+
+def finish_running(worker):
+    for r in list(worker.running.values()):
+        r.proc.wait()
+    worker.check_running()
+
+
+def test_claim_once(queue):
+    job = queue.submit(["true"])
+    assert queue.claim(job, "w1:1")
+    assert not queue.claim(job, "w2:1")
+    assert queue.owns(job.id, "w1:1") and not queue.owns(job.id, "w2:1")
+    assert queue.heartbeat(job.id, "w1:1")
+    assert not queue.heartbeat(job.id, "w2:1")
+    assert queue.attempts(job.id) == 1
+
+
+def test_expired_lease_is_requeued(queue):
+    job = queue.submit(["true"])
+    queue.claim(job, "w1:1")
+    assert queue.requeue_expired(lease=60.0) == []
+    expire(queue, job.id)
+    assert queue.requeue_expired(lease=60.0) == [job.id]
+    assert queue.path("pending", job.id).exists()
+    # the dead worker's claim counts as an attempt
+    assert queue.attempts(job.id) == 1
+    assert queue.claim(job, "w2:1")
+    assert not queue.heartbeat(job.id, "w1:1")
+    assert queue.attempts(job.id) == 2
+
+
+def test_released_claims_are_not_attempts(queue):
+    job = queue.submit(["true"])
+    queue.claim(job, "w1:1")
+    assert queue.release(job.id, "w1:1")
+    assert queue.attempts(job.id) == 0
+    assert not queue.release(job.id, "w1:1")
+
+
+def test_max_attempts(queue):
+    job = queue.submit(["true"], max_attempts=1)
+    queue.claim(job, "dead:1")
+    expire(queue, job.id)
+    queue.requeue_expired(lease=60.0)
+    worker = Worker(queue, cores=2, memory_gb=2.0)
+    worker.claim_jobs()
+    assert not worker.running
+    assert queue.path("failed", job.id).exists()
+    # retried with a fresh number of attempts
+    assert queue.retry(job.id)
+    assert queue.attempts(job.id) == 0
+
+
+def test_dependencies(queue, tmp_path):
+    first = queue.submit(["true"], cwd=tmp_path)
+    second = queue.submit(["true"], cwd=tmp_path, after=[first.id])
+    worker = Worker(queue, cores=2, memory_gb=2.0)
+    worker.claim_jobs()
+    assert list(worker.running) == [first.id]
+    finish_running(worker)
+    worker.claim_jobs()
+    assert list(worker.running) == [second.id]
+    finish_running(worker)
+    assert queue.path("done", first.id).exists() and queue.path("done", second.id).exists()
+
+
+def test_failed_dependency(queue, tmp_path):
+    first = queue.submit(["false"], cwd=tmp_path)
+    second = queue.submit(["true"], cwd=tmp_path, after=[first.id])
+    worker = Worker(queue, cores=2, memory_gb=2.0)
+    worker.claim_jobs()
+    finish_running(worker)
+    assert queue.path("failed", first.id).exists()
+    worker.claim_jobs()
+    assert not worker.running
+    assert queue.path("failed", second.id).exists()
+
+
+def test_unknown_dependency(queue):
+    with pytest.raises(ValueError):
+        queue.submit(["true"], after=["unknown"])
+
+
+def test_jobs_larger_than_the_node(queue, tmp_path):
+    large = queue.submit(["true"], cwd=tmp_path, cores=64)
+    after_large = queue.submit(["true"], cwd=tmp_path, after=[large.id])
+    worker = Worker(queue, cores=2, memory_gb=2.0, poll=0.01, exit_when_empty=True)
+    assert not worker.fits(large) and worker.fits(after_large)
+    assert worker.runnable(queue.jobs("pending")) == set()
+    # exits instead of waiting for the jobs, which are left to other workers
+    timer = threading.Timer(10.0, worker.stop.set)
+    timer.start()
+    worker.run()
+    timer.cancel()
+    assert not worker.stop.is_set()
+    assert worker.too_large == {large.id}
+    assert {j.id for j in queue.jobs("pending")} == {large.id, after_large.id}
+
+
+def test_run_prolead_cores():
+    assert run_prolead_cores(["sleep", "1"]) == 1
+    assert run_prolead_cores(["./run_prolead.py", "-t", "X"]) == "half"
+    assert run_prolead_cores(["python", "run_prolead.py", "--num-cores", "8"]) == 8
+    assert run_prolead_cores(["run_prolead.py", "--num-cores=all"]) == "all"
+    assert run_prolead_cores(["run_prolead.py", "--synth-only"]) == 1
+    sweep = ["run_prolead.py", "--sweep", "order=1,2", "--max-workers", "3"]
+    assert run_prolead_cores(sweep + ["--num-cores", "4"]) == 12
+    with pytest.raises(ValueError):
+        run_prolead_cores(sweep)
+    assert node_cores("all") == os.cpu_count()
+    assert node_cores("half") == max(1, os.cpu_count() // 2)
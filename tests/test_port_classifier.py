@@ -0,0 +1,108 @@
+import re
+
+import pytest
+
+from run_prolead import DEFAULT_SHARES_MAPS, PortClassifier
+
+
+def first_match(rules, name):
+    """Reference: the rules matched one by one"""
+    for regex, attrs in rules:
+        m = re.match(regex, name)
+        if m:
+            return {**attrs, **m.groupdict()}
+    return None
+
+
+def test_rules_are_combined():
+    c = PortClassifier(DEFAULT_SHARES_MAPS)
+    assert c.combined is not None
+    assert c.separate == []
+
+
+def test_first_matching_rule_wins():
+    c = PortClassifier(
+        [
+            (r"^(io_)?rand.*", {"type": "random"}),
+            (r"\w+_(?P<share_id>\d+)$", {}),
+            (r"io_a.*", {"type": "a"}),
+        ]
+    )
+    assert c.match("io_rand_0") == {"type": "random"}
+    assert c.match("io_a_1") == {"share_id": "1"}
+    assert c.match("io_a") == {"type": "a"}
+    assert c.match("clock") is None
+
+
+def test_same_group_name_in_several_rules():
+    rules = [(r"a_(?P<share_id>\d+)$", {"type": "a"}), (r"\w+_(?P<share_id>\d+)$", {})]
+    c = PortClassifier(rules)
+    assert c.separate == []
+    assert c.match("a_1") == {"type": "a", "share_id": "1"}
+    assert c.match("b_2") == {"share_id": "2"}
+
+
+@pytest.mark.parametrize(
+    "regex",
+    [
+        r"(x)\1",
+        r"(?P<v>x)(?P=v)",
+        r"(x)?(?(1)y|z)",
+        r"(a)(b)(c)(d)(e)(f)(g)(h)(i)(j)\10",
+    ],
+)
+def test_group_references_are_matched_separately(regex):
+    rules = [(r"q.*", {"rule": 0}), (regex, {"rule": 1}), (r"[a-z]+", {"rule": 2})]
+    c = PortClassifier(rules)
+    assert c.separate == [1]
+    for name in ["xx", "xy", "z", "abcdefghijj", "abcdefghijk", "q", "x", "7"]:
+        assert c.match(name) == first_match(rules, name), name
+
+
+def test_inline_global_flags_are_matched_separately():
+    rules = [(r"clk", {"type": "clock"}), (r"(?i)RST", {"type": "reset"})]
+    c = PortClassifier(rules)
+    assert c.separate == [1]
+    assert c.match("rst") == {"type": "reset"}
+    assert c.match("clk") == {"type": "clock"}
+
+
+def test_classify_default_rules():
+    ports = [
+        {"name": "io_a_0", "direction": "input", "width": 4},
+        {"name": "io_a_1", "direction": "input", "width": 4},
+        {"name": "io_rand", "direction": "input", "width": 2},
+        {"name": "clock", "direction": "input", "width": 1},
+        {"name": "reset", "direction": "input", "width": 1},
+    ]
+    classified = {p["name"]: p for p in PortClassifier(DEFAULT_SHARES_MAPS).classify(ports)}
+    assert classified["io_a_0"]["share_id"] == 0
+    assert classified["io_a_1"]["share_id"] == 1
+    assert classified["io_rand"]["type"] == "random"
+    assert classified["clock"]["type"] == "clock"
+    assert classified["reset"]["type"] == "reset" and classified["reset"]["value"] == 1
+
+
+def shares(*ports):
+    return [{"name": n, "direction": "input", "width": w, "share_id": s} for n, s, w in ports]
+
+
+def test_validate_consistent_shares():
+    ports = shares(("a_0", 0, 4), ("a_1", 1, 4), ("b_0", 0, 2), ("b_1", 1, 2))
+    assert PortClassifier.validate(ports) == []
+
+
+@pytest.mark.parametrize(
+    "ports, issue",
+    [
+        (shares(("a_0", 0, 4), ("a_2", 2, 4)), "not contiguous"),
+        (shares(("a_0", 0, 4), ("a_1", 1, 3)), "different widths"),
+        (shares(("a_0", 0, 4), ("a_0", 0, 4), ("a_1", 1, 4)), "Duplicate share"),
+        (
+            shares(("a_0", 0, 1), ("a_1", 1, 1), ("b_0", 0, 1), ("b_1", 1, 1), ("b_2", 2, 1)),
+            "different numbers of shares",
+        ),
+    ],
+)
+def test_validate_issues(ports, issue):
+    assert any(issue in i for i in PortClassifier.validate(ports))
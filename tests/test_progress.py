@@ -0,0 +1,102 @@
+import csv
+import math
+
+import pytest
+
+from run_prolead import LeakageAggregator, Port, ThroughputEstimator, plan_fixed_groups
+
+
+def test_leakage_aggregator():
+    agg = LeakageAggregator()
+    agg.add(["a[1](3)", "b(2)"], 1000, 5.0)
+    agg.add(["a[1](3)"], 2000, 7.5)
+    agg.add(["a[1](3)"], 3000, 6.0)
+    agg.add(["no cycle"], 3000, 9.0)
+    assert len(agg) == 2
+    leak = agg.signals[(3, "a[1]")]
+    assert (leak.first_n_sim, leak.max_p_log, leak.hits) == (1000, 7.5, 3)
+    assert agg.unmatched == {"no cycle"}
+    assert agg.leaking_signals() == [(2, "b", 5.0), (3, "a[1]", 7.5)]
+    assert agg.top(1) == [(3, "a[1]", leak)]
+
+
+def test_leakage_aggregator_csv(tmp_path):
+    agg = LeakageAggregator()
+    agg.write_csv(tmp_path / "empty.csv")
+    with open(tmp_path / "empty.csv") as f:
+        assert list(csv.DictReader(f)) == []
+    agg.add(["b(2)"], 1000, 5.0)
+    agg.write_csv(tmp_path / "leaks.csv")
+    with open(tmp_path / "leaks.csv") as f:
+        (row,) = csv.DictReader(f)
+    assert row == {
+        "Cycle": "2",
+        "Signal": "b",
+        "Log(p)": "5.0",
+        "First Simulation": "1000",
+        "Hits": "1",
+    }
+
+
+def test_throughput_estimator():
+    est = ThroughputEstimator(target_sims=10_000, time_constant=30.0)
+    assert est.eta is None
+    est.update(10.0, 1000, 1.0)
+    assert est.sims_per_sec == pytest.approx(100.0)
+    est.update(20.0, 2000, 2.0)
+    assert est.sims_per_sec == pytest.approx(100.0)
+    assert est.ram_per_sim == pytest.approx(0.001)
+    assert est.eta == pytest.approx(80.0)
+    assert est.projected_peak_ram_gb == pytest.approx(10.0)
+    # repeated lines are ignored
+    est.update(20.0, 2000, 2.0)
+    assert est.sims_per_sec == pytest.approx(100.0)
+    # the rate follows a slowdown, weighted by the interval
+    est.update(30.0, 2500, 2.0)
+    alpha = 1 - math.exp(-10.0 / 30.0)
+    assert est.sims_per_sec == pytest.approx(100.0 + alpha * (50.0 - 100.0))
+
+
+def test_throughput_estimator_peak_ram():
+    est = ThroughputEstimator(target_sims=1000)
+    est.update(1.0, 100, 4.0)
+    est.update(2.0, 200, 1.0)
+    # memory shrinking doesn't project below the peak
+    assert est.projected_peak_ram_gb == pytest.approx(4.0)
+    est.update(3.0, 1000, 1.0)
+    assert est.remaining_sims == 0 and est.eta == 0
+
+
+def adder_ports(width=4):
+    return [
+        Port("a_0", width=width, share_id=0),
+        Port("b_0", width=width, share_id=0),
+        Port("a_1", width=width, share_id=1),
+        Port("b_1", width=width, share_id=1),
+        Port("clock", type="clock"),
+    ]
+
+
+def test_plan_fixed_groups():
+    groups = dict(plan_fixed_groups(adder_ports(), "zero,ones,alternating,propagate,carry_chain"))
+    assert groups["zero"] == 0
+    assert groups["ones"] == 0xFF
+    assert groups["alternating01"] == 0x55 and groups["alternating10"] == 0xAA
+    # a = 0, b = ~0
+    assert groups["propagate"] == 0xF0
+    # a = ~0, b = 1
+    assert groups["carry_chain"] == 0x1F
+
+
+def test_plan_fixed_groups_dedupes_and_literals():
+    groups = dict(plan_fixed_groups(adder_ports(), "corners,0x1ff,0x3"))
+    assert len(set(groups.values())) == len(groups)
+    # `generate` (a = b = ~0) and the literal masked to the group width are `ones`
+    assert "generate" not in groups and "0x1ff" not in groups
+    assert groups["ones"] == 0xFF and groups["0x3"] == 0x3
+    assert set(groups) >= {"zero", "alternating01", "propagate", "propagate_alternating"}
+
+
+def test_plan_fixed_groups_invalid():
+    with pytest.raises(ValueError):
+        plan_fixed_groups(adder_ports(), "nonsense")
@@ -0,0 +1,66 @@
+from run_prolead import Port
+from share_deps import share_dependency_report
+
+
+def xor(a, b, y):
+    return {
+        "type": "$_XOR_",
+        "port_directions": {"A": "input", "B": "input", "Y": "output"},
+        "connections": {"A": [a], "B": [b], "Y": [y]},
+    }
+
+
+def dff(d, q):
+    return {
+        "type": "$_DFF_P_",
+        "port_directions": {"C": "input", "D": "input", "Q": "output"},
+        "connections": {"C": [1], "D": [d], "Q": [q]},
+    }
+
+
+def netlist(cells):
+    ports = {
+        "clock": {"direction": "input", "bits": [1]},
+        "a_0": {"direction": "input", "bits": [2]},
+        "a_1": {"direction": "input", "bits": [3]},
+        "r": {"direction": "input", "bits": [4]},
+        "y": {"direction": "output", "bits": [9]},
+    }
+    netnames = {name: {"bits": p["bits"]} for name, p in ports.items()}
+    return {"modules": {"top": {"ports": ports, "cells": cells, "netnames": netnames}}}
+
+
+PORTS = [
+    Port("clock", type="clock"),
+    Port("a_0", share_id=0),
+    Port("a_1", share_id=1),
+    Port("r", type="random"),
+    Port("y", direction="output"),
+]
+
+
+def test_combined_shares_leak():
+    report = share_dependency_report(netlist({"x": xor(2, 3, 9)}), "top", PORTS)
+    assert (report.num_shares, report.secret_bits, report.random_bits) == (2, 1, 1)
+    assert [(l.cell, l.net, l.register, l.secrets) for l in report.leaks] == [
+        ("x", "y", False, ["a"])
+    ]
+
+
+def test_remasked_shares():
+    cells = {"mask": xor(2, 4, 5), "x": xor(5, 3, 9)}
+    report = share_dependency_report(netlist(cells), "top", PORTS)
+    assert report.leaks == []
+    assert report.remasked == 1
+
+
+def test_shares_combined_across_registers():
+    cells = {"reg0": dff(2, 5), "reg1": dff(3, 6), "x": xor(5, 6, 9)}
+    report = share_dependency_report(netlist(cells), "top", PORTS)
+    assert [l.cell for l in report.leaks] == ["x"]
+
+
+def test_separate_share_domains():
+    cells = {"x0": xor(2, 4, 5), "x1": xor(3, 4, 9)}
+    report = share_dependency_report(netlist(cells), "top", PORTS)
+    assert report.leaks == [] and report.remasked == 0
@@ -0,0 +1,73 @@
+from verdict_cache import CachedRun, VerdictCache, parse_age
+
+KEY = "ab" + "0" * 62
+
+
+def cached_run(n_sim, leaks=()):
+    # [n_sim, p_log, elapsed_time, ram_gb] per progress line
+    curve = [[n, n / 100, n / 100, n / 1000] for n in range(100, n_sim + 1, 100)]
+    return CachedRun(key=KEY, top="KSAdder4", n_sim=n_sim, curve=curve, leaks=list(leaks))
+
+
+def test_answers_clean_run():
+    run = cached_run(1000)
+    assert run.answers(1000) and run.answers(500)
+    assert not run.answers(1001)
+    assert run.first_leak is None and not run.leakage
+
+
+def test_answers_leaking_run():
+    # [cycle, signal, max_p_log, first_n_sim, hits]
+    run = cached_run(1000, [[3, "a[1]", 7.0, 300, 5]])
+    assert run.first_leak == 300
+    assert run.answers(10**6)
+    assert run.answers(200)
+
+
+def test_truncated():
+    run = cached_run(1000, [[3, "a[1]", 7.0, 300, 5], [2, "b", 6.0, None, 1]])
+    assert run.truncated(1000) is run
+    short = run.truncated(250)
+    assert short.n_sim == 200
+    assert short.curve == run.curve[:2]
+    assert short.elapsed_time == 2.0 and short.peak_ram_gb == 0.2
+    assert short.leaks == [] and not short.leakage
+    # leaks without a first simulation are attributed to the end of the run
+    assert run.truncated(300).leaks == [[3, "a[1]", 7.0, 300, 5]]
+    assert run.leaks_at(1000) == run.leaks
+
+
+def test_put_keeps_the_longer_run(tmp_path):
+    cache = VerdictCache(tmp_path)
+    assert cache.get(KEY) is None
+    cache.put(cached_run(1000))
+    cache.put(cached_run(500))
+    assert cache.get(KEY).n_sim == 1000
+    # unless the shorter run leaked
+    cache.put(cached_run(500, [[3, "a[1]", 7.0, 300, 5]]))
+    assert cache.get(KEY).n_sim == 500 and cache.get(KEY).leakage
+    cache.put(cached_run(2000))
+    assert cache.get(KEY).n_sim == 2000
+
+
+def test_invalid_entry(tmp_path):
+    cache = VerdictCache(tmp_path)
+    cache.entry_file(KEY).parent.mkdir(parents=True)
+    cache.entry_file(KEY).write_text("{")
+    assert cache.get(KEY) is None
+
+
+def test_evict_by_size(tmp_path):
+    cache = VerdictCache(tmp_path)
+    for i in range(3):
+        cache.put(CachedRun(key=f"{i:02d}" + "0" * 62, top="T", n_sim=100))
+    size = max(st.st_size for _, st in cache.entries())
+    cache.max_size = 2 * size
+    assert cache.evict() == 1
+    assert len(cache.entries()) == 2
+
+
+def test_parse_age():
+    assert parse_age("30") == 30
+    assert parse_age("2h") == 7200
+    assert parse_age("30d") == 30 * 86400
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, Optional, TextIO
+
+from rich.console import Console
+from rich.table import Table
+
+# Streaming switching-activity analysis of VCD traces, e.g. of the PROLEAD waveform simulation
+# (`run_prolead.py --vcd`). The trace is read token by token, so memory only depends on the number
+# of nets, not on the trace length. Per net it counts bit toggles and glitches (toggles beyond the
+# first of a bit within a clock cycle); per cycle the switching activity; and per instance a power
+# proxy: the toggles weighted by the fan-out of the nets in the Yosys netlist (1 without netlist).
+
+console = Console()
+
+CLOCK_REGEX = re.compile(r"(?i)^(clk|clock)$")
+
+
+@dataclass
+class Net:
+    name: str
+    width: int
+    value: str = ""
+    toggles: int = 0
+    glitches: int = 0
+    # capacitance proxy
+    weight: float = 1.0
+    # toggles of each bit in the current cycle
+    cycle_toggles: Optional[list[int]] = field(default=None, repr=False)
+
+
+@dataclass
+class InstanceActivity:
+    name: str
+    nets: int = 0
+    toggles: int = 0
+    glitches: int = 0
+    power_proxy: float = 0.0
+
+
+@dataclass
+class ActivityReport:
+    vcd: str
+    cycles: int = 0
+    toggles: int = 0
+    glitches: int = 0
+    power_proxy: float = 0.0
+    max_cycle_toggles: int = 0
+    instances: dict[str, InstanceActivity] = field(default_factory=dict)
+    # most active nets: (name, toggles, glitches)
+    top_nets: list[tuple[str, int, int]] = field(default_factory=list)
+
+    def per_cycle(self, value: float) -> float:
+        return value / self.cycles if self.cycles else 0.0
+
+    def to_json(self) -> dict:
+        return {
+            "vcd": self.vcd,
+            "cycles": self.cycles,
+            "toggles": self.toggles,
+            "glitches": self.glitches,
+            "power_proxy": self.power_proxy,
+            "toggles_per_cycle": self.per_cycle(self.toggles),
+            "glitches_per_cycle": self.per_cycle(self.glitches),
+            "power_proxy_per_cycle": self.per_cycle(self.power_proxy),
+            "max_cycle_toggles": self.max_cycle_toggles,
+            "instances": {k: vars(v) for k, v in self.instances.items()},
+            "top_nets": self.top_nets,
+        }
+
+
+def vcd_tokens(f: TextIO) -> Iterator[str]:
+    for line in f:
+        yield from line.split()
+
+
+def net_weights(netlist_file: Path, top: Optional[str] = None) -> dict[str, float]:
+    """Fan-out (number of cell inputs) + 1 of each named net of the Yosys JSON netlist, averaged
+    over its bits"""
+    from netlist_graph import NetlistGraph
+
+    with open(netlist_file, "r") as f:
+        netlist = json.load(f)
+    if top is None:
+        top = next(
+            (n for n, m in netlist["modules"].items() if m.get("attributes", {}).get("top")),
+            next(iter(netlist["modules"])),
+        )
+    graph = NetlistGraph(netlist, top)
+    weights = {}
+    for name, net in netlist["modules"][top].get("netnames", {}).items():
+        bits = [b for b in net["bits"] if isinstance(b, int)]
+        if bits:
+            weights[name] = 1 + sum(len(graph.loads.get(b, [])) for b in bits) / len(bits)
+    return weights
+
+
+def instance_of(path: str, depth: int) -> str:
+    """Instance of the net `path` (`scope.….net`), truncated to `depth` levels below the top"""
+    parts = path.split(".")[:-1]
+    return ".".join(parts[: depth + 1]) if parts else "<top>"
+
+
+class VCDActivity:
+    def __init__(
+        self,
+        clock: Optional[str] = None,
+        period: Optional[int] = None,
+        depth: int = 1,
+        weights: Optional[dict[str, float]] = None,
+        cycles_csv: Optional[TextIO] = None,
+    ):
+        """Cycles are delimited by the rising edges of the `clock` net (default: a net named clk or
+        clock), or every `period` time units"""
+        self.clock = clock
+        self.period = period
+        self.depth = depth
+        self.weights = weights or {}
+        self.cycles_csv = cycles_csv
+        self.nets: dict[str, Net] = {}
+        self.paths: dict[str, str] = {}
+        self.clock_id: Optional[str] = None
+        self.cycle = 0
+        self.cycle_start = 0
+        self.cycle_toggles = 0
+        self.cycle_glitches = 0
+        self.report: Optional[ActivityReport] = None
+        # nets toggled in the current cycle
+        self._touched: list[Net] = []
+
+    def _weight(self, path: str) -> float:
+        if not self.weights:
+            return 1.0
+        # netlist names are relative to the top module
+        name = path.split(".", 1)[1] if "." in path else path
+        return self.weights.get(name, self.weights.get(name.rsplit("[", 1)[0], 1.0))
+
+    def _parse_header(self, tokens: Iterator[str]):
+        scope: list[str] = []
+        for tok in tokens:
+            if tok == "$scope":
+                next(tokens)  # scope type
+                scope.append(next(tokens))
+            elif tok == "$upscope":
+                scope.pop()
+            elif tok == "$var":
+                next(tokens)  # var type
+                width = int(next(tokens))
+                ident = next(tokens)
+                ref = next(tokens)
+                path = ".".join(scope + [ref])
+                if ident not in self.nets:
+                    self.nets[ident] = Net(name=path, width=width, weight=self._weight(path))
+                    self.paths[path] = ident
+                    leaf = ref.rsplit(".", 1)[-1]
+                    is_clock = ref == self.clock or path == self.clock
+                    if is_clock or (self.clock is None and CLOCK_REGEX.match(leaf)):
+                        if self.clock_id is None or is_clock:
+                            self.clock_id = ident
+            elif tok == "$enddefinitions":
+                return
+            if tok.startswith("$") and tok != "$end":
+                for tok in tokens:
+                    if tok == "$end":
+                        break
+
+    def _end_cycle(self):
+        for net in self._touched:
+            assert net.cycle_toggles is not None
+            glitches = sum(max(0, t - 1) for t in net.cycle_toggles)
+            net.glitches += glitches
+            self.cycle_glitches += glitches
+            net.cycle_toggles = None
+        self._touched.clear()
+        if self.cycles_csv is not None:
+            self.cycles_csv.write(f"{self.cycle},{self.cycle_toggles},{self.cycle_glitches}\n")
+        assert self.report is not None
+        self.report.max_cycle_toggles = max(self.report.max_cycle_toggles, self.cycle_toggles)
+        self.report.glitches += self.cycle_glitches
+        self.cycle += 1
+        self.cycle_toggles = 0
+        self.cycle_glitches = 0
+
+    def _change(self, ident: str, value: str):
+        net = self.nets.get(ident)
+        if net is None:
+            return
+        old = net.value
+        net.value = value
+        if not old:
+            return
+        if ident == self.clock_id:
+            if old == "0" and value == "1" and self.period is None:
+                self._end_cycle()
+            return
+        width = net.width
+        if len(old) < width:
+            old = old.rjust(width, "0" if old[0] in "01" else old[0])
+        if len(value) < width:
+            value = value.rjust(width, "0" if value[0] in "01" else value[0])
+        toggled = [i for i, (a, b) in enumerate(zip(old, value)) if a != b]
+        if not toggled:
+            return
+        net.toggles += len(toggled)
+        self.cycle_toggles += len(toggled)
+        if net.cycle_toggles is None:
+            net.cycle_toggles = [0] * width
+            self._touched.append(net)
+        for i in toggled:
+            net.cycle_toggles[i] += 1
+
+    def analyze(self, vcd_file: Path, top_nets: int = 10) -> ActivityReport:
+        self.report = ActivityReport(vcd=str(vcd_file))
+        if self.cycles_csv is not None:
+            self.cycles_csv.write("cycle,toggles,glitches\n")
+        with open(vcd_file, "r") as f:
+            tokens = vcd_tokens(f)
+            self._parse_header(tokens)
+            if self.clock_id is None and self.period is None:
+                raise ValueError(f"No clock net found in {vcd_file}, specify --clock or --period")
+            for tok in tokens:
+                c = tok[0]
+                if c == "#":
+                    t = int(tok[1:])
+                    if self.period and t - self.cycle_start >= self.period:
+                        while t - self.cycle_start >= self.period:
+                            self.cycle_start += self.period
+                            self._end_cycle()
+                elif c in "01xXzZ":
+                    self._change(tok[1:], tok[0].lower())
+                elif c in "bB":
+                    self._change(next(tokens), tok[1:].lower())
+                elif c in "rR":
+                    next(tokens)  # real values are not counted
+                # $dumpvars, $dumpon, ... and their $end are skipped
+        if self.cycle_toggles or self._touched:
+            self._end_cycle()
+
+        report = self.report
+        report.cycles = self.cycle
+        for net in self.nets.values():
+            name = instance_of(net.name, self.depth)
+            inst = report.instances.setdefault(name, InstanceActivity(name))
+            inst.nets += 1
+            inst.toggles += net.toggles
+            inst.glitches += net.glitches
+            inst.power_proxy += net.toggles * net.weight
+            report.toggles += net.toggles
+            report.power_proxy += net.toggles * net.weight
+        most_active = sorted(self.nets.values(), key=lambda n: n.toggles, reverse=True)[:top_nets]
+        report.top_nets = [(n.name, n.toggles, n.glitches) for n in most_active if n.toggles]
+        return report
+
+
+def print_report(report: ActivityReport, max_instances: int = 20):
+    print(f"** Switching activity of {report.vcd}:")
+    print(f"  cycles:            {report.cycles:,}")
+    print(
+        f"  toggles per cycle: {report.per_cycle(report.toggles):.2f} "
+        f"(max {report.max_cycle_toggles:,})"
+    )
+    print(f"  glitches per cycle: {report.per_cycle(report.glitches):.2f}")
+    print(f"  power proxy per cycle: {report.per_cycle(report.power_proxy):.2f}")
+    table = Table(title="Activity per instance")
+    for col in ("Instance", "Nets", "Toggles/cycle", "Glitches/cycle", "Power proxy/cycle", "%"):
+        table.add_column(col, justify="left" if col == "Instance" else "right")
+    instances = sorted(report.instances.values(), key=lambda i: i.power_proxy, reverse=True)
+    for inst in instances[:max_instances]:
+        share = 100 * inst.power_proxy / report.power_proxy if report.power_proxy else 0.0
+        table.add_row(
+            inst.name,
+            str(inst.nets),
+            f"{report.per_cycle(inst.toggles):.2f}",
+            f"{report.per_cycle(inst.glitches):.2f}",
+            f"{report.per_cycle(inst.power_proxy):.2f}",
+            f"{share:.1f}",
+        )
+    console.print(table)
+
+
+def print_comparison(reports: list[ActivityReport]):
+    table = Table(title="Switching activity")
+    for col in ("VCD", "Cycles", "Toggles/cycle", "Glitches/cycle", "Power proxy/cycle"):
+        table.add_column(col, justify="left" if col == "VCD" else "right")
+    for r in sorted(reports, key=lambda r: r.per_cycle(r.power_proxy)):
+        table.add_row(
+            r.vcd,
+            f"{r.cycles:,}",
+            f"{r.per_cycle(r.toggles):.2f}",
+            f"{r.per_cycle(r.glitches):.2f}",
+            f"{r.per_cycle(r.power_proxy):.2f}",
+        )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Switching activity of VCD traces")
+    argparser.add_argument("vcd", nargs="+", type=Path, help="VCD files, e.g. of several adders")
+    argparser.add_argument("--clock", default=None, help="Clock net (default: clk or clock)")
+    argparser.add_argument(
+        "--period", type=int, default=None, help="Clock period in time units, instead of --clock"
+    )
+    argparser.add_argument(
+        "--depth", type=int, default=1, help="Instance levels below the top to report"
+    )
+    argparser.add_argument(
+        "--netlist",
+        type=Path,
+        default=None,
+        help="Yosys JSON netlist to weight the toggles of each net by its fan-out",
+    )
+    argparser.add_argument("--top", default=None, help="Top module of the netlist")
+    argparser.add_argument(
+        "--cycles-csv", type=Path, default=None, help="Per-cycle activity CSV of the first VCD"
+    )
+    argparser.add_argument("-o", "--output", type=Path, default=None, help="Write reports to JSON")
+    args = argparser.parse_args()
+
+    weights = net_weights(args.netlist, args.top) if args.netlist else None
+    reports = []
+    for i, vcd in enumerate(args.vcd):
+        cycles_csv = open(args.cycles_csv, "w") if args.cycles_csv and i == 0 else None
+        try:
+            analyzer = VCDActivity(args.clock, args.period, args.depth, weights, cycles_csv)
+            reports.append(analyzer.analyze(vcd))
+        finally:
+            if cycles_csv is not None:
+                cycles_csv.close()
+        print_report(reports[-1])
+    if len(reports) > 1:
+        print_comparison(reports)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([r.to_json() for r in reports], f, indent=2)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from quantiphy import Quantity
+
+from file_utils import atomic_write
+
+# Cache of PROLEAD verdicts, keyed by the hash of everything but the number of simulations that
+# determines a run: config, netlist, top module and PROLEAD setup. A cached run answers any request
+# for at most as many simulations, and any request once it detected leakage. Entries are JSON files
+# in `<cache_dir>/<key[:2]>/<key>.json`; hits refresh their mtime, and eviction removes the least
+# recently used entries beyond a maximum age and total size.
+# Each entry is a single PROLEAD run: independent runs are never combined into a verdict for their
+# total number of simulations, as separate G-tests on N1 and N2 simulations are much weaker than one
+# on N1+N2.
+
+
+@dataclass
+class CachedRun:
+    key: str
+    top: str
+    n_sim: int
+    elapsed_time: float = 0.0
+    peak_ram_gb: float = 0.0
+    returncode: Optional[int] = 0
+    # [n_sim, p_log, elapsed_time, ram_gb] per progress line
+    curve: list[list] = field(default_factory=list)
+    # [cycle, signal, max_p_log, first_n_sim, hits]
+    leaks: list[list] = field(default_factory=list)
+    # run directory of the simulations
+    run_dirs: list[str] = field(default_factory=list)
+    created: float = 0.0
+
+    def leaks_at(self, n_sim: int) -> list[list]:
+        """Signals leaking within the first `n_sim` simulations"""
+        return [l for l in self.leaks if (l[3] if l[3] is not None else self.n_sim) <= n_sim]
+
+    @property
+    def first_leak(self) -> Optional[int]:
+        firsts = [l[3] if l[3] is not None else self.n_sim for l in self.leaks]
+        return min(firsts) if firsts else None
+
+    def answers(self, n_sim: int) -> bool:
+        """Whether the verdict for `n_sim` simulations is known"""
+        return self.n_sim >= n_sim or (self.first_leak is not None and self.first_leak <= n_sim)
+
+    def truncated(self, n_sim: int) -> "CachedRun":
+        """The run as if it had stopped after `n_sim` simulations"""
+        if n_sim >= self.n_sim:
+            return self
+        curve = [row for row in self.curve if row[0] <= n_sim] or self.curve[:1]
+        return CachedRun(
+            key=self.key,
+            top=self.top,
+            n_sim=curve[-1][0] if curve else n_sim,
+            elapsed_time=(curve[-1][2] or 0.0) if curve else 0.0,
+            peak_ram_gb=max((row[3] or 0.0 for row in curve), default=0.0),
+            returncode=self.returncode,
+            curve=curve,
+            leaks=self.leaks_at(n_sim),
+            run_dirs=self.run_dirs,
+            created=self.created,
+        )
+
+    @property
+    def max_p_log(self) -> float:
+        return max((row[1] for row in self.curve if row[1] is not None), default=0.0)
+
+    @property
+    def leakage(self) -> bool:
+        return bool(self.leaks)
+
+
+class VerdictCache:
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_age: Optional[float] = None,
+        max_size: Optional[int] = None,
+    ):
+        """`max_age`: seconds since the last use, `max_size`: bytes"""
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.max_size = max_size
+
+    def entry_file(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[CachedRun]:
+        entry_file = self.entry_file(key)
+        try:
+            if self.max_age is not None and time.time() - entry_file.stat().st_mtime > self.max_age:
+                return None
+            with open(entry_file, "r") as f:
+                entry = CachedRun(**json.load(f))
+            os.utime(entry_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            print(f"** [WARNING] Ignoring invalid cache entry {entry_file}: {e}")
+            return None
+        return entry
+
+    def put(self, entry: CachedRun):
+        entry_file = self.entry_file(entry.key)
+        entry_file.parent.mkdir(parents=True, exist_ok=True)
+        old = self.get(entry.key)
+        if old is not None and old.n_sim > entry.n_sim and not entry.leakage:
+            # keep the longer run
+            return
+        with atomic_write(entry_file) as f:
+            json.dump(entry.__dict__, f)
+        self.evict()
+
+    def entries(self) -> list[tuple[Path, os.stat_result]]:
+        entries = []
+        for f in self.cache_dir.glob("*/*.json"):
+            try:
+                entries.append((f, f.stat()))
+            except FileNotFoundError:
+                pass
+        return entries
+
+    def evict(self) -> int:
+        """Remove entries older than `max_age`, then the least recently used ones beyond
+        `max_size`. Returns the number of removed entries."""
+        if self.max_age is None and self.max_size is None:
+            return 0
+        now = time.time()
+        entries = sorted(self.entries(), key=lambda e: e[1].st_mtime, reverse=True)
+        total = 0
+        removed = 0
+        for f, st in entries:
+            total += st.st_size
+            too_old = self.max_age is not None and now - st.st_mtime > self.max_age
+            too_big = self.max_size is not None and total > self.max_size
+            if too_old or too_big:
+                f.unlink(missing_ok=True)
+                total -= st.st_size
+                removed += 1
+        return removed
+
+
+def parse_age(age: str) -> float:
+    """`<N>d`, `<N>h` or `<N>m` in seconds"""
+    units = {"d": 86400, "h": 3600, "m": 60}
+    age = age.strip()
+    if age[-1:] in units:
+        return float(age[:-1]) * units[age[-1]]
+    return float(age)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Inspect and evict the PROLEAD verdict cache")
+    argparser.add_argument("cache_dir", type=Path, help="Verdict cache directory")
+    argparser.add_argument("--max-age", type=parse_age, default=None, help="e.g. 30d or 12h")
+    argparser.add_argument(
+        "--max-size", type=lambda s: int(Quantity(s, "B")), default=None, help="e.g. 500M or 2G"
+    )
+    argparser.add_argument("--list", action="store_true", help="List the cached runs")
+    args = argparser.parse_args()
+
+    cache = VerdictCache(args.cache_dir, args.max_age, args.max_size)
+    removed = cache.evict()
+    if removed:
+        print(f"** Evicted {removed} entries")
+    entries = cache.entries()
+    if args.list:
+        for f, _ in sorted(entries, key=lambda e: e[1].st_mtime):
+            with open(f, "r") as fp:
+                e = CachedRun(**json.load(fp))
+            verdict = "LEAKAGE" if e.leakage else "OKAY"
+            print(f"  {e.key[:16]} {e.top:24s} {e.n_sim:>14,d} {verdict:8s} {e.max_p_log:6.2f}")
+    size = sum(st.st_size for _, st in entries)
+    print(f"** {len(entries)} cached runs, {Quantity(size, 'B'):.3}")
@@ -0,0 +1,128 @@
+import atexit
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Optional
+
+try:
+    from pyosys import libyosys as ys
+except ImportError:
+    ys = None
+
+# In-process Yosys backend of `run_prolead.synthesize` (`--yosys-backend pyosys`). Yosys keeps
+# global state and is not thread-safe, so the flows run in a pool of long-lived worker processes,
+# each with a warm Yosys session: plugins are loaded once per worker, and each liberty library is
+# read once and saved (`design -save`); flows start from a copy of the saved library cells instead
+# of running `read_liberty -lib`.
+
+# per worker process
+_plugins: set[str] = set()
+_libraries: dict[str, str] = {}
+
+
+def available() -> bool:
+    return ys is not None
+
+
+def _library(liberty_lib: str) -> str:
+    """Name of the saved design with the cells of `liberty_lib`"""
+    name = _libraries.get(liberty_lib)
+    if name is None:
+        name = "liberty_" + hashlib.sha256(liberty_lib.encode()).hexdigest()[:16]
+        design = ys.Design()
+        ys.run_pass(f"read_liberty -lib {liberty_lib}", design)
+        ys.run_pass(f"design -save {name}", design)
+        _libraries[liberty_lib] = name
+    return name
+
+
+def run_script(
+    run_dir: str, script: list[str], plugins: list[str], liberty_lib: str, quiet: bool = True
+) -> dict:
+    """Run the commands of a Yosys script in this worker. Returns the cell counts of the top
+    module and the elapsed time."""
+    start = time.perf_counter()
+    os.chdir(run_dir)
+    for plugin in plugins:
+        if plugin not in _plugins:
+            ys.run_pass(f"plugin -i {plugin}", ys.Design())
+            _plugins.add(plugin)
+    design = ys.Design()
+    # library (blackbox) cells are kept by `hierarchy`
+    ys.run_pass(f"design -load {_library(liberty_lib)}", design)
+    if quiet:
+        with open("yosys.log", "w"):
+            pass
+    for command in script:
+        if command == f"read_liberty -lib {liberty_lib}":
+            continue
+        ys.run_pass(f"tee -q -a yosys.log {command}" if quiet else command, design)
+    cells: dict[str, int] = {}
+    top = design.top_module()
+    if top is not None:
+        for cell in top.cells_.values():
+            cell_type = cell.type.str().removeprefix("\\")
+            cells[cell_type] = cells.get(cell_type, 0) + 1
+    return {"cells": cells, "elapsed_time": time.perf_counter() - start}
+
+
+class YosysWorkerPool:
+    def __init__(self, max_workers: Optional[int] = None):
+        if ys is None:
+            raise RuntimeError("The pyosys Yosys backend requires the pyosys package")
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.executor = self._start()
+
+    def _start(self) -> ProcessPoolExecutor:
+        # not forked: the parent has threads, e.g. of concurrent jobs
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def run(
+        self,
+        run_dir: Path,
+        script: list[str],
+        plugins: list[str],
+        liberty_lib: Path,
+        quiet: bool = True,
+    ) -> dict:
+        with self.lock:
+            executor = self.executor
+        try:
+            future = executor.submit(
+                run_script, str(run_dir.absolute()), script, plugins, str(liberty_lib), quiet
+            )
+            return future.result()
+        except BrokenProcessPool:
+            # Yosys errors can exit the worker, which breaks the pool
+            with self.lock:
+                if self.executor is executor:
+                    self.executor = self._start()
+            raise RuntimeError(f"Yosys worker failed, see {run_dir / 'yosys.log'}")
+
+    def shutdown(self):
+        with self.lock:
+            self.executor.shutdown()
+
+
+_pool: Optional[YosysWorkerPool] = None
+_pool_lock = threading.Lock()
+# worker processes of the shared pool, default: number of CPUs
+pool_workers: Optional[int] = None
+
+
+def worker_pool() -> YosysWorkerPool:
+    """The pool shared by all synthesis runs of this process, started on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = YosysWorkerPool(pool_workers)
+            atexit.register(_pool.shutdown)
+        return _pool